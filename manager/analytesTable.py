@@ -11,7 +11,8 @@ def analytesTable(obj, obj_type: str) -> str:
 
     htmlButton = '<button class="{goTo}">{bname}</button>'
 
-    lenana = len(cs.analytes.only('id'))
+    analytes = list(cs.analytes.all())
+    disabled = cs.locked
 
     ret = [
         '<div class="analytes_table_container">',
@@ -22,7 +23,7 @@ def analytesTable(obj, obj_type: str) -> str:
 
     unitsTrans = dict(mmodels.Dataset.CONC_UNITS)
 
-    for a in cs.analytes.all():
+    for a in analytes:
         ret.append("""
             <th style="height: inherit; min-height: 35px" class="at_hideable _voltJS_changeValue_{an_id}"><button style="height: auto" type="button" class="{goTo}"{disabled}> {an_name} [{an_unit}]</button> </th>""".format(
                 an_name=a.name,
@@ -35,27 +36,28 @@ def analytesTable(obj, obj_type: str) -> str:
                         'analyte_id': a.id
                     })
                 ),
-                disabled=' disabled' if cs.locked else ''
+                disabled=' disabled' if disabled else ''
             )
         )
 
     ret.append('<th class="at_hideable at_selection">&#9634;</th>')
     ret.append('</tr></thead><tbody>')
 
-    for cd in cs.curves_data.only('id', 'curve'):
+    analytes_conc = cs.getAnalytesConc()
+    for cd in cs.loadCurves():
         ret.append(
             '<tr class="_voltJS_plotHighlight _voltJS_highlightCurve@{cdid}" onclick="$(\'input[name=cd_{cdid}]\').click();"><td> {cdname} </td>'.format(
                 cdid=cd.id,
                 cdname=cd.curve.__str__()
             )
         )
-        for a in cs.analytes.all():
-            conc = cs.analytes_conc.get(a.id, {}).get(cd.id, 0)
+        for a in analytes:
+            conc = analytes_conc.get(a.id, {}).get(cd.id, 0)
             ret.append('<td class="at_hideable _voltJS_changeValue_%s"> %f </td>' % (a.id, conc))
         ret.append('<td class="at_hideable at_selection">')
         ret.append(
             '<input onclick="event.stopPropagation();" class="at_selection" style="height: 19px" type="checkbox" name="cd_%i" %s/>'
-                % (cd.id, 'disabled' if cs.locked else '')
+                % (cd.id, 'disabled' if disabled else '')
         )
         ret.append('</td>')
         ret.append('</tr>')
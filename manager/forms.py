@@ -301,7 +301,7 @@ class EditCurvesForm(forms.Form):
         self.generateFields()
 
     def generateFields(self):
-        for cd in self.cs.curves_data.all():
+        for cd in self.cs.loadCurves():
             self.fields['curve_%d_name' % cd.id] = forms.CharField(
                 label='Name',
                 required=True,
@@ -327,7 +327,7 @@ class EditCurvesForm(forms.Form):
         # TODO: Perms to what are required (?)
         if not user.has_perm('rw', self.cs):
             raise VoltPyNotAllowed('Not allowed to change the dataset.')
-        for cd in self.cs.curves_data.all():
+        for cd in self.cs.loadCurves():
             name = self.cleaned_data.get('curve_%d_name' % cd.id, None)
             comment = self.cleaned_data.get('curve_%d_comment' % cd.id, None)
             if name is None or comment is None:
@@ -353,7 +353,9 @@ class EditAnalytesForm(forms.Form):
         if analyte_id != '-1':
             try:
                 analyte = mmodels.Analyte.get(id=analyte_id)
-                conc = self.cs.analytes_conc.get(analyte.id, {})
+                if not self.cs.analytes.filter(id=analyte.id).exists():
+                    raise VoltPyDoesNotExists('Analyte not in dataset.')
+                conc = self.cs.getConcDict(analyte.id)
             except:
                 analyte = None
                 conc = {}
@@ -370,7 +372,7 @@ class EditAnalytesForm(forms.Form):
             for an in analytesFromDb:
                 existingAnalytes.append((an.id, an.name))
 
-        if analyte is not None and conc:
+        if analyte is not None:
             eaDefaultUnit = self.cs.analytes_conc_unit.get(analyte.id, eaDefaultUnit)
             eaDefault = analyte.id
 
@@ -402,9 +404,9 @@ class EditAnalytesForm(forms.Form):
             self.fields['newAnalyte'].initial = ""
             self.fields['newAnalyte'].widget.attrs['disabled'] = True
 
-        for cd in self.cs.curves_data.all():
+        for cd in self.cs.loadCurves():
             if analyte is not None:
-                val = self.cs.analytes_conc.get(analyte.id, {}).get(cd.id, '')
+                val = conc.get(cd.id, 0.0)
             else:
                 val = ''
             self.fields['curve_%d' % cd.id] = forms.FloatField(
@@ -458,7 +460,7 @@ class EditAnalytesForm(forms.Form):
 
         units = self.cleaned_data['units']
 
-        conc = self.cs.analytes_conc.get(a.id, {})
+        conc = {}
 
         for name, val in self.cleaned_data.items():
             if "curve_" in name:
@@ -470,21 +472,12 @@ class EditAnalytesForm(forms.Form):
 
                 conc[curve_id] = float(val)
 
-        if not self.cs.analytes.filter(id=a.id).exists():
-            self.cs.analytes.add(a)
-
         if all([
             manager.helpers.functions.is_number(self.original_id),
             a.id != self.original_id
         ]):
-            self.cs.analytes_conc.pop(self.original_id, None)
-            self.cs.analytes_conc_unit.pop(self.original_id, None)
-            try:
-                a_org = mmodels.Analyte.objects.get(id=self.original_id)
-                self.cs.analytes.remove(a_org)
-            except ObjectDoesNotExist:
-                pass
-        self.cs.analytes_conc[a.id] = conc
+            self.cs.removeAnalyte(int(self.original_id))
+        self.cs.setConc(a.id, conc)
         self.cs.analytes_conc_unit[a.id] = units
         self.cs.analytes.add(a)
         self.cs.save()
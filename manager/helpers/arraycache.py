@@ -0,0 +1,58 @@
+"""
+Process wide cache of decoded arrays of the content-addressed store.
+Stored arrays never change, so the entries do not need invalidation,
+the least recently used ones are dropped when the cache is full.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class ArrayCache:
+    """
+    sizeof gives the cost of array, by default its size in bytes, the
+    entries are dropped when the sum of costs would exceed max_size.
+    """
+    def __init__(self, max_size: int, sizeof=lambda arr: arr.nbytes):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self._size = 0
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            arr = self._arrays.get(key, None)
+            if arr is not None:
+                self._arrays.move_to_end(key)
+            return arr
+
+    def put(self, key, arr: np.ndarray) -> np.ndarray:
+        """
+        Caches the array as read only, as it is shared by all the
+        objects which point to it.
+        """
+        if isinstance(arr, np.ndarray):
+            arr.flags.writeable = False
+        if self.sizeof(arr) > self.max_size:
+            return arr
+        with self._lock:
+            if key in self._arrays:
+                return self._arrays[key]
+            self._arrays[key] = arr
+            self._size += self.sizeof(arr)
+            while self._size > self.max_size:
+                _, old = self._arrays.popitem(last=False)
+                self._size -= self.sizeof(old)
+        return arr
+
+    def pop(self, key):
+        with self._lock:
+            arr = self._arrays.pop(key, None)
+            if arr is not None:
+                self._size -= self.sizeof(arr)
+
+    def clear(self):
+        with self._lock:
+            self._arrays.clear()
+            self._size = 0
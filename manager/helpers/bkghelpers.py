@@ -1,22 +1,74 @@
+from functools import lru_cache
 import numpy as np
 
 
-def calc_abc(xvec, yvec, degree, iterations):
-    ybkg = list(yvec)
+def calc_abc_matrix(xvec, ymatrix, degree, iterations):
+    """
+    Automatic Baseline Correction of each row of ymatrix (curves x points)
+    at once. The polynomial of every curve is fitted by one lstsq with
+    the curves as right-hand sides, the curves which did not change
+    in the iteration are not fitted again.
+
+    returns touple of
+    ( matrix without background, background matrix )
+    """
+    xvec = np.asarray(xvec, dtype=np.float64)
+    ymatrix = np.array(ymatrix, dtype=np.float64, ndmin=2)
+    ybkg = ymatrix.copy()
+    # the same scaled basis as np.polyfit uses
+    vander = np.vander(xvec, degree + 1)
+    scale = np.sqrt((vander * vander).sum(axis=0))
+    lhs = vander / scale
+    rcond = len(xvec) * np.finfo(xvec.dtype).eps
+    active = np.arange(ybkg.shape[0])
     for i in range(iterations):
-        p = np.polyfit(xvec, ybkg, degree)
-        poly_ybkg = np.polyval(p, xvec)
-        changed = False
-        for ii, iybkg in enumerate(ybkg):
-            if poly_ybkg[ii] < iybkg:
-                ybkg[ii] = poly_ybkg[ii]
-                changed = True
-        if not changed:
+        if active.size == 0:
             break
-    
-    yNoBkg = np.subtract(yvec, ybkg)
+        coefs = np.linalg.lstsq(lhs, ybkg[active].T, rcond=rcond)[0]
+        poly_ybkg = (lhs @ coefs).T
+        current = ybkg[active]
+        changed = (poly_ybkg < current).any(axis=1)
+        ybkg[active] = np.minimum(current, poly_ybkg)
+        active = active[changed]
+    return ymatrix - ybkg, ybkg
+
 
+def calc_abc(xvec, yvec, degree, iterations):
+    yNoBkg, ybkg = calc_abc_matrix(xvec, [yvec], degree, iterations)
     return {
-        'yvec': list(yNoBkg),
-        'ybkg': list(ybkg)
+        'yvec': list(yNoBkg[0]),
+        'ybkg': list(ybkg[0])
     }
+
+
+@lru_cache(maxsize=16)
+def _polyfit_projection(xbytes, ranges, degree):
+    xvec = np.frombuffer(xbytes, dtype=np.float64)
+    selected = np.concatenate([np.arange(len(xvec))[st:en] for st, en in ranges])
+    # the same scaled basis as np.polyfit uses
+    vander = np.vander(xvec[selected], degree + 1)
+    scale = np.sqrt((vander * vander).sum(axis=0))
+    rcond = len(selected) * np.finfo(np.float64).eps
+    projection = np.linalg.pinv(vander / scale, rcond=rcond) / scale[:, np.newaxis]
+    projection.flags.writeable = False
+    selected.flags.writeable = False
+    return selected, projection
+
+
+def calc_polyfit_ranges(xvec, ymatrix, ranges, degree):
+    """
+    Fits polynomial of degree to each row of ymatrix (curves x points),
+    using only the points in ranges -- list of (start, end) indexes.
+    The projection from the points to the coefficients depends only on
+    xvec, ranges and degree, so it is computed once and reused.
+
+    returns touple of
+    ( coefficients (curves x degree+1, as of np.polyfit), background matrix )
+    """
+    xvec = np.ascontiguousarray(xvec, dtype=np.float64)
+    ranges = tuple((int(st), int(en)) for st, en in ranges)
+    selected, projection = _polyfit_projection(xvec.tobytes(), ranges, degree)
+    ymatrix = np.array(ymatrix, dtype=np.float64, ndmin=2)
+    coeffs = ymatrix[:, selected] @ projection.T
+    ybkg = coeffs @ np.vander(xvec, degree + 1).T
+    return coeffs, ybkg
@@ -1,3 +1,5 @@
+import threading
+from contextlib import contextmanager
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.core.exceptions import ObjectDoesNotExist
@@ -64,3 +66,27 @@ def with_user(fun):
         with_user._user = user
         return fun(request, *args, **kwargs)
     return wrap
+
+
+_acting = threading.local()
+
+
+@contextmanager
+def acting_as(user):
+    """
+    Makes get_user return user in the current thread, for work done
+    outside of requests (e.g. by the upload worker):
+
+    with acting_as(job.owner):
+        ...
+    """
+    prev = getattr(_acting, 'user', None)
+    _acting.user = user
+    try:
+        yield user
+    finally:
+        _acting.user = prev
+
+
+def acting_user():
+    return getattr(_acting, 'user', None)
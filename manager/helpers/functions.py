@@ -1,11 +1,14 @@
 import io
 import re
+import json
 import base64 as b64
 import datetime
 from typing import List
 from typing import Optional
 from typing import Callable
 from typing import Generic
+from typing import Iterator
+from typing import Tuple
 from collections import OrderedDict
 import numpy as np
 from django.urls import reverse
@@ -13,6 +16,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.http import HttpResponseRedirect
 from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.http.request import HttpRequest
 from django.shortcuts import render
 from django.template import loader
@@ -27,6 +31,7 @@ import manager.plotmanager as mpm
 import manager.forms as mforms
 import manager.models as mmodels
 from manager.helpers.decorators import with_user
+from manager.helpers.decorators import acting_user
 
 
 def voltpy_render(*args, template_name: str, **kwargs) -> HttpResponse:
@@ -61,13 +66,8 @@ def voltpy_render(*args, template_name: str, **kwargs) -> HttpResponse:
     return HttpResponse(render_str)
 
 
-def voltpy_serve_csv(request: HttpRequest, filedata: io.StringIO, filename: str) -> HttpResponse:
+def _attachment(response: HttpResponse, filename: str) -> HttpResponse:
     from django.utils.encoding import smart_str
-    response = render(
-        request=request,
-        template_name='manager/export.html',
-        context={'data': filedata.getvalue()}
-    )
     filename = filename.strip()
     filename = filename.replace(' ', '_')
     filename = "".join(x for x in filename if (x.isalnum() or x in ('_', '+', '-', '.', ',')))
@@ -75,6 +75,27 @@ def voltpy_serve_csv(request: HttpRequest, filedata: io.StringIO, filename: str)
     return response
 
 
+def voltpy_serve_csv(request: HttpRequest, filedata: io.StringIO, filename: str) -> HttpResponse:
+    response = render(
+        request=request,
+        template_name='manager/export.html',
+        context={'data': filedata.getvalue()}
+    )
+    return _attachment(response, filename)
+
+
+def voltpy_stream_csv(chunks: Iterator[str], filename: str) -> StreamingHttpResponse:
+    """
+    Sends the CSV file as it is produced, see export_curves_data_as_csv.
+    """
+    return _attachment(StreamingHttpResponse(chunks, content_type='text/csv'), filename)
+
+
+def voltpy_serve_bytes(filedata: io.BytesIO, filename: str) -> HttpResponse:
+    response = HttpResponse(filedata.getvalue(), content_type='application/octet-stream')
+    return _attachment(response, filename)
+
+
 def add_notification(request: HttpRequest, text: str, severity: int=0) -> None:
     now = datetime.datetime.now().strftime('%H:%M:%S')
     notifications = request.session.get('VOLTPY_notification', [])
@@ -260,10 +281,11 @@ def get_redirect_class(redirectUrl: str) -> str:
 
 
 def check_dataset_integrity(dataset: mmodels.Dataset, params_to_check: List[int]) -> None:
-    if len(dataset.curves_data.all()) < 2:
+    cds = dataset.loadCurves()
+    if len(cds) < 2:
         return
-    cd1 = dataset.curves_data.all()[0]
-    for cd in dataset.curves_data.all():
+    cd1 = cds[0]
+    for cd in cds:
         for p in params_to_check:
             if cd.curve.params[p] != cd1.curve.params[p]:
                 raise VoltPyFailed('All curves in dataset have to be similar.')
@@ -411,24 +433,149 @@ def paginate(request: HttpRequest, queryset: QuerySet, sortable_by: List[str], c
 
 
 def get_user() -> User:
-    return with_user._user
+    return acting_user() or with_user._user
+
+
+def _curvePoints(cd: mmodels.CurveData) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (xVector, yVector) of cd, cut to the same length.
+    """
+    x = np.asarray(cd.xVector)
+    y = np.asarray(cd.yVector, dtype=np.float64)
+    length = min(len(x), len(y))
+    return x[:length], y[:length]
 
 
-def export_curves_data_as_csv(cds: List[mmodels.CurveData]) -> io.StringIO:
+def merge_curves_on_x(cds: List[mmodels.CurveData],
+                      chunkRows: int = 1000) -> Tuple[np.ndarray, Iterator[np.ndarray]]:
     """
-    Turn a list of CurveData instances into CSV file.
+    Puts yVectors of cds on the sorted union of their xVectors.
+    Returns (xvector, matrices), where matrices yields the matrix for
+    consecutive chunks of chunkRows points of xvector, with a row for
+    each point and a column for each curve, with nan where the curve
+    has no point. The curves are merged one by one into the chunk, so
+    only the chunk and the arrays of one curve are held besides xvector
+    (the arrays are read through the cache of ArrayBlob).
     """
-    cdict = {}
-    explen = len(cds)
+    onx = get_user().profile.show_on_x
+    names = {'P': ['potential', 'current'], 'T': ['time', 'current'], 'S': ['current_samples']}
+    mmodels.CurveData.prefetchArrays(cds, names[onx])
+    xvector = np.empty(0)
     for i, cd in enumerate(cds):
-        for x, y in zip(cd.xVector, cd.yVector):
-            tmp = cdict.get(x, [None] * explen)
-            tmp[i] = y
-            cdict[x] = tmp
-    sortdict = OrderedDict(sorted(cdict.items()))
-    xcol = np.array(list(sortdict.keys())).reshape((-1, 1))
-    ycols = np.array(list(sortdict.values()))
-    allCols = np.concatenate((xcol, ycols), axis=1)
-    memoryFile = io.StringIO()
-    np.savetxt(memoryFile, allCols, delimiter=",", newline="\r\n", fmt='%s')
+        x = np.unique(_curvePoints(cd)[0])
+        xvector = x if i == 0 else np.union1d(xvector, x)
+
+    def matrices():
+        for start in range(0, len(xvector), chunkRows):
+            chunk = xvector[start:start+chunkRows]
+            matrix = np.full((len(chunk), len(cds)), np.nan)
+            for col, cd in enumerate(cds):
+                x, y = _curvePoints(cd)
+                inside = (x >= chunk[0]) & (x <= chunk[-1])
+                # in order of the curve, so the last of repeated x wins
+                matrix[np.searchsorted(chunk, x[inside]), col] = y[inside]
+            yield matrix
+    return xvector, matrices()
+
+
+def export_curves_data_as_csv(cds: List[mmodels.CurveData], chunkRows: int = 1000) -> Iterator[str]:
+    """
+    Turn a list of CurveData instances into CSV file, which is returned
+    in chunks of chunkRows rows. The first column is the union of
+    xVectors, the cells where the curve has no point are None.
+    """
+    xvector, matrices = merge_curves_on_x(list(cds), chunkRows)
+
+    def chunks():
+        for start, matrix in zip(range(0, len(xvector), chunkRows), matrices):
+            xcells = xvector[start:start+chunkRows].astype(str)  # integer x stays integer
+            cells = np.column_stack((xcells, np.where(np.isnan(matrix), 'None', matrix.astype(str))))
+            yield ''.join(','.join(row) + '\r\n' for row in cells.tolist())
+    return chunks()
+
+
+def _jsonDefault(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError('Object of type %s is not JSON serializable' % value.__class__.__name__)
+
+
+def _concFactor(fromUnit: str, toUnit: str) -> float:
+    """
+    Factor converting the concentrations between the units of
+    Dataset.CONC_UNITS, e.g. 1000 from '3g' (mg/L) to '6g' (µg/L).
+    """
+    if fromUnit[-1] != toUnit[-1]:
+        units = dict(mmodels.Dataset.CONC_UNITS)
+        raise VoltPyFailed('Cannot convert concentration from %s to %s.' % (
+            units.get(fromUnit, fromUnit), units.get(toUnit, toUnit)
+        ))
+    return 10.0 ** (int(toUnit[:-1]) - int(fromUnit[:-1]))
+
+
+def _stackCurves(vectors: List[np.ndarray]) -> np.ndarray:
+    """
+    Matrix (curves x points) if the curves are of equal length,
+    otherwise concatenated vectors.
+    """
+    if len(set(len(v) for v in vectors)) == 1:
+        return np.array(vectors, dtype=np.float64)
+    return np.concatenate([np.empty(0)] + [np.asarray(v, dtype=np.float64) for v in vectors])
+
+
+def export_datasets_as_npz(datasets: List[mmodels.Dataset]) -> io.BytesIO:
+    """
+    Turn the curves of datasets into .npz bundle, with their sampling data,
+    parameters, concentrations of analytes and processing history.
+    Concentrations of analyte are converted to its unit in the first
+    dataset, VoltPyFailed is raised if they cannot be (g/L and M).
+    The bundle can be uploaded again (see manager.uploads.parsers.npz).
+    """
+    cds = []
+    concs = OrderedDict()  # analyte name: {curve_data_id: concentration}
+    units = {}
+    history = []
+    for ds in datasets:
+        cds.extend(ds.loadCurves(arrays=('time', 'potential', 'current', 'current_samples')))
+        names = dict(ds.analytes.values_list('id', 'name'))
+        for an_id, conc in ds.getAnalytesConc().items():
+            unit = ds.analytes_conc_unit.get(an_id, ds.CONC_UNIT_DEF)
+            factor = _concFactor(unit, units.setdefault(names[an_id], unit))
+            concs.setdefault(names[an_id], {}).update(
+                (cd_id, value * factor) for cd_id, value in conc.items()
+            )
+        for p in ds.getProcessingHistory():
+            history.append({
+                'name': p.name,
+                'method': p.method,
+                'method_display_name': p.method_display_name,
+                'custom_data': p.custom_data,
+            })
+    samples = [
+        cd._current_samples.data if cd._current_samples_id is not None else np.empty(0)
+        for cd in cds
+    ]
+    params = [list(cd.curve.params) for cd in cds]
+    paramnum = max([int(mmodels.Curve.Param.PARAMNUM)] + [len(p) for p in params])
+    memoryFile = io.BytesIO()
+    np.savez_compressed(
+        memoryFile,
+        version=np.array(1),
+        names=np.array([cd.curve.name for cd in cds], dtype=str),
+        comments=np.array([cd.curve.comment for cd in cds], dtype=str),
+        dates=np.array([cd.curve.date.strftime('%Y-%m-%d') for cd in cds], dtype=str),
+        params=np.array([p + [0] * (paramnum - len(p)) for p in params]).reshape(len(cds), paramnum),
+        lengths=np.array([len(cd.current) for cd in cds], dtype=np.int64),
+        time=_stackCurves([cd.time for cd in cds]),
+        potential=_stackCurves([cd.potential for cd in cds]),
+        current=_stackCurves([cd.current for cd in cds]),
+        samples_lengths=np.array([len(s) for s in samples], dtype=np.int64),
+        samples=_stackCurves(samples),
+        analytes=np.array(list(concs.keys()), dtype=str),
+        analytes_units=np.array([units[name] for name in concs.keys()], dtype=str),
+        concentrations=np.array(
+            [[conc.get(cd.id, 0.0) for conc in concs.values()] for cd in cds], dtype=np.float64
+        ).reshape(len(cds), len(concs)),
+        processing=np.array(json.dumps(history, default=_jsonDefault)),
+    )
     return memoryFile
@@ -0,0 +1,76 @@
+"""
+Helpers of the commands which upgrade databases created before
+the array store (upgradearrays) and the table of concentrations
+(upgradeconcs). There are no migrations, so the legacy columns
+are found by introspection and read with plain SQL.
+"""
+from django.db import connection
+
+
+def tableColumns(table: str) -> set:
+    """
+    Returns the names of columns of the table in the DB.
+    """
+    with connection.cursor() as cursor:
+        return {col.name for col in connection.introspection.get_table_description(cursor, table)}
+
+
+def iterRows(table: str, columns, batch: int):
+    """
+    Yields lists of at most batch rows (id, *columns) of the table,
+    ordered by id.
+    """
+    qn = connection.ops.quote_name
+    sql = 'SELECT %s, %s FROM %s WHERE %s > %%s ORDER BY %s LIMIT %i' % (
+        qn('id'),
+        ', '.join([qn(c) for c in columns]),
+        qn(table),
+        qn('id'),
+        qn('id'),
+        batch,
+    )
+    last_id = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [last_id])
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def updateRows(table: str, values: dict, ids) -> None:
+    """
+    Sets the columns (values is {column: value}) of the rows with ids.
+    """
+    qn = connection.ops.quote_name
+    ids = list(ids)
+    if not ids:
+        return
+    sql = 'UPDATE %s SET %s WHERE %s IN (%s)' % (
+        qn(table),
+        ', '.join('%s = %%s' % qn(c) for c in values),
+        qn('id'),
+        ', '.join(['%s'] * len(ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(values.values()) + ids)
+
+
+def addColumn(model, field_name: str) -> None:
+    """
+    Adds the column (and index) of the field to the table of the model.
+    The table is not rebuilt (as the schema editor of sqlite does),
+    so the legacy columns are kept.
+    """
+    qn = connection.ops.quote_name
+    field = model._meta.get_field(field_name)
+    editor = connection.schema_editor()
+    definition, params = editor.column_sql(model, field, include_default=False)
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE %s ADD COLUMN %s %s' % (
+            qn(model._meta.db_table), qn(field.column), definition
+        ), params)
+        for statement in editor._field_indexes_sql(model, field):
+            cursor.execute(str(statement))
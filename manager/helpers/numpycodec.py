@@ -0,0 +1,148 @@
+"""
+Binary serialization of numpy arrays stored in SimpleNumpyField.
+
+Each blob starts with a small header which describes codec, dtype and
+shape of the array, so the data can be restored without knowing how it
+was written. Blobs written by the old np.savez_compressed implementation
+(zip archives) have no header and are still decoded.
+"""
+import io
+import zlib
+import struct
+import hashlib
+from typing import Optional
+import numpy as np
+
+MAGIC = b'\x93VPY'
+VERSION = 1
+
+CODEC_RAW = 'raw'
+CODEC_DEFLATE = 'deflate'
+CODEC_SHUFFLE = 'shuffle'
+CODEC_NPZ = 'npz'  # legacy, np.savez_compressed
+
+CODECS = {
+    CODEC_RAW: 0,
+    CODEC_DEFLATE: 1,
+    CODEC_SHUFFLE: 2,
+}
+CODEC_NAMES = {v: k for k, v in CODECS.items()}
+
+DEFAULT_CODEC = CODEC_DEFLATE
+DEFAULT_LEVEL = 6
+
+_head = struct.Struct('<4sBBBB')  # magic, version, codec, len(dtype), ndim
+
+
+def encode(value, codec: str=DEFAULT_CODEC, level: int=DEFAULT_LEVEL) -> bytes:
+    """
+    Serialize array-like value with given codec.
+    The data is always stored as little-endian.
+    """
+    if codec not in CODECS:
+        raise ValueError('Unknown array codec: %s' % codec)
+    arr = _normalize(value)
+    dtype_str = arr.dtype.str.encode('ascii')
+    header = b''.join([
+        _head.pack(MAGIC, VERSION, CODECS[codec], len(dtype_str), arr.ndim),
+        dtype_str,
+        struct.pack('<%dq' % arr.ndim, *arr.shape),
+    ])
+    if codec == CODEC_RAW:
+        payload = arr.tobytes()
+    elif codec == CODEC_DEFLATE:
+        payload = zlib.compress(arr.tobytes(), level)
+    else:
+        payload = zlib.compress(_shuffle(arr), level)
+    return header + payload
+
+
+def decode(blob) -> np.ndarray:
+    """
+    Restore array from blob created either by encode or np.savez_compressed.
+    Arrays of raw codec are returned as read-only views of the blob.
+    """
+    codec, dtype, shape, offset = _readHeader(blob)
+    if codec == CODEC_NPZ:
+        return np.load(io.BytesIO(blob))['arr_0']
+    if codec == CODEC_RAW:
+        return np.frombuffer(blob, dtype=dtype, offset=offset).reshape(shape)
+    data = zlib.decompress(memoryview(blob)[offset:])
+    if codec == CODEC_DEFLATE:
+        return np.frombuffer(data, dtype=dtype).reshape(shape)
+    return _unshuffle(data, dtype).reshape(shape)
+
+
+def digest(value) -> str:
+    """
+    Returns hex digest which identifies the content of array,
+    it does not depend on the codec nor on the byte order.
+    """
+    arr = _normalize(value)
+    h = hashlib.sha1(arr.dtype.str.encode('ascii'))
+    h.update(struct.pack('<%dq' % arr.ndim, *arr.shape))
+    h.update(arr.data if arr.size else b'')
+    return h.hexdigest()
+
+
+def codec_of(blob) -> Optional[str]:
+    """
+    Returns name of the codec used to write blob, or None for empty blob.
+    """
+    if blob is None or len(blob) == 0:
+        return None
+    return _readHeader(blob)[0]
+
+
+def shape_of(blob) -> tuple:
+    """
+    Returns shape of the serialized array, reading only the header
+    (legacy blobs have to be decoded).
+    """
+    codec, dtype, shape, offset = _readHeader(blob)
+    if codec == CODEC_NPZ:
+        return decode(blob).shape
+    return tuple(shape)
+
+
+def _normalize(value) -> np.ndarray:
+    arr = np.asarray(value)
+    if arr.dtype.hasobject:
+        raise ValueError('Arrays of objects cannot be serialized.')
+    if arr.dtype.byteorder == '>':
+        arr = arr.astype(arr.dtype.newbyteorder('<'))
+    return np.ascontiguousarray(arr)
+
+
+def _readHeader(blob):
+    mv = memoryview(blob)
+    if len(mv) < _head.size or bytes(mv[:4]) != MAGIC:
+        return CODEC_NPZ, None, None, 0
+    magic, version, codec_id, dtlen, ndim = _head.unpack_from(mv, 0)
+    if version != VERSION or codec_id not in CODEC_NAMES:
+        raise ValueError('Unsupported array blob (version %i, codec %i).' % (version, codec_id))
+    offset = _head.size
+    dtype = np.dtype(bytes(mv[offset:offset+dtlen]).decode('ascii'))
+    offset += dtlen
+    shape = struct.unpack_from('<%dq' % ndim, mv, offset)
+    offset += 8 * ndim
+    return CODEC_NAMES[codec_id], dtype, shape, offset
+
+
+def _shuffle(arr: np.ndarray) -> bytes:
+    """
+    Groups n-th bytes of all elements together, which makes
+    slowly changing float vectors much more compressible.
+    """
+    itemsize = arr.dtype.itemsize
+    if itemsize == 1 or arr.size == 0:
+        return arr.tobytes()
+    return arr.view(np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype: np.dtype) -> np.ndarray:
+    itemsize = dtype.itemsize
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if itemsize == 1 or raw.size == 0:
+        return raw.view(dtype)
+    return np.ascontiguousarray(raw.reshape(itemsize, -1).T).view(dtype).reshape(-1)
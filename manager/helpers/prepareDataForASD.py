@@ -16,7 +16,7 @@ def prepareDataForASD(
         method_type: int,
         centering: bool
 ):
-    cds = dataset.curves_data.all()
+    cds = dataset.loadCurves(arrays=('current_samples',))
     if len(cds) == 0:
         raise VoltPyFailed('Dataset error.')
     cd1 = cds[0]
@@ -41,43 +41,29 @@ def prepareDataForASD(
             if cd.curve.params[p] != cd1.curve.params[p]:
                 raise VoltPyFailed('All curves in dataset have to be similar.')
 
+    # Samples are sliced to the selected range before copying, so
+    # memory mapped data is read only where it is needed.
+    samples_len = cd1.samples_number
     if method_type == TYPE_SEPARATE:
-        main_data_1 = np.zeros(
-            (tptw, int(len(cd1.current_samples)/tptw/2), len(cds))
-        )
-        main_data_2 = np.zeros(
-            (tptw, int(len(cd1.current_samples)/tptw/2), len(cds))
-        )
+        sel = range(int(samples_len/tptw/2))[start_index:end_index]
+        main_data_1 = np.zeros((tptw, len(sel), len(cds)))
+        main_data_2 = np.zeros((tptw, len(sel), len(cds)))
         for cnum, cd in enumerate(cds):
-            pos = 0
-            for i in np.arange(0, len(cd1.current_samples), 2*tptw):
-                pos = int(i/(2*tptw))
-                main_data_1[:, pos, cnum] = cd.current_samples[i:(i+tptw)]
-                main_data_2[:, pos, cnum] = cd.current_samples[(i+tptw):(i+(2*tptw))]
-        main_data_1 = main_data_1[:, start_index:end_index, :]
-        main_data_2 = main_data_2[:, start_index:end_index, :]
+            windows = _windows(cd.current_samples, 2*tptw, sel)
+            main_data_1[:, :, cnum] = windows[:tptw, :]
+            main_data_2[:, :, cnum] = windows[tptw:, :]
 
     elif method_type == TYPE_TOGETHER:
-        main_data_1 = np.zeros(
-            (tptw, int(len(cd1.current_samples)/tptw), len(cds))
-        )
+        sel = range(int(samples_len/tptw))[2*start_index:2*end_index]
+        main_data_1 = np.zeros((tptw, len(sel), len(cds)))
         for cnum, cd in enumerate(cds):
-            pos = 0
-            for i in np.arange(0, len(cd1.current_samples), tptw):
-                pos = int(i/tptw)
-                main_data_1[:, pos, cnum] = cd.current_samples[i:(i+tptw)]
-        main_data_1 = main_data_1[:, 2*start_index:2*end_index, :]
+            main_data_1[:, :, cnum] = _windows(cd.current_samples, tptw, sel)
 
     elif method_type == TYPE_COMBINED:
-        main_data_1 = np.zeros(
-            (2*tptw, int(len(cd1.current_samples)/tptw/2), len(cds))
-        )
+        sel = range(int(samples_len/tptw/2))[start_index:end_index]
+        main_data_1 = np.zeros((2*tptw, len(sel), len(cds)))
         for cnum, cd in enumerate(cds):
-            pos = 0
-            for i in np.arange(0, len(cd1.current_samples), 2*tptw):
-                pos = int(i/(2*tptw))
-                main_data_1[:, pos, cnum] = cd.current_samples[i:(i+2*tptw)]
-        main_data_1 = main_data_1[:, start_index:end_index, :]
+            main_data_1[:, :, cnum] = _windows(cd.current_samples, 2*tptw, sel)
 
     if centering:
         main_mean = np.mean(main_data_1, axis=0)
@@ -93,3 +79,11 @@ def prepareDataForASD(
     if method_type == TYPE_SEPARATE:
         return (main_data_1, main_data_2)
     return (main_data_1, None)
+
+
+def _windows(samples, width: int, sel: range) -> np.ndarray:
+    """
+    Returns windows of samples selected by sel as columns.
+    """
+    part = samples[sel.start*width:sel.stop*width]
+    return np.reshape(part, (len(sel), width)).T
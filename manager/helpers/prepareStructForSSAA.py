@@ -1,3 +1,4 @@
+import numpy as np
 from manager.helpers.setTpTw import *
 
 
@@ -25,13 +26,19 @@ def prepareStructForSSAA(rawData, concVec, realStepTime, tpValue, twVector, tech
     )
 
     data = dataStruct
-    for i, dataColumn in enumerate(rawData):
+    if len(set(len(dataColumn) for dataColumn in rawData)) <= 1:
+        # all columns at once
+        matrix = np.asarray(rawData, dtype=np.float64)
+        Y = [setTpTw(matrix, realStepTime, tpValue, twValue, technique)[0] for twValue in twVector]
+    else:
+        Y = [
+            [setTpTw(dataColumn, realStepTime, tpValue, twValue, technique)[0] for dataColumn in rawData]
+            for twValue in twVector
+        ]
+    for i in range(len(rawData)):
         for itw, twValue in enumerate(twVector):
-            data['Y'].append([])
-            data['CONC'].append([])
-            data['SENS'].append([])
-            data['Y'][-1], __, __ = setTpTw(dataColumn, realStepTime, tpValue, twValue, technique)
-            data['CONC'][-1] = concVec[i]
-            data['SENS'][-1] = itw
+            data['Y'].append(np.asarray(Y[itw][i]).tolist())
+            data['CONC'].append(concVec[i])
+            data['SENS'].append(itw)
 
     return data
@@ -0,0 +1,62 @@
+"""
+Pools of worker processes for CPU bound work (e.g. decoding of uploads).
+
+The workers are started with spawn, so they do not inherit the database
+connections of the web worker, and they never touch the database: they
+receive plain data and return plain data (numpy arrays, lists, dicts).
+The pools are created on first use and reused by the later requests.
+Each worker limits the threads of BLAS/OpenMP, so that the workers
+together do not use more threads than there are cores.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+_pools = {}
+_lock = threading.Lock()
+
+
+#: environment variables read by BLAS/OpenMP libraries when numpy is imported
+BLAS_THREADS_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+)
+
+
+def _initWorker(blasThreads):
+    # numpy is not imported yet, it is first imported by django.setup()
+    for var in BLAS_THREADS_VARS:
+        os.environ[var] = str(blasThreads)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voltPy.settings')
+    import django
+    django.setup()
+
+
+def getPool(name: str, workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the pool called name with given number of workers.
+    """
+    with _lock:
+        pool, size = _pools.get(name, (None, 0))
+        if pool is None or size != workers or getattr(pool, '_broken', False):
+            if pool is not None:
+                pool.shutdown(wait=False)
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initWorker,
+                initargs=(max(1, (os.cpu_count() or 1) // workers),),
+            )
+            _pools[name] = (pool, workers)
+        return pool
+
+
+def shutdownPools():
+    with _lock:
+        for pool, _ in _pools.values():
+            pool.shutdown(wait=True)
+        _pools.clear()
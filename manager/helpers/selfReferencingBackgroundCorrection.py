@@ -1,6 +1,6 @@
 import numpy as np
 import scipy.signal
-from manager.helpers.bkghelpers import calc_abc
+from manager.helpers.bkghelpers import calc_abc_matrix
 
 
 def selfReferencingBackgroundCorrection(yvectors, concs, sens, peak_ranges):
@@ -39,13 +39,15 @@ def selfReferencingBackgroundCorrection(yvectors, concs, sens, peak_ranges):
     sig = []
     peak_max = None
     peak_half_width = None
-    for sen, yvecs in sens_yvec.items():
-        maxconc = np.argmax(sens_conc[sen])
-        peak_param = peakParameters(yvecs[maxconc])
+    # the curve of the highest concentration of each sensitivity
+    candidates = [yvecs[np.argmax(sens_conc[sen])] for sen, yvecs in sens_yvec.items()]
+    no_bkgs = peakBackgroundCorrection(candidates) if candidates else []
+    for curve, no_bkg in zip(candidates, no_bkgs):
+        peak_param = peakParameters(curve, no_bkg)
         if peak_param is not None:
             peak_max = peak_param['peak_max_index']
             peak_half_width = peak_param['peak_half_width']
-            sig = yvecs[maxconc]
+            sig = curve
             break
     else:
         raise ValueError('Could not obtain result')
@@ -170,9 +172,22 @@ def selfReferencingBackgroundCorrection(yvectors, concs, sens, peak_ranges):
     return best_result
 
 
-def peakParameters(curve):
+def peakBackgroundCorrection(curves):
+    """
+    Removes the background of the curves (of equal length) before
+    the peak is searched, see peakParameters.
+    """
+    curves = np.array(curves, dtype=np.float64, ndmin=2)
+    return calc_abc_matrix(np.arange(curves.shape[1]), curves, 6, 20)[0]
+
+
+def peakParameters(curve, no_bkg=None):
+    """
+    no_bkg -- curve without background, computed if not given
+    """
     peak_is_sure = False
-    no_bkg = calc_abc(list(range(len(curve))), curve, 6, 20)['yvec']
+    if no_bkg is None:
+        no_bkg = peakBackgroundCorrection([curve])[0]
     no_bkg = scipy.signal.savgol_filter(np.array(no_bkg), 11, 3)
     maxindx = no_bkg.argmax()
     to_left = maxindx - 1
@@ -1,11 +1,65 @@
 import numpy as np
 
 
+scvLike = ['sc', 'scv']
+pulseLike = ['dp', 'dpv', 'np', 'npv']
+sqwLike = ['sqw', 'swv']
+
+
+def averageSteps(data, realStepTime, tpValue, twValue, incomplete=False):
+    """
+    Averages tpValue samples after twValue samples of each step of
+    realStepTime samples. data is a vector, or a matrix (curves x samples)
+    in which case all curves are processed at once.
+    incomplete -- if the samples do not fill the last step, average
+        what is there (True) or drop it (False).
+
+    returns array with one value per step along the last axis.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    length = data.shape[-1]
+    stepsNum = length // realStepTime
+    steps = data[..., :stepsNum*realStepTime].reshape(data.shape[:-1] + (stepsNum, realStepTime))
+    averaged = steps[..., twValue:twValue+tpValue].mean(axis=-1)
+    if incomplete and length > stepsNum*realStepTime:
+        st = stepsNum*realStepTime + twValue
+        rest = data[..., st:st+tpValue]
+        if rest.shape[-1] > 0:
+            last = rest.mean(axis=-1)
+        else:
+            last = np.full(data.shape[:-1], np.nan)
+        averaged = np.concatenate([averaged, last[..., np.newaxis]], axis=-1)
+    return averaged
+
+
+def combinePulses(averaged, technique):
+    """
+    Computes the signal of the technique from the averaged steps,
+    along the last axis (see setTpTw).
+
+    returns touple of
+    ( finalVector, onPulseVector, onStepVector)
+    """
+    averaged = np.asarray(averaged)
+    if technique in scvLike:
+        return averaged, averaged, averaged
+    pairs = averaged.shape[-1] // 2
+    first = averaged[..., 0:2*pairs:2]
+    second = averaged[..., 1:2*pairs:2]
+    if technique in pulseLike:
+        return second - first, first, second
+    elif technique in sqwLike:
+        return first - second, second, first
+    else:
+        raise LookupError('Unknown technique: %s' % technique)
+
+
 def setTpTw(data, realStepTime, tpValue, twValue, technique):
     """
     setTpTw is simple function to process RAW data form electrochemical
     analyzer. I can process data from SCV, DPV and NPV techniques.
-    sig - signal with raw data (readout from A/D converter)
+    sig - signal with raw data (readout from A/D converter), can be
+        matrix (curves x samples)
     realStepTime - total probing time of one step (i.e. in SCV it is tp, in DPV and
         NPV it is 2*tp
     tpValue - new tp time
@@ -16,44 +70,9 @@ def setTpTw(data, realStepTime, tpValue, twValue, technique):
     if returns touple of
     ( finalVector, onPulseVector, onStepVector)
     """
-    # TODO: preallocate arrays ?
     sumtptw = twValue + tpValue
     assert realStepTime >= sumtptw
-    averagedTmp = []
-    scvLike = ['sc', 'scv']
-    pulseLike = ['dp', 'dpv', 'np', 'npv']
-    sqwLike = ['sqw', 'swv']
-    for i in np.arange(0, len(data), realStepTime):
-        st = (i+twValue)
-        end = st+tpValue
-        averagedTmp.append(np.mean(data[st:end]))
-
-    if technique in scvLike:
-        return averagedTmp, averagedTmp, averagedTmp
-    
-    elif technique in pulseLike:
-        res = []
-        partial1 = []
-        partial2 = []
-        for i in np.arange(0, len(averagedTmp)-1, 2):
-            i = int(i)
-            res.append(averagedTmp[i+1] - averagedTmp[i] )
-            partial1.append(averagedTmp[i])
-            partial2.append(averagedTmp[i+1])
-
-        return res, partial1, partial2
-
-    elif technique in sqwLike:
-        res = []
-        partial1 = []
-        partial2 = []
-
-        for i in np.arange(0, len(averagedTmp)-1, 2):
-            i = int(i)
-            res.append(averagedTmp[i] - averagedTmp[i+1])
-            partial1.append(averagedTmp[i+1])
-            partial2.append(averagedTmp[i])
-        return res, partial1, partial2
-
-    else:
+    if technique not in scvLike + pulseLike + sqwLike:
         raise LookupError('Unknown technique: %s' % technique)
+    averaged = averageSteps(data, realStepTime, tpValue, twValue, incomplete=True)
+    return combinePulses(averaged, technique)
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+import manager.models as mmodels
+from manager.exceptions import VoltPyDoesNotExists
+from manager.helpers.decorators import acting_as
+from manager.operations import batch
+
+
+class Command(BaseCommand):
+    """
+    Applies completed processing, analysis or pipeline to the datasets:
+
+    ./manage.py applybatch --user NAME --processing ID DATASET_ID [DATASET_ID ...]
+    ./manage.py applybatch --user NAME --analysis ID --workers 4 DATASET_ID [DATASET_ID ...]
+    """
+    help = 'Apply processing, analysis or pipeline to many datasets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('datasets', nargs='+', type=int, help='Ids of the datasets.')
+        parser.add_argument('--user', required=True, help='Username of the owner of the work.')
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--processing', type=int, help='Id of completed processing.')
+        source.add_argument('--analysis', type=int, help='Id of completed analysis.')
+        source.add_argument('--pipeline', type=int, help='Id of pipeline.')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes (VOLTPY_BATCH_WORKERS by default).'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except ObjectDoesNotExist:
+            raise CommandError('User %s does not exist.' % options['user'])
+        for name, model in (
+            ('processing', mmodels.Processing),
+            ('analysis', mmodels.Analysis),
+            ('pipeline', mmodels.Pipeline),
+        ):
+            if options[name] is not None:
+                try:
+                    with acting_as(user):
+                        source = model.get(id=options[name])
+                except VoltPyDoesNotExists:
+                    raise CommandError('%s %i does not exist.' % (name.capitalize(), options[name]))
+                break
+
+        result = batch.applyBatch(user, source, options['datasets'], options['workers'])
+        self.stdout.write('Applied %s to %i datasets.' % (source, len(result['done'])))
+        for ds_id, reason in sorted(result['failed'].items()):
+            self.stderr.write('Dataset %i failed: %s' % (ds_id, reason))
+        if result['failed']:
+            raise CommandError('%i datasets failed.' % len(result['failed']))
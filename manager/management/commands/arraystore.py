@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+import manager.models as mmodels
+
+
+class Command(BaseCommand):
+    """
+    Maintenance of the content-addressed array store:
+
+    ./manage.py arraystore            # deduplication report
+    ./manage.py arraystore --gc       # delete unreferenced blobs
+    ./manage.py arraystore --gc --recount
+    """
+    help = 'Report on and garbage collect the array store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gc', action='store_true', help='Delete blobs which are not referenced.')
+        parser.add_argument('--recount', action='store_true', help='Rebuild reference counts first.')
+
+    def handle(self, *args, **options):
+        if options['recount'] and not options['gc']:
+            mmodels.ArrayBlob.recount()
+        if options['gc']:
+            deleted = mmodels.ArrayBlob.collectGarbage(recount=options['recount'])
+            self.stdout.write('Deleted %i unreferenced blobs.' % deleted)
+        report = mmodels.ArrayBlob.dedupReport()
+        self.stdout.write('\n'.join([
+            'Blobs: %i, references: %i' % (report['blobs'], report['refs']),
+            'Referenced arrays: %.1f MB' % (report['logical'] / 2**20),
+            'Unique arrays: %.1f MB' % (report['unique'] / 2**20),
+            'Stored (encoded): %.1f MB' % (report['stored'] / 2**20),
+            'Deduplication ratio: %.2f' % report['dedup_ratio'],
+            'Compression ratio: %.2f' % report['compression_ratio'],
+        ]))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+import manager.models as mmodels
+
+
+class Command(BaseCommand):
+    """
+    Moves multi-sampling data between the DB and .npy files
+    in VOLTPY_ARRAYS_ROOT:
+
+    ./manage.py movesampling --to file
+    ./manage.py movesampling --to db
+
+    Set VOLTPY_SAMPLING_STORAGE accordingly, so new uploads
+    use the same storage.
+    """
+    help = 'Move multi-sampling data between the DB and .npy files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to',
+            required=True,
+            choices=[s[0] for s in mmodels.ArrayBlob.STORAGES],
+        )
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options):
+        hashes = mmodels.SamplingData.objects.filter(
+            data__isnull=False
+        ).values_list('data', flat=True).distinct().order_by('data')
+        moved = 0
+        last = ''
+        while True:
+            batch = list(hashes.filter(data__gt=last)[:options['batch']])
+            if not batch:
+                break
+            last = batch[-1]
+            moved += mmodels.ArrayBlob.moveTo(batch, options['to'])
+        self.stdout.write('Moved %i arrays to %s storage.' % (moved, options['to']))
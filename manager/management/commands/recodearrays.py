@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+import manager.models as mmodels
+from manager.helpers import numpycodec
+
+
+class Command(BaseCommand):
+    """
+    Rewrites numpy arrays stored in the DB with the given codec:
+
+    ./manage.py recodearrays --codec raw
+
+    Databases created before ArrayBlob keep the (np.savez_compressed)
+    arrays in CurveData and SamplingData, ./manage.py upgradearrays
+    moves them to ArrayBlob, encoded with the current codec.
+    """
+    help = 'Rewrite stored numpy arrays with the selected codec.'
+
+    models_fields = (
+        (mmodels.ArrayBlob, ('data',)),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--codec',
+            choices=list(numpycodec.CODECS.keys()),
+            default=getattr(settings, 'VOLTPY_ARRAY_CODEC', numpycodec.DEFAULT_CODEC),
+        )
+        parser.add_argument(
+            '--level',
+            type=int,
+            default=getattr(settings, 'VOLTPY_ARRAY_LEVEL', numpycodec.DEFAULT_LEVEL),
+        )
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options):
+        codec = options['codec']
+        level = options['level']
+        for model, fields in self.models_fields:
+            done = self.recodeModel(model, fields, codec, level, options['batch'])
+            self.stdout.write('%s: rewritten %i rows.' % (model.__name__, done))
+
+    def recodeModel(self, model, fields, codec, level, batch):
+        """
+        Blobs are read directly, so rows which already use
+        the target codec are not decoded at all.
+        """
+        qn = connection.ops.quote_name
+        columns = [model._meta.get_field(f).column for f in fields]
+        sql = 'SELECT %s, %s FROM %s WHERE %s > %%s ORDER BY %s LIMIT %i' % (
+            qn('id'),
+            ', '.join([qn(c) for c in columns]),
+            qn(model._meta.db_table),
+            qn('id'),
+            qn('id'),
+            batch,
+        )
+        last_id = 0
+        done = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [last_id])
+                rows = cursor.fetchall()
+            if not rows:
+                return done
+            with transaction.atomic():
+                for row in rows:
+                    last_id = row[0]
+                    update = {}
+                    for fname, blob in zip(fields, row[1:]):
+                        if blob is None or numpycodec.codec_of(blob) == codec:
+                            continue
+                        arr = numpycodec.decode(bytes(blob))
+                        update[fname] = numpycodec.encode(arr, codec, level)
+                    if update:
+                        # QuerySet.update bypasses read only CurveData.save
+                        model.objects.filter(id=row[0]).update(**update)
+                        done += 1
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+import manager.models as mmodels
+from manager.helpers import legacy
+from manager.helpers import numpycodec
+
+
+class Command(BaseCommand):
+    """
+    Moves numpy arrays kept in the columns of CurveData and SamplingData,
+    in databases created before ArrayBlob, to the array store:
+
+    ./manage.py migrate --run-syncdb   # creates the new tables
+    ./manage.py upgradearrays
+
+    The columns referencing ArrayBlob are added when missing. Legacy
+    blobs of any codec (also np.savez_compressed) are decoded and stored
+    with the current codec, the copied legacy values are set to NULL,
+    so the command can be run again, e.g. after it was interrupted.
+    """
+    help = 'Move legacy numpy arrays of CurveData and SamplingData to ArrayBlob.'
+
+    models_fields = (
+        (mmodels.CurveData, ('time', 'potential', 'current')),
+        (mmodels.SamplingData, ('data',)),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model, fields in self.models_fields:
+            table = model._meta.db_table
+            columns = legacy.tableColumns(table)
+            fields = [model._meta.get_field(f) for f in fields]
+            for f in fields:
+                if f.column not in columns:
+                    legacy.addColumn(model, f.name)
+            fields = [f for f in fields if f.name in columns]
+            if not fields:
+                self.stdout.write('%s: there are no legacy arrays.' % model.__name__)
+                continue
+            done = 0
+            for rows in legacy.iterRows(table, [f.name for f in fields] + [f.column for f in fields], options['batch']):
+                with transaction.atomic():
+                    done += self.moveRows(model, fields, rows)
+            self.stdout.write('%s: moved arrays of %i rows.' % (model.__name__, done))
+
+    def moveRows(self, model, fields, rows) -> int:
+        """
+        Stores the legacy arrays of rows (id, *legacy, *current hashes)
+        in ArrayBlob and points the rows to them.
+        """
+        qn = connection.ops.quote_name
+        num = len(fields)
+        rows = [row for row in rows if any(blob is not None for blob in row[1:num+1])]
+        released = []
+        for i, f in enumerate(fields):
+            todo = [row for row in rows if row[1+i] is not None]
+            if not todo:
+                continue
+            hashes = mmodels.ArrayBlob.store(
+                [numpycodec.decode(bytes(row[1+i])) for row in todo],
+                f.getStorage()
+            )
+            released.extend(row[1+num+i] for row in todo)
+            with connection.cursor() as cursor:
+                cursor.executemany('UPDATE %s SET %s = %%s, %s = NULL WHERE %s = %%s' % (
+                    qn(model._meta.db_table), qn(f.column), qn(f.name), qn('id')
+                ), [(blob_hash, row[0]) for blob_hash, row in zip(hashes, todo)])
+        # the arrays stored before in the new columns are replaced
+        mmodels.ArrayBlob.release(released)
+        return len(rows)
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from picklefield.fields import dbsafe_decode, dbsafe_encode
+import manager.models as mmodels
+from manager.helpers import legacy
+
+
+class Command(BaseCommand):
+    """
+    Copies concentrations of analytes from the pickled
+    Dataset.analytes_conc column of databases created before
+    AnalyteConcentration, to the new table:
+
+    ./manage.py migrate --run-syncdb   # creates the new tables
+    ./manage.py upgradeconcs
+
+    The copied values are replaced by {}, so the command
+    can be run again, e.g. after it was interrupted.
+    """
+    help = 'Copy legacy pickled concentrations of analytes to AnalyteConcentration.'
+
+    legacy_column = 'analytes_conc'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options):
+        table = mmodels.Dataset._meta.db_table
+        if self.legacy_column not in legacy.tableColumns(table):
+            self.stdout.write('There is no legacy %s column, nothing to do.' % self.legacy_column)
+            return
+        datasets = 0
+        rows = 0
+        for batch in legacy.iterRows(table, [self.legacy_column], options['batch']):
+            with transaction.atomic():
+                done, created = self.copyConcs(batch)
+                legacy.updateRows(table, {self.legacy_column: dbsafe_encode({})}, done)
+            datasets += len(done)
+            rows += created
+        self.stdout.write('Copied %i concentrations of %i datasets.' % (rows, datasets))
+
+    def copyConcs(self, batch):
+        """
+        Creates the rows missing in AnalyteConcentration, for the
+        curves and analytes which still exist. Returns the ids of
+        datasets with concentrations and the number of created rows.
+        """
+        concs = {}
+        for ds_id, pickled in batch:
+            if not pickled:
+                continue
+            analytes_conc = dbsafe_decode(pickled)
+            if analytes_conc:
+                concs[ds_id] = analytes_conc
+        if not concs:
+            return [], 0
+        cd_ids = {int(cd_id) for conc in concs.values() for an in conc.values() for cd_id in an}
+        an_ids = {int(an_id) for conc in concs.values() for an_id in conc}
+        cd_ids = self.existingIds(mmodels.CurveData, cd_ids)
+        an_ids = self.existingIds(mmodels.Analyte, an_ids)
+        existing = set(mmodels.AnalyteConcentration.objects.filter(
+            dataset_id__in=list(concs.keys())
+        ).values_list('dataset_id', 'analyte_id', 'curve_data_id'))
+        new = [
+            mmodels.AnalyteConcentration(
+                dataset_id=ds_id,
+                analyte_id=int(an_id),
+                curve_data_id=int(cd_id),
+                value=float(value),
+            )
+            for ds_id, conc in concs.items()
+            for an_id, an_conc in conc.items() if int(an_id) in an_ids
+            for cd_id, value in an_conc.items()
+            if int(cd_id) in cd_ids and (ds_id, int(an_id), int(cd_id)) not in existing
+        ]
+        mmodels.AnalyteConcentration.objects.bulk_create(new, batch_size=500)
+        return list(concs.keys()), len(new)
+
+    @staticmethod
+    def existingIds(model, ids, batch=500) -> set:
+        ids = list(ids)
+        ret = set()
+        for beg in range(0, len(ids), batch):
+            ret.update(model.objects.filter(id__in=ids[beg:beg+batch]).values_list('id', flat=True))
+        return ret
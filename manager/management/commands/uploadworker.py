@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from manager.uploads import jobs
+
+
+class Command(BaseCommand):
+    """
+    Processes the queued uploads (VOLTPY_UPLOAD_JOBS = worker):
+
+    ./manage.py uploadworker            # runs until stopped
+    ./manage.py uploadworker --once     # processes the queue and exits
+    """
+    help = 'Process queued uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls of the queue.')
+
+    def handle(self, *args, **options):
+        while True:
+            done = jobs.runPending()
+            if done:
+                self.stdout.write('Processed %i uploads.' % done)
+            if options['once']:
+                return
+            time.sleep(options['interval'])
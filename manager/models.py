@@ -1,4 +1,4 @@
-import io
+import os
 import numpy as np
 from copy import copy
 from enum import IntEnum
@@ -6,25 +6,133 @@ from typing import Dict, List
 from overrides import overrides
 from guardian.shortcuts import get_user_perms
 from django.db import models
+from django.db import transaction
+from django.db import IntegrityError
+from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Group
 from django.utils.safestring import mark_safe
 from django.db.models.signals import post_save
+from django.db.models.signals import post_delete
+from django.db.models.signals import m2m_changed
 from django.db.models import Q
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.query_utils import DeferredAttribute
 from django.dispatch import receiver
 from picklefield.fields import PickledObjectField
 from manager.voltpymodel import VoltPyModel
+from manager.voltpymodel import bulk_insert
+from manager.voltpymodel import assign_owner_perms
 from manager.exceptions import VoltPyNotAllowed
+from manager.exceptions import VoltPyFailed
+from manager.helpers import numpycodec
+from manager.helpers.arraycache import ArrayCache
 import manager
 
+QUERY_BATCH = 500  # below the limit of sqlite query variables
+
+
+class LazyNumpyAttribute(DeferredAttribute):
+    """
+    Keeps the array as loaded from the DB until it is first accessed,
+    then the field decodes it (SimpleNumpyField from the blob of the
+    column, StoredNumpyField from the ArrayBlob of the hash), see
+    getArray and setArray of the fields.
+    """
+    def __init__(self, field_name, field):
+        super().__init__(field_name)
+        self.field = field
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        return self.field.getArray(instance)
+
+    def __set__(self, instance, value):
+        inherited = instance.__dict__.get('_inherited_arrays')
+        if inherited:
+            inherited.discard(self.field.name)
+        self.field.setArray(instance, value)
+
 
 class SimpleNumpyField(models.BinaryField):
+    """
+    Stores numpy array in binary field. The codec used for writing
+    can be set per field (codec=, level=), otherwise VOLTPY_ARRAY_CODEC
+    and VOLTPY_ARRAY_LEVEL from settings are used. Reading does not depend
+    on the setting, see manager.helpers.numpycodec.
+    """
+    def __init__(self, *args, codec: str=None, level: int=None, **kwargs):
+        if codec is not None and codec not in numpycodec.CODECS:
+            raise ValueError('Unknown array codec: %s' % codec)
+        self.codec = codec
+        self.level = level
+        super().__init__(*args, **kwargs)
+
+    @overrides
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.codec is not None:
+            kwargs['codec'] = self.codec
+        if self.level is not None:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def getCodec(self):
+        codec = self.codec or getattr(settings, 'VOLTPY_ARRAY_CODEC', numpycodec.DEFAULT_CODEC)
+        level = self.level
+        if level is None:
+            level = getattr(settings, 'VOLTPY_ARRAY_LEVEL', numpycodec.DEFAULT_LEVEL)
+        return codec, level
+
+    @overrides
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        setattr(cls, self.attname, LazyNumpyAttribute(self.attname, self))
+
     def from_db_value(self, value, expression, connection):
+        # Decoded by LazyNumpyAttribute on first access.
+        return value
+
+    def getRawValue(self, model_instance):
+        """
+        Returns the value of the field, which can still be an undecoded blob.
+        """
+        if self.attname not in model_instance.__dict__:
+            model_instance.refresh_from_db(fields=[self.attname])
+        return model_instance.__dict__[self.attname]
+
+    def getArray(self, model_instance):
+        value = self.getRawValue(model_instance)
+        if isinstance(value, (bytes, memoryview)):
+            value = numpycodec.decode(value)
+            model_instance.__dict__[self.attname] = value
+        return value
+
+    def setArray(self, model_instance, value):
+        model_instance.__dict__[self.attname] = value
+
+    @overrides
+    def pre_save(self, model_instance, add):
+        if self.attname in model_instance.__dict__:
+            # Do not decode array only to encode it again.
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def getShape(self, model_instance):
+        """
+        Returns shape of the array stored on model_instance
+        without decoding it, or None if not set.
+        """
+        value = self.getRawValue(model_instance)
         if value is None:
-            return value
-        bf = io.BytesIO(value)
-        return np.load(bf)['arr_0']
+            return None
+        if isinstance(value, (bytes, memoryview)):
+            return numpycodec.shape_of(value)
+        return np.shape(value)
 
     @overrides
     def to_python(self, value):
@@ -32,15 +140,494 @@ class SimpleNumpyField(models.BinaryField):
             return value
         if value is None:
             return value
-        bf = io.BytesIO(value)
-        return np.load(bf)['arr_0']
+        return numpycodec.decode(value)
 
     @overrides
     def get_prep_value(self, value):
-        value = np.array(value)
-        bf = io.BytesIO()
-        np.savez_compressed(bf, value)
-        return bf.getvalue()
+        if value is None:
+            return value
+        if isinstance(value, (bytes, memoryview)):
+            # already serialized
+            return value
+        codec, level = self.getCodec()
+        return numpycodec.encode(value, codec, level)
+
+
+class ArrayBlob(models.Model):
+    """
+    Content-addressed storage of numpy arrays. Identical arrays
+    (e.g. the potential of all curves of a file) are stored once,
+    refs is the number of objects which point to the blob. Blobs are
+    referenced (and cached) by the hash, so the cache cannot go stale.
+
+    Blobs with FILE storage are kept as .npy files in VOLTPY_ARRAYS_ROOT
+    and are read as memory mapped arrays, so only the accessed
+    pages of large arrays are read from the disk.
+    """
+    STORAGE_DB = 'db'
+    STORAGE_FILE = 'file'
+    STORAGES = (
+        (STORAGE_DB, 'Database'),
+        (STORAGE_FILE, 'File'),
+    )
+
+    hash = models.CharField(max_length=40, unique=True)
+    data = SimpleNumpyField(null=True, default=None)
+    storage = models.CharField(max_length=4, choices=STORAGES, default=STORAGE_DB)
+    shape = models.CharField(max_length=64)
+    nbytes = models.BigIntegerField(default=0)
+    refs = models.IntegerField(default=0)
+
+    MAX_MAPPED = 1024  # number of memory mapped arrays kept open
+    SHAPE_COST = 64  # bytes, estimated size of cached shape
+    _cache = None
+    _mapped = None
+
+    @classmethod
+    def getCache(cls) -> ArrayCache:
+        """
+        Returns the cache of arrays (keyed by hash),
+        and of their shapes (keyed by ('shape', hash)).
+        """
+        if cls._cache is None:
+            cls._cache = ArrayCache(
+                getattr(settings, 'VOLTPY_ARRAY_CACHE_MB', 128) * 1024 * 1024,
+                sizeof=lambda val: val.nbytes if isinstance(val, np.ndarray) else cls.SHAPE_COST
+            )
+            cls._mapped = ArrayCache(cls.MAX_MAPPED, sizeof=lambda arr: 1)
+        return cls._cache
+
+    @staticmethod
+    def filePath(blob_hash: str) -> str:
+        return os.path.join(settings.VOLTPY_ARRAYS_ROOT, blob_hash[:2], blob_hash + '.npy')
+
+    @classmethod
+    def _writeFile(cls, blob_hash: str, arr):
+        path = cls.filePath(blob_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '%s.%i.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, np.asarray(arr))
+        os.replace(tmp, path)
+
+    @classmethod
+    def _mapFile(cls, blob_hash: str) -> np.ndarray:
+        cls.getCache()
+        arr = cls._mapped.get(blob_hash)
+        if arr is None:
+            arr = cls._mapped.put(blob_hash, np.load(cls.filePath(blob_hash), mmap_mode='r'))
+        return arr
+
+    @classmethod
+    def store(cls, arrays: List, storage: str=STORAGE_DB) -> List[str]:
+        """
+        Stores arrays which are not in the DB yet, increases the reference
+        count of all of them, returns hashes of blobs in order of arrays.
+        """
+        digests = [numpycodec.digest(arr) for arr in arrays]
+        existing = cls._existing(set(digests))
+        new = {}
+        for dig, arr in zip(digests, arrays):
+            if dig not in existing and dig not in new:
+                arr = np.asarray(arr)
+                new[dig] = cls(
+                    hash=dig,
+                    data=arr if storage == cls.STORAGE_DB else None,
+                    storage=storage,
+                    shape=','.join(map(str, arr.shape)),
+                    nbytes=arr.nbytes,
+                )
+                if storage == cls.STORAGE_FILE:
+                    cls._writeFile(dig, arr)
+        if new:
+            try:
+                with transaction.atomic():
+                    bulk_insert(cls, list(new.values()))
+            except IntegrityError:
+                # some were inserted concurrently by other process,
+                # the rest has to be inserted again
+                cls._insertMissing(new)
+        cls._changeRefs(digests, +1)
+        return digests
+
+    @classmethod
+    def _insertMissing(cls, new: Dict):
+        """
+        Inserts one by one the blobs (new is {hash: ArrayBlob})
+        which are not in the DB.
+        """
+        for dig in set(new) - cls._existing(new.keys()):
+            blob = new[dig]
+            blob.pk = None  # could be set by the rolled back insert
+            try:
+                with transaction.atomic():
+                    blob.save(force_insert=True)
+            except IntegrityError:
+                pass  # inserted concurrently in the meantime
+
+    @classmethod
+    def release(cls, hashes: List[str]):
+        """
+        Decreases the reference count, blobs are deleted by collectGarbage.
+        """
+        cls._changeRefs([h for h in hashes if h is not None], -1)
+
+    @classmethod
+    def load(cls, hashes: List[str]) -> Dict:
+        """
+        Returns {hash: array}, decoding only arrays which are not cached.
+        """
+        cache = cls.getCache()
+        ret = {}
+        missing = []
+        for h in set(hashes):
+            arr = cache.get(h)
+            if arr is None:
+                arr = cls._mapped.get(h)
+            if arr is None:
+                missing.append(h)
+            else:
+                ret[h] = arr
+        for beg in range(0, len(missing), QUERY_BATCH):
+            rows = cls.objects.filter(hash__in=missing[beg:beg+QUERY_BATCH]).only('hash', 'data', 'storage')
+            for blob in rows:
+                if blob.storage == cls.STORAGE_FILE:
+                    ret[blob.hash] = cls._mapFile(blob.hash)
+                else:
+                    ret[blob.hash] = cache.put(blob.hash, blob.data)
+        return ret
+
+    @classmethod
+    def moveTo(cls, hashes: List[str], storage: str) -> int:
+        """
+        Moves blobs between the DB and the files,
+        returns the number of moved blobs.
+        """
+        moved = 0
+        hashes = list(hashes)
+        for beg in range(0, len(hashes), QUERY_BATCH):
+            blobs = cls.objects.filter(
+                hash__in=hashes[beg:beg+QUERY_BATCH]
+            ).exclude(storage=storage)
+            for blob in blobs:
+                with transaction.atomic():
+                    if storage == cls.STORAGE_FILE:
+                        cls._writeFile(blob.hash, blob.data)
+                        cls.objects.filter(id=blob.id).update(storage=storage, data=None)
+                    else:
+                        blob.data = np.load(cls.filePath(blob.hash))
+                        blob.storage = storage
+                        blob.save(update_fields=['data', 'storage'])
+                if storage == cls.STORAGE_DB:
+                    cls.getCache()
+                    cls._mapped.pop(blob.hash)
+                    os.remove(cls.filePath(blob.hash))
+                moved += 1
+        return moved
+
+    @classmethod
+    def getArray(cls, blob_hash: str) -> np.ndarray:
+        return cls.load([blob_hash])[blob_hash]
+
+    @classmethod
+    def getShape(cls, blob_hash: str) -> tuple:
+        cache = cls.getCache()
+        arr = cache.get(blob_hash)
+        if arr is None:
+            arr = cls._mapped.get(blob_hash)
+        if arr is not None:
+            return arr.shape
+        shape = cache.get(('shape', blob_hash))
+        if shape is None:
+            shape = cls.objects.filter(hash=blob_hash).values_list('shape', flat=True).get()
+            shape = cache.put(('shape', blob_hash), tuple(int(x) for x in shape.split(',') if x))
+        return shape
+
+    @classmethod
+    def referencingFields(cls) -> List:
+        return [
+            f for model in (CurveData, SamplingData)
+            for f in model._meta.concrete_fields if isinstance(f, StoredNumpyField)
+        ]
+
+    @classmethod
+    def recount(cls):
+        """
+        Rebuilds reference counts from the objects pointing to the blobs.
+        """
+        counts = {}
+        for f in cls.referencingFields():
+            qs = f.model._base_manager.filter(**{f.attname + '__isnull': False})
+            for blob_hash, num in qs.values_list(f.attname).annotate(num=models.Count('id')).order_by():
+                counts[blob_hash] = counts.get(blob_hash, 0) + num
+        with transaction.atomic():
+            cls.objects.update(refs=0)
+            cls._changeRefs(counts, 0, absolute=True)
+
+    @classmethod
+    def collectGarbage(cls, recount: bool=False) -> int:
+        """
+        Deletes blobs which are not referenced anymore,
+        returns the number of deleted blobs.
+        """
+        if recount:
+            cls.recount()
+        unused = cls.objects.filter(refs__lte=0)
+        files = list(unused.filter(storage=cls.STORAGE_FILE).values_list('hash', flat=True))
+        deleted, _ = unused.delete()
+        for blob_hash in files:
+            try:
+                os.remove(cls.filePath(blob_hash))
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    @classmethod
+    def dedupReport(cls) -> Dict:
+        """
+        Compares the size of referenced arrays with the size of stored blobs.
+        """
+        stats = cls.objects.aggregate(
+            blobs=models.Count('id'),
+            refs=models.Sum('refs'),
+            logical=models.Sum(models.F('nbytes') * models.F('refs'), output_field=models.BigIntegerField()),
+            unique=models.Sum('nbytes'),
+        )
+        stats = {k: (v or 0) for k, v in stats.items()}
+        stats['stored'] = sum(
+            len(blob) for blob in cls.objects.filter(
+                storage=cls.STORAGE_DB
+            ).values_list('data', flat=True).iterator()
+        )
+        stats['stored'] += sum(
+            os.path.getsize(cls.filePath(blob_hash)) for blob_hash in cls.objects.filter(
+                storage=cls.STORAGE_FILE
+            ).values_list('hash', flat=True).iterator()
+        )
+        stats['dedup_ratio'] = stats['logical'] / stats['unique'] if stats['unique'] else 1.0
+        stats['compression_ratio'] = stats['unique'] / stats['stored'] if stats['stored'] else 1.0
+        return stats
+
+    @classmethod
+    def _existing(cls, digests) -> set:
+        digests = list(digests)
+        ret = set()
+        for beg in range(0, len(digests), QUERY_BATCH):
+            ret.update(cls.objects.filter(hash__in=digests[beg:beg+QUERY_BATCH]).values_list('hash', flat=True))
+        return ret
+
+    @classmethod
+    def _changeRefs(cls, hashes, change: int, absolute: bool=False):
+        """
+        Groups hashes by the size of change, so the number
+        of updates does not depend on the number of hashes.
+        """
+        if isinstance(hashes, dict):
+            counts = hashes
+        else:
+            counts = {}
+            for h in hashes:
+                counts[h] = counts.get(h, 0) + 1
+        by_change = {}
+        for blob_hash, num in counts.items():
+            by_change.setdefault(num * change if not absolute else num, []).append(blob_hash)
+        for value, blob_hashes in by_change.items():
+            for beg in range(0, len(blob_hashes), QUERY_BATCH):
+                qs = cls.objects.filter(hash__in=blob_hashes[beg:beg+QUERY_BATCH])
+                qs.update(refs=value if absolute else models.F('refs') + value)
+
+
+class StoredNumpyField(models.ForeignKey):
+    """
+    Numpy array kept in the content-addressed ArrayBlob store,
+    reads and writes arrays as SimpleNumpyField does.
+
+    With inherit_from set to the name of a foreign key to the same model,
+    NULL means "the same array as the referenced object", so derived
+    objects store only the arrays which were changed. The instance
+    should list unchanged field names in its _inherited_arrays set.
+
+    storage_setting is the name of the setting which selects
+    ArrayBlob storage of new arrays ('db' when not set).
+    """
+    def __init__(
+            self,
+            to='ArrayBlob',
+            on_delete=models.PROTECT,
+            inherit_from: str=None,
+            storage_setting: str=None,
+            **kwargs
+    ):
+        kwargs['to_field'] = 'hash'
+        kwargs['null'] = True
+        kwargs['default'] = None
+        kwargs['related_name'] = '+'
+        self.inherit_from = inherit_from
+        self.storage_setting = storage_setting
+        super().__init__(to, on_delete, **kwargs)
+
+    @overrides
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.inherit_from is not None:
+            kwargs['inherit_from'] = self.inherit_from
+        if self.storage_setting is not None:
+            kwargs['storage_setting'] = self.storage_setting
+        return name, path, args, kwargs
+
+    def getStorage(self) -> str:
+        if self.storage_setting is None:
+            return ArrayBlob.STORAGE_DB
+        return getattr(settings, self.storage_setting, ArrayBlob.STORAGE_DB)
+
+    def isInherited(self, model_instance) -> bool:
+        return self.name in model_instance.__dict__.get('_inherited_arrays', ())
+
+    def getHash(self, model_instance):
+        """
+        Returns the hash of the array, inherited hashes are looked up
+        in the chain of inherit_from (and cached on the instance).
+        """
+        if self.attname not in model_instance.__dict__:
+            model_instance.refresh_from_db(fields=[self.attname])
+        value = model_instance.__dict__[self.attname]
+        if value is not None or self.inherit_from is None:
+            return value
+        resolved = model_instance.__dict__.setdefault('_resolved_arrays', {})
+        if self.name in resolved:
+            return resolved[self.name]
+        fk = self.model._meta.get_field(self.inherit_from)
+        if fk.is_cached(model_instance):
+            base = fk.get_cached_value(model_instance)
+            value = None if base is None else self.getHash(base)
+        else:
+            base_id = getattr(model_instance, fk.attname)
+            while base_id is not None and value is None:
+                base_id, value = self.model._base_manager.filter(
+                    pk=base_id
+                ).values_list(fk.attname, self.attname).get()
+        resolved[self.name] = value
+        return value
+
+    def resolveHashes(self, instances: List[models.Model]) -> List[str]:
+        """
+        As getHash for all instances, with one query per level
+        of inheritance. Returns the hashes which are not None.
+        """
+        values = []
+        todo = []
+        for inst in instances:
+            if self.attname not in inst.__dict__:
+                inst.refresh_from_db(fields=[self.attname])
+            value = inst.__dict__[self.attname]
+            resolved = inst.__dict__.setdefault('_resolved_arrays', {})
+            if value is None and self.inherit_from is not None:
+                value = resolved.get(self.name, None)
+                if self.name not in resolved:
+                    todo.append((inst, getattr(inst, self.model._meta.get_field(self.inherit_from).attname)))
+            if value is not None:
+                values.append(value)
+        if todo:
+            fk = self.model._meta.get_field(self.inherit_from)
+            known = {}
+            while todo:
+                ids = list({base_id for _, base_id in todo if base_id is not None and base_id not in known})
+                for beg in range(0, len(ids), QUERY_BATCH):
+                    rows = self.model._base_manager.filter(
+                        pk__in=ids[beg:beg+QUERY_BATCH]
+                    ).values_list('pk', fk.attname, self.attname)
+                    known.update({pk: (base_id, value) for pk, base_id, value in rows})
+                next_todo = []
+                for inst, base_id in todo:
+                    base_base_id, value = known.get(base_id, (None, None))
+                    if value is None and base_base_id is not None:
+                        next_todo.append((inst, base_base_id))
+                        continue
+                    inst.__dict__['_resolved_arrays'][self.name] = value
+                    if value is not None:
+                        values.append(value)
+                todo = next_todo
+        return values
+
+    @overrides
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        # the attribute is the array, self.attname is the hash
+        setattr(cls, self.name, LazyNumpyAttribute(self.name, self))
+
+    def getArray(self, model_instance):
+        pending = model_instance.__dict__.get('_pending_arrays', {})
+        if self.name in pending:
+            return pending[self.name]
+        blob_hash = self.getHash(model_instance)
+        if blob_hash is None:
+            return None
+        return ArrayBlob.getArray(blob_hash)
+
+    def setArray(self, model_instance, value):
+        """
+        Arrays are stored in ArrayBlob when the instance is saved.
+        """
+        if isinstance(value, ArrayBlob):
+            model_instance.__dict__.get('_pending_arrays', {}).pop(self.name, None)
+            model_instance.__dict__[self.attname] = value.hash
+        else:
+            model_instance.__dict__.setdefault('_pending_arrays', {})[self.name] = value
+
+    @overrides
+    def pre_save(self, model_instance, add):
+        if self.isInherited(model_instance):
+            return None
+        self.storePending([model_instance])
+        return getattr(model_instance, self.attname)
+
+    def storePending(self, instances: List[models.Model]):
+        """
+        Moves arrays assigned to instances to ArrayBlob,
+        all at once, see bulk_insert.
+        """
+        todo = []
+        for inst in instances:
+            pending = inst.__dict__.get('_pending_arrays', {})
+            if self.name not in pending:
+                continue
+            if pending[self.name] is None:
+                inst.__dict__[self.attname] = None
+                pending.pop(self.name)
+            elif not self.isInherited(inst):
+                todo.append(inst)
+        if not todo:
+            return
+        hashes = ArrayBlob.store(
+            [inst.__dict__['_pending_arrays'][self.name] for inst in todo],
+            self.getStorage()
+        )
+        for inst, blob_hash in zip(todo, hashes):
+            inst.__dict__['_pending_arrays'].pop(self.name)
+            inst.__dict__[self.attname] = blob_hash
+
+    def prefetch(self, instances: List[models.Model]):
+        """
+        Resolves the hashes of all instances (see resolveHashes)
+        and loads their arrays at once (to the cache).
+        """
+        ArrayBlob.load(self.resolveHashes([
+            inst for inst in instances if self.name not in inst.__dict__.get('_pending_arrays', {})
+        ]))
+
+    def getShape(self, model_instance):
+        """
+        Returns shape of the array stored on model_instance
+        without decoding it, or None if not set.
+        """
+        pending = model_instance.__dict__.get('_pending_arrays', {})
+        if self.name in pending:
+            value = pending[self.name]
+            return None if value is None else np.shape(value)
+        blob_hash = self.getHash(model_instance)
+        if blob_hash is None:
+            return None
+        return ArrayBlob.getShape(blob_hash)
 
 
 class Profile(models.Model):
@@ -78,6 +665,21 @@ class Profile(models.Model):
         return ret
 
 
+@receiver(post_delete, sender='manager.CurveData')
+@receiver(post_delete, sender='manager.SamplingData')
+def release_arrays(sender, instance, **kwargs):
+    ArrayBlob.release([
+        instance.__dict__.get(f.attname) for f in sender._meta.concrete_fields
+        if isinstance(f, StoredNumpyField) and not f.isInherited(instance)
+    ])
+    sd_id = instance.__dict__.get('_current_samples_id')
+    if sender is CurveData and sd_id is not None:
+        # SamplingData is shared by the copies of CurveData (DO_NOTHING),
+        # it is deleted (releasing its array) with the last of them.
+        if not CurveData._base_manager.filter(_current_samples_id=sd_id).exists():
+            SamplingData.objects.filter(id=sd_id).delete()
+
+
 @receiver(post_save, sender=User)
 def update_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -170,15 +772,8 @@ class Fileset(VoltPyModel):
         for file_ in self.files.all():
             for an in file_.analytes.all():
                 newcs.analytes.add(an)
-                newcs.analytes_conc[an.id] = {}
                 newcs.analytes_conc_unit[an.id] = file_.analytes_conc_unit[an.id]
-                for cdid, concvalue in file_.analytes_conc[an.id].items():
-                    newcs.analytes_conc[an.id][cdid] = concvalue
-        for an in newcs.analytes.all():
-            anconc = newcs.analytes_conc[an.id]
-            for cd in newcs.curves_data.all():
-                anconc[cd.id] = anconc.get(cd.id, 0)
-            newcs.analytes_conc[an.id] = anconc
+            file_.copyConcsTo(newcs)
         newcs.save()
         return newcs
 
@@ -194,9 +789,12 @@ class Fileset(VoltPyModel):
     def export(self):
         cds = []
         for f in self.files.all():
-            cds.extend(f.curves_data.all())
+            cds.extend(f.loadCurves())
         return manager.helpers.functions.export_curves_data_as_csv(cds)
 
+    def exportBundle(self):
+        return manager.helpers.functions.export_datasets_as_npz(self.files.all())
+
     def getHtmlDetails(self):
         user = manager.helpers.functions.get_user()
         ret = ''.join([
@@ -212,6 +810,54 @@ class Fileset(VoltPyModel):
         return Analyte.objects.filter(dataset__in=[x.id for x in self.files.all().only('id')]).distinct()
 
 
+class UploadJob(models.Model):
+    """
+    Upload accepted for processing by the upload worker,
+    see manager.uploads.jobs.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=8, choices=STATUSES, default=QUEUED, db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)  # heartbeat of the running job
+    progress = models.FloatField(default=0)  # percent complete
+    details = PickledObjectField(default=dict)
+    # list of dicts: name, path of the stored upload, status, error
+    files = PickledObjectField(default=list)
+    error = models.TextField(default='')
+    fileset = models.ForeignKey(Fileset, null=True, on_delete=models.SET_NULL)
+
+    def getDir(self) -> str:
+        return os.path.join(settings.VOLTPY_UPLOADS_ROOT, 'job_%i' % self.id)
+
+    def getStatus(self) -> Dict:
+        """
+        Returns the JSON-able status reported to the browser.
+        """
+        ret = {
+            'status': self.status,
+            'progress': round(self.progress, 1),
+            'files': [
+                {'name': f['name'], 'status': f['status'], 'error': f['error']}
+                for f in self.files
+            ],
+            'error': self.error,
+        }
+        if self.status == self.DONE:
+            ret['location'] = self.fileset.getUrl()
+        return ret
+
+
 class Curve(VoltPyModel):
     class Param(IntEnum):
         PARAMNUM = 64
@@ -391,15 +1037,15 @@ class CurveIndex(VoltPyModel):
 
 
 class SamplingData(models.Model):
-    data = SimpleNumpyField(null=True, default=None)
+    data = StoredNumpyField(storage_setting='VOLTPY_SAMPLING_STORAGE')
 
 
 class CurveData(VoltPyModel):
     curve = models.ForeignKey(Curve, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
-    time = SimpleNumpyField(null=True, default=None)
-    potential = SimpleNumpyField(null=True, default=None)
-    current = SimpleNumpyField(null=True, default=None)
+    time = StoredNumpyField(inherit_from='based_on')
+    potential = StoredNumpyField(inherit_from='based_on')
+    current = StoredNumpyField(inherit_from='based_on')
     based_on = models.ForeignKey('CurveData', null=True, default=None, on_delete=models.DO_NOTHING)
     processed_with = models.ForeignKey('Processing', null=True, default=None, on_delete=models.DO_NOTHING)
     _current_samples = models.ForeignKey(SamplingData, on_delete=models.DO_NOTHING, default=None, null=True)
@@ -417,11 +1063,30 @@ class CurveData(VoltPyModel):
 
     @property
     def points_number(self):
-        return len(self.current[self._crop_beg:self._crop_end])
+        shape = self._meta.get_field('current').getShape(self)
+        if shape is None:
+            return 0
+        return len(range(shape[0])[self._crop_beg:self._crop_end])
 
     @property
     def samples_number(self):
-        return len(self._current_samples.data)
+        sd = self._current_samples
+        if sd is None:
+            return 0
+        shape = SamplingData._meta.get_field('data').getShape(sd)
+        if shape is None:
+            return 0
+        return shape[0]
+
+    @property
+    def yVectorLength(self):
+        """
+        Length of yVector, computed without decoding the arrays.
+        """
+        user = manager.helpers.functions.get_user()
+        if user.profile.show_on_x == 'S':
+            return self.samples_number
+        return self.points_number
 
     @property
     def current_samples(self):
@@ -452,19 +1117,37 @@ class CurveData(VoltPyModel):
             if self.__current_samples_changed:
                 self._current_samples.save()
                 self.__current_samples_changed = False
-            self.potential = np.array(self.potential)
-            self.current = np.array(self.current)
-            self.time = np.array(self.time)
             super().save(*args, **kwargs)
         else:
             raise VoltPyNotAllowed("CurveData is read only model. Update CurveData via Dataset.updateCurve method.")
 
+    @classmethod
+    def prefetchArrays(cls, cds: List['CurveData'], names=('time', 'potential', 'current')):
+        """
+        Loads the arrays of all cds with a few queries, instead of
+        queries for each curve on the first access.
+        """
+        for name in names:
+            if name == 'current_samples':
+                SamplingData._meta.get_field('data').prefetch(
+                    [cd._current_samples for cd in cds if cd._current_samples_id is not None]
+                )
+            else:
+                cls._meta.get_field(name).prefetch(cds)
+
     def getCopy(self):
         newcd = copy(self)
+        # copy() would share the state (and cached relations) with self:
+        newcd._state = copy(self._state)
+        newcd._state.fields_cache = copy(self._state.fields_cache)
+        newcd._pending_arrays = copy(self.__dict__.get('_pending_arrays', {}))
+        newcd._resolved_arrays = {}
         newcd.id = None
         newcd.pk = None
         newcd.date = None
         newcd.based_on = self
+        # Arrays which are not replaced are stored only in self:
+        newcd._inherited_arrays = {'time', 'potential', 'current'}
         newcd._state.adding = True
         #newcd.save()
         return newcd
@@ -495,16 +1178,22 @@ class CurveData(VoltPyModel):
         if onx == 'T':
             return self.time[self._crop_beg:self._crop_end]
         if onx == 'S':
-            return range(len(self.current_samples))
+            return range(self.samples_number)
 
     @xVector.setter
     def xVector(self, val):
         user = manager.helpers.functions.get_user()
         onx = user.profile.show_on_x
+        # Arrays loaded from DB may be read only views, and copies made
+        # with getCopy share them with the original, so always replace.
         if onx == 'P':
-            self.potential[self._crop_beg:self._crop_end] = val
+            potential = np.array(self.potential)
+            potential[self._crop_beg:self._crop_end] = val
+            self.potential = potential
         if onx == 'T':
-            self.time[self._crop_beg:self._crop_end] = val
+            time = np.array(self.time)
+            time[self._crop_beg:self._crop_end] = val
+            self.time = time
         if onx == 'S':
             pass
 
@@ -522,7 +1211,9 @@ class CurveData(VoltPyModel):
         user = manager.helpers.functions.get_user()
         onx = user.profile.show_on_x
         if onx == 'P' or onx == 'T':
-            self.current[self._crop_beg:self._crop_end] = val
+            current = np.array(self.current)
+            current[self._crop_beg:self._crop_end] = val
+            self.current = current
         if onx == 'S':
             self.current_samples = val
 
@@ -579,7 +1270,6 @@ class Dataset(VoltPyModel):
     date = models.DateField(auto_now_add=True)
     curves_data = models.ManyToManyField(CurveData, related_name="curves_data")
     analytes = models.ManyToManyField(Analyte)
-    analytes_conc = PickledObjectField(default={})  # dictionary key is analyte id
     analytes_conc_unit = PickledObjectField(default={})  # dictionary key is analyte id
     undo_curves_data = models.ManyToManyField(CurveData, related_name="undoCurvesData")
     undo_analytes = models.ManyToManyField(Analyte, related_name="undoAnalytes")
@@ -592,21 +1282,108 @@ class Dataset(VoltPyModel):
         on_delete=models.DO_NOTHING,
         related_name='undoProcessing'
     )
+    version = models.IntegerField(default=0)  # changed with curves_data, see loadCurves
     disp_type = 'dataset'
+    _matrix_cache = None
+
+    @overrides
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # version is increased only in the DB (see dataset_curves_changed),
+        # the one of this instance can be stale, so it is left as it is
+        version = self.version
+        self.version = models.F('version')
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self.version = version
+
+    def as_matrix(self, axis: str='y', crop: bool=True):
+        """
+        Returns (matrix, xvector, cd_ids), where rows of the matrix are
+        yVectors (or xVectors for axis='x') of curves_data in order of
+        cd_ids and xvector is shared by all of them. The result is cached
+        until curves_data changes, so the arrays are read only.
+        """
+        if axis not in ('x', 'y'):
+            raise ValueError('Unknown axis: %s' % axis)
+        user = manager.helpers.functions.get_user()
+        onx = user.profile.show_on_x
+        # curves data are not changed once saved, unlike ids and versions
+        # of datasets, which are reused after a rollback
+        key = (tuple(self.curves_data.order_by('id').values_list('id', flat=True)), axis, crop, onx)
+        if Dataset._matrix_cache is None:
+            Dataset._matrix_cache = ArrayCache(
+                getattr(settings, 'VOLTPY_ARRAY_CACHE_MB', 128) * 1024 * 1024 / 4,
+                sizeof=lambda ret: ret[0].nbytes + np.asarray(ret[1]).nbytes
+            )
+        ret = Dataset._matrix_cache.get(key)
+        if ret is None:
+            ret = Dataset._matrix_cache.put(key, self._buildMatrix(axis, crop, onx))
+        return ret
+
+    def loadCurves(self, arrays=()) -> List[CurveData]:
+        """
+        Returns curves_data (ordered by id) together with their Curve,
+        CurveIndex, File and Fileset, in a fixed number of queries.
+        arrays lists the names of arrays to prefetch, e.g. ('current',).
+        The list is reused until curves_data changes.
+        """
+        loaded = self.__dict__.get('_loaded_curves')
+        if loaded is None or loaded[0] != self.version:
+            cds = list(
+                self.curves_data.all().order_by('id').select_related(
+                    'curve', 'curve__index', 'curve__file', '_current_samples'
+                ).prefetch_related('curve__file__fileset_set')
+            )
+            loaded = (self.version, cds)
+            self._loaded_curves = loaded
+        if arrays:
+            CurveData.prefetchArrays(loaded[1], arrays)
+        return loaded[1]
+
+    def _buildMatrix(self, axis: str, crop: bool, onx: str):
+        cds = list(self.curves_data.all().order_by('id').select_related('_current_samples'))
+        names = {'P': ['potential', 'current'], 'T': ['time', 'current'], 'S': ['current_samples']}
+        CurveData.prefetchArrays(cds, names[onx])
+        xvectors = []
+        vectors = []
+        for cd in cds:
+            if not crop:
+                # local instances, the crop is not saved
+                cd._crop_beg, cd._crop_end = None, None
+            xvectors.append(cd.xVector)
+            vectors.append(cd.xVector if axis == 'x' else cd.yVector)
+        if not cds:
+            matrix = np.empty((0, 0))
+            matrix.flags.writeable = False
+            return matrix, np.empty(0), []
+        if len(set(len(v) for v in vectors + xvectors)) > 1:
+            raise VoltPyFailed('Curves have different number of points.')
+        xmatrix = np.array(xvectors, dtype=np.float64)
+        if not (xmatrix == xmatrix[0]).all():
+            raise VoltPyFailed('Curves have different x values.')
+        matrix = np.array(vectors, dtype=np.float64)
+        matrix.flags.writeable = False
+        xvector = xmatrix[0]
+        xvector.flags.writeable = False
+        return matrix, xvector, [cd.id for cd in cds]
 
     def getCopy(self):
         newcs = Dataset(
             name=self.name + '_copy',
-            analytes_conc=self.analytes_conc,
-            analytes_conc_unit=self.analytes_conc_unit
+            analytes_conc_unit=copy(self.analytes_conc_unit)
         )
         newcs.save()
         newcs.analytes.set(self.analytes.all())
         newcs.curves_data.set(self.curves_data.all())
-        newcs.save()
-        for pr in Processing.objects.filter(dataset=self, deleted=False, completed=True):
-            newpr = pr.getCopy(dataset=newcs)
-            newpr.save()
+        self.copyConcsTo(newcs)
+        Processing.bulkSave([
+            pr.getCopy(dataset=newcs, save=False)
+            for pr in Processing.objects.filter(dataset=self, deleted=False, completed=True)
+        ])
         return newcs
 
     class Meta:
@@ -624,8 +1401,7 @@ class Dataset(VoltPyModel):
 
     def removeCurve(self, cd: CurveData):
         self.curves_data.remove(cd)
-        for k, v in self.analytes_conc.items():
-            v.pop(cd.id, None)
+        AnalyteConcentration.objects.filter(dataset=self, curve_data=cd).delete()
 
     def addCurve(self, cd: CurveData, conc_dict={}):
         concValues = conc_dict.get('values', {})
@@ -637,42 +1413,150 @@ class Dataset(VoltPyModel):
     def replaceCurve(self, old_cd: CurveData, new_cd: CurveData):
         if not self.curves_data.filter(id=old_cd.id).exists():
             raise ValueError("CurveData is a part of this Dataset")
-        old_conc = self.getCurveConcDict(old_cd)
-        self.removeCurve(old_cd)
-        self.addCurve(new_cd, old_conc)
+        self._replaceCurves([old_cd], [new_cd])
 
     def updateCurve(self, processing_instance, cd: CurveData, yVector: List, xVector: List = None) -> CurveData:
-        if not self.curves_data.filter(id=cd.id).exists():
-            raise ValueError("CurveData is a part of this Dataset")
-        new_cd = cd.getCopy()
-        new_cd.processed_with = processing_instance
-        new_cd.yVector = yVector
-        if xVector is not None:
-            new_cd.xVector = xVector
-        new_cd.save()
-        self.replaceCurve(cd, new_cd)
-        return new_cd
+        xVectors = None if xVector is None else [xVector]
+        return self.updateCurves(processing_instance, [cd], [yVector], xVectors)[0]
+
+    def updateCurves(
+            self,
+            processing_instance,
+            cds: List[CurveData],
+            yVectors: List,
+            xVectors: List = None
+    ) -> List[CurveData]:
+        """
+        Replaces each of cds with its copy with new yVector (and xVector).
+        All new CurveData are saved at once with CurveData.bulkSave.
+        """
+        cds = list(cds)
+        if len(cds) != len(yVectors) or (xVectors is not None and len(xVectors) != len(cds)):
+            raise ValueError("Number of vectors does not match number of curves.")
+        cd_ids = set([cd.id for cd in cds])
+        if self.curves_data.filter(id__in=cd_ids).count() != len(cd_ids):
+            raise ValueError("CurveData is not a part of this Dataset")
+        new_cds = []
+        for i, cd in enumerate(cds):
+            new_cd = cd.getCopy()
+            new_cd.processed_with = processing_instance
+            new_cd.yVector = yVectors[i]
+            if xVectors is not None:
+                new_cd.xVector = xVectors[i]
+            new_cds.append(new_cd)
+        CurveData.bulkSave(new_cds)
+        self._replaceCurves(cds, new_cds)
+        return new_cds
+
+    def _replaceCurves(self, old_cds: List[CurveData], new_cds: List[CurveData]):
+        """
+        Swaps the curves in dataset, moving their concentrations.
+        """
+        self.curves_data.remove(*old_cds)
+        self.curves_data.add(*new_cds)
+        new_ids = {old.id: new.id for old, new in zip(old_cds, new_cds)}
+        old_rows = AnalyteConcentration.objects.filter(dataset=self, curve_data_id__in=new_ids.keys())
+        moved = [
+            AnalyteConcentration(dataset=self, analyte_id=an_id, curve_data_id=new_ids[cd_id], value=value)
+            for an_id, cd_id, value in old_rows.values_list('analyte_id', 'curve_data_id', 'value')
+        ]
+        old_rows.delete()
+        AnalyteConcentration.objects.bulk_create(moved)
 
     def setCurveConcDict(self, cd: CurveData, curve_conc_dict: Dict, curve_conc_units: Dict):
-        newAnalytes = list(set(curve_conc_dict.keys()) - set(self.analytes_conc.keys()))
-        for na in newAnalytes:
-            self.analytes.add(Analyte.objects.get(id=na))
-            self.analytes_conc[na] = self.analytes_conc.get(na, {})
-            self.analytes_conc_unit[na] = self.analytes_conc_unit.get(na, self.CONC_UNIT_DEF)
-            for cd in self.curves_data.all():
-                self.analytes_conc[na][cd.id] = 0.0
-        for k, v in self.analytes_conc.items():
-            v[cd.id] = curve_conc_dict.get(k, 0.0)
+        analyte_ids = set(self.analytes.values_list('id', flat=True))
+        newAnalytes = set(curve_conc_dict.keys()) - analyte_ids
+        if newAnalytes:
+            self.analytes.add(*Analyte.objects.filter(id__in=newAnalytes))
+            for na in newAnalytes:
+                self.analytes_conc_unit[na] = self.analytes_conc_unit.get(na, self.CONC_UNIT_DEF)
+        AnalyteConcentration.objects.filter(dataset=self, curve_data=cd).delete()
+        AnalyteConcentration.objects.bulk_create([
+            AnalyteConcentration(dataset=self, analyte_id=an_id, curve_data=cd, value=curve_conc_dict.get(an_id, 0.0))
+            for an_id in analyte_ids | newAnalytes
+        ])
 
     def getCurveConcDict(self, curveData: CurveData) -> Dict:
         """
         Returns dict of {'values': conc_values<dict>, 'units': conc_units<dict>}
         """
-        ret = {}
-        for k, v in self.analytes_conc.items():
-            ret[k] = v.get(curveData.id, 0.0)
+        ret = {an_id: 0.0 for an_id in self.analytes.values_list('id', flat=True)}
+        ret.update(
+            AnalyteConcentration.objects.filter(
+                dataset=self,
+                curve_data=curveData,
+                analyte_id__in=ret.keys()
+            ).values_list('analyte_id', 'value')
+        )
         return {'values': ret, 'units': self.analytes_conc_unit}
 
+    def _concRows(self):
+        """
+        Concentrations of the curves which are currently in the dataset.
+        """
+        return AnalyteConcentration.objects.filter(dataset=self, curve_data__in=self.curves_data.all())
+
+    def copyConcsTo(self, dataset):
+        """
+        Copies concentrations of current curves to other dataset.
+        """
+        AnalyteConcentration.objects.bulk_create([
+            AnalyteConcentration(dataset=dataset, analyte_id=an_id, curve_data_id=cd_id, value=value)
+            for an_id, cd_id, value in self._concRows().values_list('analyte_id', 'curve_data_id', 'value')
+        ])
+
+    def getConcDict(self, analyte_id: int) -> Dict:
+        """
+        Returns {curve_data_id: concentration} for given analyte,
+        curves without value have concentration 0.
+        """
+        return dict(self._concRows().filter(analyte_id=analyte_id).values_list('curve_data_id', 'value'))
+
+    def setConc(self, analyte_id: int, conc: Dict):
+        """
+        Sets concentrations of analyte, conc is {curve_data_id: concentration}.
+        """
+        AnalyteConcentration.objects.filter(dataset=self, analyte_id=analyte_id).delete()
+        AnalyteConcentration.objects.bulk_create([
+            AnalyteConcentration(dataset=self, analyte_id=analyte_id, curve_data_id=cd_id, value=value)
+            for cd_id, value in conc.items()
+        ])
+
+    def getAnalytesConc(self) -> Dict:
+        """
+        Returns dict of {analyte_id: {curve_data_id: concentration}}.
+        """
+        ret = {an_id: {} for an_id in self.analytes.values_list('id', flat=True)}
+        for an_id, cd_id, value in self._concRows().values_list('analyte_id', 'curve_data_id', 'value'):
+            if an_id in ret:
+                ret[an_id][cd_id] = value
+        return ret
+
+    def setAnalytesConc(self, analytes_conc: Dict):
+        """
+        Replaces all concentrations with analytes_conc of
+        {analyte_id: {curve_data_id: concentration}}.
+        """
+        AnalyteConcentration.objects.filter(dataset=self).delete()
+        AnalyteConcentration.objects.bulk_create([
+            AnalyteConcentration(dataset=self, analyte_id=an_id, curve_data_id=cd_id, value=value)
+            for an_id, conc in analytes_conc.items() for cd_id, value in conc.items()
+        ])
+
+    def removeAnalyte(self, analyte_id: int):
+        AnalyteConcentration.objects.filter(dataset=self, analyte_id=analyte_id).delete()
+        self.analytes_conc_unit.pop(analyte_id, None)
+        self.analytes.remove(*Analyte.objects.filter(id=analyte_id))
+
+    def getCurvesWithConc(self, analyte_id: int, value: float=0.0):
+        """
+        Returns QuerySet of curves_data with given concentration of analyte.
+        """
+        rows = AnalyteConcentration.objects.filter(dataset=self, analyte_id=analyte_id)
+        if value == 0:
+            return self.curves_data.exclude(id__in=rows.exclude(value=0).values('curve_data_id'))
+        return self.curves_data.filter(id__in=rows.filter(value=value).values('curve_data_id'))
+
     def __str__(self):
         return '%s' % self.name
 
@@ -683,7 +1567,7 @@ class Dataset(VoltPyModel):
         self.undo_analytes.clear()
         for a in self.analytes.all():
             self.undo_analytes.add(a)
-        self.undo_analytes_conc = copy(self.analytes_conc)
+        self.undo_analytes_conc = self.getAnalytesConc()
         self.undo_analytes_conc_unit = copy(self.analytes_conc_unit)
         self.undo_processing = processing_instance
         self.save()
@@ -697,7 +1581,7 @@ class Dataset(VoltPyModel):
         self.analytes.clear()
         for a in self.undo_analytes.all():
             self.analytes.add(a)
-        self.analytes_conc = copy(self.undo_analytes_conc)
+        self.setAnalytesConc(self.undo_analytes_conc)
         self.analytes_conc_unit = copy(self.undo_analytes_conc_unit)
         self.undo_curves_data.clear()
         self.undo_analytes.clear()
@@ -721,22 +1605,27 @@ class Dataset(VoltPyModel):
         
     def getConc(self, analyte_id: int) -> List:
         """
-        Returns list of concentration for given analyte and all current curves_data.
+        Returns list of concentration for given analyte and all current curves_data
+        (ordered by id, as in loadCurves).
         """
-        conc = []
-        for cd in self.curves_data.all():
-            conc.append(self.analytes_conc.get(analyte_id, {}).get(cd.id, 0))
-        return conc
-        
+        conc = AnalyteConcentration.objects.filter(
+            dataset=self,
+            analyte_id=analyte_id,
+            curve_data=OuterRef('pk')
+        ).values('value')[:1]
+        return list(self.curves_data.order_by('id').annotate(
+            conc=Coalesce(Subquery(conc), 0.0)
+        ).values_list('conc', flat=True))
+
     def getUncorrelatedConcs(self) -> List:
         """
         Returns list of list of concentrations of analytes which are not correlated.
         """
         concs_different = np.empty(0)
-        for an in self.analytes.all():
-            an_conc = []
-            for cd in self.curves_data.all():
-                an_conc.append(self.analytes_conc[an.id].get(cd.id, 0))
+        analytes_conc = self.getAnalytesConc()
+        cd_ids = list(self.curves_data.values_list('id', flat=True))
+        for an_id, an_dict in analytes_conc.items():
+            an_conc = [an_dict.get(cd_id, 0) for cd_id in cd_ids]
             if concs_different.shape[0] == 0:
                 concs_different = np.array([an_conc])
             else:
@@ -752,7 +1641,10 @@ class Dataset(VoltPyModel):
         return Processing.objects.filter(dataset=self, deleted=False, completed=True).order_by('id')
 
     def export(self):
-        return manager.helpers.functions.export_curves_data_as_csv(self.curves_data.all())
+        return manager.helpers.functions.export_curves_data_as_csv(self.loadCurves())
+
+    def exportBundle(self):
+        return manager.helpers.functions.export_datasets_as_npz([self])
 
     def getUrl(self):
         return reverse('showDataset', args=[self.id])
@@ -765,9 +1657,10 @@ class Dataset(VoltPyModel):
         for p in self.getProcessingHistory():
             proc_hist += ''.join(['<li>', str(p), '</li>']) 
 
-        files_used = set()
-        for cd in self.curves_data.all():
-            files_used.add(cd.curve.file)
+        files_used = {}
+        for cd in self.loadCurves():
+            files_used[cd.curve.file_id] = cd.curve.file
+        files_used = files_used.values()
         uses_files = ''
         for f in files_used:
             uses_files += '<li><a href="%s">%s</a></li>' % (f.getUrl(), str(f))
@@ -785,9 +1678,46 @@ class Dataset(VoltPyModel):
         return ret
 
 
+class AnalyteConcentration(models.Model):
+    """
+    Concentration of analyte in the solution in which
+    curve_data was recorded, as set in the dataset.
+    """
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='concentrations')
+    analyte = models.ForeignKey(Analyte, on_delete=models.CASCADE)
+    curve_data = models.ForeignKey(CurveData, on_delete=models.CASCADE)
+    value = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = (('dataset', 'analyte', 'curve_data'),)
+        index_together = (('dataset', 'analyte', 'value'),)
+
+
+@receiver(m2m_changed, sender=Dataset.curves_data.through)
+def dataset_curves_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # cleared from CurveData side, remember the datasets which lose it
+        instance._cleared_datasets = list(instance.curves_data.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if pk_set is None:
+            datasets = Dataset.objects.filter(id__in=instance.__dict__.pop('_cleared_datasets', []))
+        else:
+            datasets = Dataset.objects.filter(id__in=pk_set)
+    else:
+        instance.version += 1
+        datasets = Dataset.objects.filter(id=instance.id)
+    datasets.update(version=models.F('version') + 1)
+
+
 class File(Dataset):
     filename = models.TextField()
     file_date = models.DateField(auto_now=False, auto_now_add=False)  # Each file has its dataset
+    # hash of the uploaded content and its parsing details, see uploadmanager.contentHash
+    content_hash = models.CharField(max_length=40, default='', db_index=True)
+    duplicate_of = models.ForeignKey('self', null=True, default=None, on_delete=models.SET_NULL, related_name='+')
     disp_type = 'file'
 
     class Meta:
@@ -800,15 +1730,43 @@ class File(Dataset):
     def getNewDataset(self):
         newcs = Dataset(
             name=self.name,
-            analytes_conc=self.analytes_conc,
-            analytes_conc_unit=self.analytes_conc_unit
+            analytes_conc_unit=copy(self.analytes_conc_unit)
         )
         newcs.save()
         newcs.analytes.set(self.analytes.all())
         newcs.curves_data.set(self.curves_data.all())
-        newcs.save()
+        self.copyConcsTo(newcs)
         return newcs
 
+    def getDuplicate(self, name: str) -> 'File':
+        """
+        Returns new File of the same content, which reuses
+        the curves of this one instead of storing them again,
+        with the same analytes and concentrations.
+        The curves remain owned by their first uploader, the
+        current user is granted ro permission for them.
+        """
+        cf = File(
+            name=name,
+            filename=name,
+            file_date=self.file_date,
+            content_hash=self.content_hash,
+            duplicate_of=self,
+            analytes_conc_unit=copy(self.analytes_conc_unit),
+        )
+        cf.save()
+        cds = list(self.curves_data.all())
+        readable = set(CurveData.filter(id__in=[cd.id for cd in cds]).values_list('id', flat=True))
+        assign_owner_perms(
+            manager.helpers.functions.get_user(),
+            [cd for cd in cds if cd.id not in readable],
+            perms=('ro',)
+        )
+        cf.curves_data.set(cds)
+        cf.analytes.set(self.analytes.all())
+        self.copyConcsTo(cf)
+        return cf
+
     def getUrl(self):
         return reverse('showFile', args=[self.id])
 
@@ -825,6 +1783,7 @@ class File(Dataset):
             '<li>Date: %s</li>' % self.date.strftime("%Y-%m-%d"),
             '<li>File date: %s</li>' % self.file_date,
             '<li>Filename: %s</li>' % self.filename,
+            '<li>Same content as: %s</li>' % self.duplicate_of.name if self.duplicate_of_id else '',
             '<li>Fileset: <a href="%s">%s</a></li>' % (fs.getUrl(), fs.name)
         ])
         return ret
@@ -915,13 +1874,26 @@ class Processing(ModelMethod):
             raise VoltPyNotAllowed('Operation not allowed.')
         super().save(*args, **kwargs)
 
-    def getCopy(self, dataset):
+    @classmethod
+    def bulkSave(cls, instances: List['Processing']) -> List['Processing']:
+        """
+        As save, requires rw permission for the datasets,
+        bulk_insert does not call save.
+        """
+        user = manager.helpers.functions.get_user()
+        for dataset in {p.dataset for p in instances}:
+            if not user.has_perm('rw', dataset):
+                raise VoltPyNotAllowed('Operation not allowed.')
+        return super().bulkSave(instances)
+
+    def getCopy(self, dataset, save: bool=True):
         newp = copy(self)
         newp.id = None
         newp.pk = None
         newp.dataset = dataset
         newp.applies_model = None
-        newp.save()
+        if save:
+            newp.save()
         return newp
 
     class Meta:
@@ -938,6 +1910,27 @@ class Processing(ModelMethod):
         return reverse('showDataset', args=[self.dataset.id])
 
 
+class Pipeline(VoltPyModel):
+    """
+    Ordered chain of completed processings, which can be applied
+    to other datasets, see manager.operations.pipeline.
+    """
+    name = models.CharField(max_length=255)
+    date = models.DateField(auto_now_add=True)
+    # list of dicts: method, method_display_name, custom_data, steps_data
+    steps = PickledObjectField(default=list)
+
+    class Meta:
+        permissions = (
+            ('ro', 'Read only'),
+            ('rw', 'Read write'),
+            ('del', 'Delete'),
+        )
+
+    def __str__(self):
+        return '%s (%s)' % (self.name, ', '.join(s['method_display_name'] for s in self.steps))
+
+
 class GroupInvitation(VoltPyModel):
     creation_date = models.DateField(auto_now_add=True)
     group = models.ForeignKey(Group, on_delete=models.DO_NOTHING)
@@ -0,0 +1,141 @@
+"""
+Applies a completed processing, analysis or pipeline to many datasets
+at once (./manage.py applybatch).
+
+The datasets are loaded and saved by the calling process, each one in
+its own transaction, so a failure affects only its dataset. The numerical
+work of the processings and pipelines (ProcessingMethod.processMatrix) is
+done in the pool of worker processes (VOLTPY_BATCH_WORKERS > 1), which
+receive the matrix of the dataset and return the new one. Analyses, the
+processings without processMatrix and the datasets with curves of
+different lengths or x vectors are applied with Method.apply in the
+calling process. The processing which recorded a pipeline in the history
+of a dataset is applied as that pipeline.
+"""
+from concurrent.futures import Future, as_completed
+from typing import Dict, List
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+import manager.models as mmodels
+from manager.exceptions import VoltPyDoesNotExists, VoltPyFailed, VoltPyNotAllowed
+from manager.helpers.decorators import acting_as
+from manager.helpers.processpool import getPool
+from manager.operations import pipeline as mpipeline
+
+
+def _inline(fn, *args) -> Future:
+    """
+    Computes fn(*args) in the calling process.
+    """
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _reason(e: Exception) -> str:
+    if isinstance(e, (VoltPyFailed, VoltPyNotAllowed)):
+        return str(e) or e.__class__.__name__
+    return repr(e)
+
+
+@transaction.atomic
+def _saveProcessed(processing: mmodels.Processing, dataset: mmodels.Dataset,
+                   cd_ids: List[int], newMatrix: np.ndarray) -> None:
+    """
+    Saves newMatrix the same way as processing.apply would.
+    """
+    cds = mpipeline.checkedCurves(dataset, cd_ids)
+    dataset.updateCurves(processing, cds, newMatrix)
+    dataset.save()
+
+
+def _supportsMatrix(method: str) -> bool:
+    try:
+        return getattr(mpipeline.getMethodClass(method), 'matrixCapable', False)
+    except VoltPyFailed:  # unknown method, reported by _applyMethod
+        return False
+
+
+@transaction.atomic
+def _applyMethod(user, model, dataset: mmodels.Dataset) -> None:
+    if isinstance(model, mmodels.Processing) and dataset.locked:
+        raise VoltPyFailed('Dataset is locked.')
+    if not model.completed:
+        raise VoltPyNotAllowed('Incomplete procedure.')
+    mpipeline.getMethodClass(model.method)(model).apply(user=user, dataset=dataset)
+
+
+def applyBatch(user, source, dataset_ids: List[int], workers: int = None) -> Dict:
+    """
+    Applies source -- completed Processing, Analysis or Pipeline --
+    to the datasets, as the user, with given number of worker processes
+    (VOLTPY_BATCH_WORKERS by default).
+    Returns {'done': [dataset ids], 'failed': {dataset id: reason}}.
+    """
+    if workers is None:
+        workers = settings.VOLTPY_BATCH_WORKERS
+    done = []
+    failed = {}
+    with acting_as(user):
+        datasets = {}
+        for ds_id in dataset_ids:
+            try:
+                datasets[ds_id] = mmodels.Dataset.get(id=ds_id)
+            except VoltPyDoesNotExists:
+                failed[ds_id] = 'Dataset does not exist.'
+
+        if isinstance(source, mmodels.Processing) and source.method == mpipeline.PIPELINE_METHOD:
+            source = mpipeline.asPipeline(source)
+        if isinstance(source, mmodels.Pipeline):
+            steps = source.steps
+
+            def save(ds, cd_ids, newMatrix):
+                mpipeline.saveApplied(source, ds, cd_ids, newMatrix)
+        elif isinstance(source, mmodels.Processing) and source.completed and _supportsMatrix(source.method):
+            steps = [mpipeline.asStep(source)]
+
+            def save(ds, cd_ids, newMatrix):
+                _saveProcessed(source, ds, cd_ids, newMatrix)
+        else:
+            steps = None
+
+        serial = []
+        futures = {}
+        submit = getPool('batch', workers).submit if workers > 1 else _inline
+        for ds_id, ds in datasets.items():
+            if steps is None:
+                serial.append(ds_id)
+                continue
+            try:
+                matrix, xvector, cd_ids = ds.as_matrix()
+            except VoltPyFailed as e:  # curves of different lengths or x vectors
+                if isinstance(source, mmodels.Pipeline):
+                    failed[ds_id] = _reason(e)
+                else:
+                    serial.append(ds_id)
+                continue
+            futures[submit(mpipeline.runSteps, steps, matrix, xvector)] = (ds_id, cd_ids)
+
+        for future in as_completed(futures):
+            ds_id, cd_ids = futures[future]
+            try:
+                save(datasets[ds_id], cd_ids, future.result())
+                done.append(ds_id)
+            except Exception as e:  # reported in the summary, the others continue
+                failed[ds_id] = _reason(e)
+
+        for ds_id in serial:
+            try:
+                _applyMethod(user, source, datasets[ds_id])
+                done.append(ds_id)
+            except Exception as e:
+                failed[ds_id] = _reason(e)
+
+    return {
+        'done': sorted(done),
+        'failed': failed,
+    }
@@ -278,6 +278,49 @@ class ProcessingMethod(Method, ABC):
     def type(cls) -> str:
         return 'processing'
 
+    """
+    Methods which process each curve independently should set
+    matrixCapable and implement processMatrix(matrix, xvector), where
+    matrix -- yVectors of the dataset (curves x points), read only,
+    xvector -- xVector shared by the curves, returning new matrix of the
+    same shape. They should use processDataset in apply and finalize,
+    and can also be steps of a pipeline.
+    """
+    matrixCapable = False
+
     @classmethod
     def isAnalysis(cls) -> bool:
         return False
+
+    def processDataset(self, dataset: Dataset) -> None:
+        """
+        Replaces the curves of dataset with the result of processMatrix,
+        computed for all of them in one call, and saved at once.
+        When the curves have different x vectors, processMatrix is
+        called once for each group of curves with the same one.
+        """
+        cds = dataset.loadCurves()
+        if not cds:
+            return
+        try:
+            groups = [dataset.as_matrix()]
+        except VoltPyFailed:
+            by_x = {}
+            for cd in cds:
+                xvector = np.array(cd.xVector, dtype=np.float64)
+                by_x.setdefault(xvector.tobytes(), (xvector, []))[1].append(cd)
+            groups = [
+                (np.array([cd.yVector for cd in group], dtype=np.float64), xvector, [cd.id for cd in group])
+                for xvector, group in by_x.values()
+            ]
+        by_id = {cd.id: cd for cd in cds}
+        old_cds = []
+        yvecs = []
+        for matrix, xvector, cd_ids in groups:
+            newMatrix = self.processMatrix(matrix, xvector)
+            if newMatrix.shape != matrix.shape:
+                raise VoltPyFailed('Processing has changed the shape of the data.')
+            old_cds.extend(by_id[cd_id] for cd_id in cd_ids)
+            yvecs.extend(newMatrix)
+        dataset.updateCurves(self.model, old_cds, yvecs)
+        dataset.save()
@@ -46,11 +46,12 @@ doi: 10.1016/S0169-7439(02)00089-8
         return "ASD capacitive estimators"
 
     def __perform(self, dataset):
-        if dataset.curves_data.all().count() == 0:
+        cds = dataset.loadCurves()
+        if len(cds) == 0:
             raise VoltPyFailed('Dataset error.')
         Param = mmodels.Curve.Param
 
-        cd1 = dataset.curves_data.all()[0]
+        cd1 = cds[0]
         self.model.custom_data['tp'] = cd1.curve.params[Param.tp]
         self.model.custom_data['tw'] = cd1.curve.params[Param.tw]
 
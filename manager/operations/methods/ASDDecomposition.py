@@ -89,7 +89,8 @@ doi: 10.1016/S0169-7439(02)00089-8
 
         Param = mmodels.Curve.Param
 
-        cd1 = dataset.curves_data.all()[0]
+        cds = dataset.loadCurves()
+        cd1 = cds[0]
         self.model.custom_data['tp'] = cd1.curve.params[Param.tp]
         self.model.custom_data['tw'] = cd1.curve.params[Param.tw]
         tptw = self.model.custom_data['tp'] + self.model.custom_data['tw']
@@ -224,8 +225,8 @@ doi: 10.1016/S0169-7439(02)00089-8
             yv0 = recompose(bfd0, method_type)
             yvecs2 = np.subtract(yv0[1::2], yv0[0::2])
 
-        if yvecs2.shape[1] == dataset.curves_data.all().count():
-            for i, cd in enumerate(dataset.curves_data.all()):
+        if yvecs2.shape[1] == len(cds):
+            for i, cd in enumerate(cds):
                 newcd = cd.getCopy()
                 newcd.setCrop(dec_start, dec_end)
                 newcdConc = dataset.getCurveConcDict(cd)
@@ -1,8 +1,9 @@
+import numpy as np
 from overrides import overrides
 from django.utils import timezone
 import manager.operations.method as method
 from manager.operations.methodsteps.settings import Settings
-from manager.helpers.bkghelpers import calc_abc
+from manager.helpers.bkghelpers import calc_abc_matrix
 from manager.exceptions import VoltPyNotAllowed
 from manager.exceptions import VoltPyFailed
 
@@ -53,18 +54,15 @@ baseline correction in voltammetry" Electrochimica Acta, 2014, 136, 195–203.
     def apply(self, user, dataset):
         if self.model.completed is not True:
             raise VoltPyNotAllowed('Incomplete procedure.')
-        self.__perform(dataset)
+        self.processDataset(dataset)
 
-    def __perform(self, dataset):
+    matrixCapable = True
+
+    def processMatrix(self, matrix, xvector):
         iterations = self.model.custom_data['iterations']
         degree = self.model.custom_data['degree']
-        for cd in dataset.curves_data.all():
-            yvec = cd.yVector
-            xvec = range(len(yvec))
-            yvec = calc_abc(xvec, yvec, degree, iterations)['yvec']
-            newyvec = yvec
-            dataset.updateCurve(self.model, cd, newyvec)
-        dataset.save()
+        xvec = np.arange(matrix.shape[1])
+        return calc_abc_matrix(xvec, matrix, degree, iterations)[0]
 
     def finalize(self, user):
         settings = Settings.getData(self.model)
@@ -73,7 +71,7 @@ baseline correction in voltammetry" Electrochimica Acta, 2014, 136, 195–203.
             self.model.custom_data['degree'] = int(settings['Degree'])
         except ValueError:
             raise VoltPyFailed('Wrong values for degree or iterations.')
-        self.__perform(self.model.dataset)
+        self.processDataset(self.model.dataset)
         self.model.step = None
         self.model.completed = True
         self.model.save()
@@ -29,9 +29,9 @@ plots which should be averaged.
     @overrides
     def initialForStep(self, step_num):
         if step_num == 0:
-            if len(self.model.dataset.analytes_conc) > 0:
-                v = next(iter(self.model.dataset.analytes_conc.values()))
-                return v
+            analyte = self.model.dataset.analytes.first()
+            if analyte is not None:
+                return self.model.dataset.getConcDict(analyte.id)
 
     def apply(self, user, dataset):
         """
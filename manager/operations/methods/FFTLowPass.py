@@ -28,26 +28,22 @@ signal back to the original domain.
     def __str__(cls):
         return "Low Pass FFT filter"
 
-    def __perform(self, dataset):
-        for cd in dataset.curves_data.all():
-            yvec = cd.yVector
-            ylen = len(yvec)
-            st = round(SelectFrequency.getData(self.model))
-            en = ylen - st + 1
-            ffty = np.fft.fft(yvec)
-            ffty[st:en] = [0] * (en - st)
-            iffty = np.fft.ifft(ffty)
-            newyvec = np.real(iffty)
-            dataset.updateCurve(self.model, cd, newyvec)
-        dataset.save()
+    matrixCapable = True
+
+    def processMatrix(self, matrix, xvector):
+        st = round(SelectFrequency.getData(self.model))
+        en = matrix.shape[1] - st + 1
+        ffty = np.fft.fft(matrix, axis=1)
+        ffty[:, st:en] = 0
+        return np.real(np.fft.ifft(ffty, axis=1))
 
     def apply(self, user, dataset):
         if self.model.completed is not True:
             raise VoltPyNotAllowed('Incomplete procedure.')
-        self.__perform(dataset)
+        self.processDataset(dataset)
 
     def finalize(self, user):
-        self.__perform(self.model.dataset)
+        self.processDataset(self.model.dataset)
         self.model.step = None
         self.model.completed = True
         self.model.save()
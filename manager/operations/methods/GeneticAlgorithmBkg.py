@@ -59,9 +59,9 @@ in standard addition voltammetry" J. Electroanal. Chem., 2012, 684, 38–46.
         yvecs = np.stack([cd.yVector.T for cd in dataset.curves_data.all()])
         yvecs = yvecs.T
         (no_bkg, bkg) = geneticAlgorithm(yvecs, peak_max_index, peak_start_index, peak_end_index)
-        for i, cd in enumerate(dataset.curves_data.all()):
-            newyvec = no_bkg.T[:, i]
-            dataset.updateCurve(self.model, cd, newyvec)
+        cds = dataset.curves_data.all()
+        newyvecs = [no_bkg.T[:, i] for i in range(len(cds))]
+        dataset.updateCurves(self.model, cds, newyvecs)
         dataset.save()
 
     def finalize(self, user):
@@ -27,17 +27,15 @@ class MedianFilter(method.ProcessingMethod):
     def apply(self, user, dataset):
         if self.model.completed is not True:
             raise VoltPyNotAllowed('Incomplete procedure.')
-        self.__perform(dataset)
+        self.processDataset(dataset)
 
-    def __perform(self, dataset):
-        for cd in dataset.curves_data.all():
-            yvec = cd.yVector
-            newyvec = medfilt(yvec)
-            dataset.updateCurve(self.model, cd, newyvec)
-        dataset.save()
+    matrixCapable = True
+
+    def processMatrix(self, matrix, xvector):
+        return medfilt(matrix, kernel_size=(1, 3))  # window of 3 points along each curve
 
     def finalize(self, user):
-        self.__perform(self.model.dataset)
+        self.processDataset(self.model.dataset)
         self.model.step = None
         self.model.completed = True
         self.model.save()
@@ -4,6 +4,7 @@ import manager.operations.method as method
 from manager.operations.methodsteps.selecttworanges import SelectTwoRanges
 from manager.operations.methodsteps.confirmation import Confirmation
 from manager.operations.methodsteps.settings import Settings
+from manager.helpers.bkghelpers import calc_polyfit_ranges
 from manager.exceptions import VoltPyNotAllowed
 from manager.exceptions import VoltPyFailed
 
@@ -41,26 +42,28 @@ should be placed before the peak of interest and the second after it.
         ret = super(PolynomialBackgroundFit, self).process(user, request)
         self.model.custom_data['fitCoeff'] = []
         if self.model.active_step_num == 2:
-            for cd in self.model.dataset.curves_data.all():
-                ranges = SelectTwoRanges.getData(self.model)
-                v = []
-                v.append(cd.xValue2Index(ranges[0]))
-                v.append(cd.xValue2Index(ranges[1]))
-                v.append(cd.xValue2Index(ranges[2]))
-                v.append(cd.xValue2Index(ranges[3]))
-                v.sort()
-                (st1, en1, st2, en2) = (v[0], v[1], v[2], v[3])
-                xvec = np.append(cd.xVector[st1:en1], cd.xVector[st2:en2])
-                yvec = np.append(cd.yVector[st1:en1], cd.yVector[st2:en2])
-                try:
-                    degree = int(Settings.getData(self.model)['Degree'])
-                except ValueError:
-                    raise VoltPyFailed('Wrong degree of polynomial')
-                p = np.polyfit(xvec, yvec, degree)
-                self.model.custom_data['fitCoeff'].append(p)
-                self.model.save()
+            matrix, xvector, cd_ids = self.model.dataset.as_matrix()
+            coeffs, _ = self.fitBackground(matrix, xvector)
+            self.model.custom_data['fitCoeff'] = list(coeffs)  # in order of cd_ids
+            self.model.save()
         return ret
 
+    def fitBackground(self, matrix, xvector):
+        """
+        Fits the polynomials into the selected intervals of all curves at
+        once, returns (coefficients, background matrix).
+        """
+        ranges = SelectTwoRanges.getData(self.model)
+        v = sorted(int(np.argmin(np.abs(np.subtract(xvector, r)))) for r in ranges[:4])
+        (st1, en1, st2, en2) = (v[0], v[1], v[2], v[3])
+        if en1 - st1 + en2 - st2 < 1:
+            raise VoltPyFailed('The selected intervals contain no points.')
+        try:
+            degree = int(Settings.getData(self.model)['Degree'])
+        except ValueError:
+            raise VoltPyFailed('Wrong degree of polynomial')
+        return calc_polyfit_ranges(xvector, matrix, [(st1, en1), (st2, en2)], degree)
+
     @overrides
     def initialForStep(self, step_num: int):
         from manager.helpers.validators import validate_polynomial_degree
@@ -78,12 +81,15 @@ should be placed before the peak of interest and the second after it.
     def addToMainPlot(self):
         if self.model.active_step_num == 2:
             fitlines = []
-            for cd, fit in zip(self.model.dataset.curves_data.all(), self.model.custom_data['fitCoeff']):
-                xvec = cd.xVector
-                p = fit
+            coeffs = np.array(self.model.custom_data['fitCoeff'])
+            if coeffs.size == 0:
+                return fitlines
+            xvec = self.model.dataset.as_matrix()[1]
+            ybkgs = coeffs @ np.vander(xvec, coeffs.shape[1]).T
+            for ybkg in ybkgs:
                 fitlines.append(dict(
                     x=xvec,
-                    y=np.polyval(p, xvec),
+                    y=ybkg,
                     plottype='line',
                     color='red',
                 ))
@@ -93,20 +99,15 @@ should be placed before the peak of interest and the second after it.
     def apply(self, user, dataset):
         if self.model.completed is not True:
             raise VoltPyNotAllowed('Incomplete procedure.')
-        self.__perform(dataset)
+        self.processDataset(dataset)
+
+    matrixCapable = True
 
-    def __perform(self, dataset):
-        for cd, fit in zip(dataset.curves_data.all(), self.model.custom_data['fitCoeff']):
-            yvec = cd.yVector
-            xvec = cd.xVector
-            p = fit
-            ybkg = np.polyval(p, xvec)
-            newyvec = np.subtract(yvec, ybkg)
-            dataset.updateCurve(self.model, cd, newyvec)
-        dataset.save()
+    def processMatrix(self, matrix, xvector):
+        return matrix - self.fitBackground(matrix, xvector)[1]
 
     def finalize(self, user):
-        self.__perform(self.model.dataset)
+        self.processDataset(self.model.dataset)
         self.model.step = None
         self.model.completed = True
         self.model.save()
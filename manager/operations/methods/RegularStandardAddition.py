@@ -71,13 +71,14 @@ has to be included in the dataset.
         self.model.custom_data['analyte'] = analyte.name
         unitsTrans = dict(mmodels.Dataset.CONC_UNITS)
         self.model.custom_data['units'] = unitsTrans[self.model.dataset.analytes_conc_unit[analyte.id]]
+        conc = self.model.dataset.getConcDict(analyte.id)
         for cd in self.model.dataset.curves_data.all():
             startIndex = cd.xValue2Index(selRange[0])
             endIndex = cd.xValue2Index(selRange[1])
             if endIndex < startIndex:
                 endIndex, startIndex = startIndex, endIndex
             yvalues.append(max(cd.yVector[startIndex:endIndex])-min(cd.yVector[startIndex:endIndex]))
-            xvalues.append(self.model.dataset.analytes_conc.get(analyte.id, {}).get(cd.id, 0))
+            xvalues.append(conc.get(cd.id, 0))
 
         if 0 not in xvalues:
             raise VoltPyFailed('The method requires signal value for concentration 0 %s' % self.model.custom_data['units'])
@@ -51,18 +51,17 @@ until the last point is reached. Both the polynomial degree and the window size
     def apply(self, user, dataset):
         if self.model.completed is not True:
             raise VoltPyNotAllowed('Incomplete procedure.')
-        self.__perform(dataset)
+        self.processDataset(dataset)
 
-    def __perform(self, dataset):
-        for cd in dataset.curves_data.all():
-            yvec = cd.yVector
-            newyvec = savgol_filter(
-                yvec,
-                self.model.custom_data['WindowSpan'],
-                self.model.custom_data['Degree']
-            )
-            dataset.updateCurve(self.model, cd, newyvec)
-        dataset.save()
+    matrixCapable = True
+
+    def processMatrix(self, matrix, xvector):
+        return savgol_filter(
+            matrix,
+            self.model.custom_data['WindowSpan'],
+            self.model.custom_data['Degree'],
+            axis=1
+        )
 
     def finalize(self, user):
         settings = Settings.getData(self.model)
@@ -71,7 +70,7 @@ until the last point is reached. Both the polynomial degree and the window size
             self.model.custom_data['Degree'] = int(settings['Degree'])
         except ValueError:
             raise VoltPyFailed('Wrong values for span or degree.')
-        self.__perform(self.model.dataset)
+        self.processDataset(self.model.dataset)
         self.model.step = None
         self.model.completed = True
         self.model.save()
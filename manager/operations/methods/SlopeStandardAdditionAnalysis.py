@@ -58,16 +58,18 @@ signal analysis in voltammetry" The Analyst, 2017, 142(10), 1729–1734.
         self.model.custom_data['analyte'] = analyte.name
         unitsTrans = dict(mmodels.Dataset.CONC_UNITS)
         self.model.custom_data['units'] = unitsTrans[self.model.dataset.analytes_conc_unit[analyte.id]]
-        for cd in self.model.dataset.curves_data.all():
+        conc = self.model.dataset.getConcDict(analyte.id)
+        cds = self.model.dataset.loadCurves(arrays=('current_samples',))
+        for cd in cds:
             X.append(cd.current_samples)
-            Conc.append(self.model.dataset.analytes_conc.get(analyte.id, {}).get(cd.id, 0))
+            Conc.append(conc.get(cd.id, 0))
             tptw = cd.curve.params[Param.tp] + cd.curve.params[Param.tw]
 
         tp = 3
         twvec = self.__chooseTw(tptw)
         # TODO:Test if all curves are registered with the same method ?
         # have the same number of points ?
-        numM = self.model.dataset.curves_data.all()[0].curve.params[Param.method]
+        numM = cds[0].curve.params[Param.method]
         ctype = 'dp'
         if numM == Param.method_dpv:
             ctype = 'dp'
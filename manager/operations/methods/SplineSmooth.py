@@ -42,22 +42,23 @@ of points in the signal. With factor = 1 the whole signal is represented as a
     def apply(self, user, dataset):
         if self.model.completed is not True:
             raise VoltPyNotAllowed('Incomplete procedure.')
-        self.__perform(dataset)
+        self.processDataset(dataset)
 
-    def __perform(self, dataset):
+    matrixCapable = True
+
+    def processMatrix(self, matrix, xvector):
+        # UnivariateSpline fits one curve at a time
         factor = self.model.custom_data['Factor']
-        for cd in dataset.curves_data.all():
-            yvec = cd.yVector
-            xvec = cd.xVector
-            spline_fit = UnivariateSpline(xvec, yvec)
+        newMatrix = np.empty_like(matrix)
+        for i, yvec in enumerate(matrix):
+            spline_fit = UnivariateSpline(xvector, yvec)
             spline_fit.set_smoothing_factor(factor)
-            newyvec = spline_fit(xvec)
-            dataset.updateCurve(self.model, cd, newyvec)
-        dataset.save()
+            newMatrix[i] = spline_fit(xvector)
+        return newMatrix
 
     def finalize(self, user):
         self.model.custom_data['Factor'] = Settings.getData(self.model)['Smoothing factor']
-        self.__perform(self.model.dataset)
+        self.processDataset(self.model.dataset)
         self.model.step = None
         self.model.completed = True
         self.model.save()
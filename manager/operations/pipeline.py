@@ -0,0 +1,142 @@
+"""
+Pipelines are chains of completed processings, saved with savePipeline
+and applied to other datasets with applyPipeline. All steps are computed
+in memory on the matrix of the dataset (ProcessingMethod.processMatrix),
+only the final curves are saved, with one Processing in the history
+and one undo for the whole pipeline.
+"""
+import importlib
+from copy import deepcopy
+from typing import Dict, List
+import numpy as np
+from django.db import transaction
+import manager.models as mmodels
+from manager.exceptions import VoltPyFailed
+
+#: Processing.method of the pipeline step in the processing history
+PIPELINE_METHOD = 'Pipeline'
+
+
+def getMethodClass(name: str):
+    """
+    Returns the class of processing method called name.
+    """
+    try:
+        module = importlib.import_module('manager.operations.methods.' + name)
+        return getattr(module, name)
+    except (ImportError, AttributeError):
+        raise VoltPyFailed('Unknown processing method %s.' % name)
+
+
+def asStep(processing: mmodels.Processing) -> Dict:
+    """
+    Returns the completed processing as a step of a pipeline.
+    """
+    mclass = getMethodClass(processing.method)
+    if not processing.completed:
+        raise VoltPyFailed('Processing %s is not completed.' % processing.method_display_name)
+    if not getattr(mclass, 'matrixCapable', False):
+        raise VoltPyFailed('%s cannot be a step of a pipeline.' % processing.method_display_name)
+    return {
+        'method': processing.method,
+        'method_display_name': processing.method_display_name,
+        'custom_data': deepcopy(processing.custom_data),
+        'steps_data': deepcopy(processing.steps_data),
+    }
+
+
+def savePipeline(name: str, processings: List[mmodels.Processing]) -> mmodels.Pipeline:
+    """
+    Saves the completed processings, in given order, as a new Pipeline.
+    """
+    steps = []
+    for p in processings:
+        if p.method == PIPELINE_METHOD:
+            steps.extend(deepcopy(p.custom_data['steps']))
+        else:
+            steps.append(asStep(p))
+    if not steps:
+        raise VoltPyFailed('There is no processing to save.')
+    pipeline = mmodels.Pipeline(name=name, steps=steps)
+    pipeline.save()
+    return pipeline
+
+
+def asPipeline(processing: mmodels.Processing) -> mmodels.Pipeline:
+    """
+    Returns the pipeline recorded in the history of a dataset by the
+    processing of PIPELINE_METHOD, to be applied again (it is not saved).
+    """
+    return mmodels.Pipeline(
+        id=processing.custom_data.get('pipeline'),
+        name=processing.name,
+        steps=deepcopy(processing.custom_data['steps']),
+    )
+
+
+def runSteps(steps: List[Dict], matrix: np.ndarray, xvector: np.ndarray) -> np.ndarray:
+    """
+    Processes the matrix (curves x points) with all steps in turn.
+    """
+    for step in steps:
+        model = mmodels.Processing(
+            method=step['method'],
+            method_display_name=step['method_display_name'],
+            custom_data=deepcopy(step['custom_data']),
+            steps_data=deepcopy(step['steps_data']),
+            active_step_num=None,
+            completed=True,
+        )
+        newMatrix = getMethodClass(step['method'])(model).processMatrix(matrix, xvector)
+        if newMatrix.shape != matrix.shape:
+            raise VoltPyFailed('%s has changed the shape of the data.' % step['method_display_name'])
+        matrix = newMatrix
+    return matrix
+
+
+def checkedCurves(dataset: mmodels.Dataset, cd_ids: List[int]) -> List[mmodels.CurveData]:
+    """
+    Returns the curves cd_ids of the dataset, in that order, to be
+    replaced by the curves computed from its matrix.
+    """
+    if dataset.locked:
+        raise VoltPyFailed('Dataset is locked.')
+    cds = {cd.id: cd for cd in dataset.loadCurves()}
+    if sorted(cds) != sorted(cd_ids):
+        raise VoltPyFailed('Curves of the dataset have changed during processing.')
+    return [cds[cd_id] for cd_id in cd_ids]
+
+
+def applyPipeline(pipeline: mmodels.Pipeline, dataset: mmodels.Dataset) -> mmodels.Processing:
+    """
+    Applies the pipeline to the dataset, returns the Processing
+    which records it in the history of the dataset.
+    """
+    if dataset.locked:
+        raise VoltPyFailed('Dataset is locked.')
+    matrix, xvector, cd_ids = dataset.as_matrix()
+    return saveApplied(pipeline, dataset, cd_ids, runSteps(pipeline.steps, matrix, xvector))
+
+
+@transaction.atomic
+def saveApplied(pipeline: mmodels.Pipeline, dataset: mmodels.Dataset,
+                cd_ids: List[int], newMatrix: np.ndarray) -> mmodels.Processing:
+    """
+    Saves newMatrix, computed with runSteps from the curves cd_ids
+    of the dataset, as the result of the pipeline.
+    """
+    cds = checkedCurves(dataset, cd_ids)
+    record = mmodels.Processing(
+        dataset=dataset,
+        name=pipeline.name,
+        method=PIPELINE_METHOD,
+        method_display_name='Pipeline: %s' % pipeline,
+        custom_data={'pipeline': pipeline.id, 'steps': deepcopy(pipeline.steps)},
+        active_step_num=None,
+        completed=True,
+    )
+    record.save()
+    dataset.prepareUndo(processing_instance=record)
+    dataset.updateCurves(record, cds, newMatrix)
+    dataset.save()
+    return record
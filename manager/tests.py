@@ -1,10 +1,27 @@
 import io
 import os
 import json
+import zlib
+import struct
+import tempfile
+import importlib
+import numpy as np
+from datetime import timedelta
 from pathlib import Path
-from django.test import TestCase
+from unittest import mock
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from scipy.signal import savgol_filter, medfilt
+from scipy.interpolate import UnivariateSpline
+from picklefield.fields import dbsafe_encode
+from guardian.shortcuts import assign_perm
+from django.db import models, transaction, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from django.core.files import File
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.management import call_command
 from django.test.client import RequestFactory
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm
@@ -14,7 +31,24 @@ import manager.uploads.uploadmanager as um
 import manager.operations.methodmanager as mm
 import manager.helpers.functions
 from manager.exceptions import VoltPyDoesNotExists,VoltPyFailed,VoltPyFailed
-
+from manager.exceptions import VoltPyNotAllowed
+from manager.helpers import numpycodec
+from manager.helpers import processpool
+from manager.helpers.setTpTw import setTpTw
+from manager.helpers.prepareStructForSSAA import prepareStructForSSAA
+from manager.analytesTable import analytesTable
+from manager.views import export
+from manager.operations import batch, pipeline
+from manager.operations.methods.SGSmooth import SGSmooth
+from manager.operations.methods.MedianFilter import MedianFilter
+from manager.operations.methods.FFTLowPass import FFTLowPass
+from manager.operations.methods.SplineSmooth import SplineSmooth
+from manager.operations.methods.AutomaticBaselineCorrection import AutomaticBaselineCorrection
+from manager.operations.methods.PolynomialBackgroundFit import PolynomialBackgroundFit
+from manager.uploads import jobs
+from manager.uploads.parser import Parser
+from manager.uploads.parsers.vol import Vol
+from manager.uploads.parsers.volt import Volt
 # Create your tests here.
 """
 Test should:
@@ -45,7 +79,7 @@ def addFilesToRequest(request, filepaths_list, post_name='files[]'):
     return request
 
 
-def uploadFiles(user, list_of_files=None):
+def uploadFiles(user, list_of_files=None, force=False):
     group = Group.objects.get(name='registered_users')
     group.user_set.add(user)
     group.save()
@@ -67,12 +101,15 @@ def uploadFiles(user, list_of_files=None):
         postdata[rstr % (fid, 'firstColumn_t')] = '10'
     postdata['fileset_name'] = 'test'
     postdata['command'] = 'upload'
+    if force:
+        postdata['force_import'] = '1'
     request = factory.post('/', data=postdata)
     request.user = user
     request.session = {}
     request = addFilesToRequest(request, file_list, 'files[]')
     manager.helpers.functions.get_user = lambda: user 
     pu = um.ajax(request=request)
+    return pu
 
 
 class TestUser(TestCase):
@@ -90,6 +127,705 @@ class TestUser(TestCase):
         user = authenticate(username=uname, password=upass)
         self.assertIsNotNone(user)
 
+    def test_bulk_permissions(self):
+        owner = User.objects.get(username=uname)
+        uploadFiles(owner)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        other = User.objects.create_user(username='other', email='other@test.test', password=upass)
+        manager.helpers.functions.get_user = lambda: other
+        p = mmodels.Processing(
+            dataset=ds, name='', method='SGSmooth', method_display_name='',
+            custom_data={}, steps_data={}, active_step_num=None, completed=True
+        )
+        with self.assertRaises(VoltPyNotAllowed):
+            mmodels.Processing.bulkSave([p])
+        manager.helpers.functions.get_user = lambda: owner
+        mmodels.Processing.bulkSave([p])
+        self.assertTrue(owner.has_perm('rw', p))
+        self.assertFalse(other.has_perm('rw', p))
+
+
+class TestNumpyCodec(TestCase):
+    def test_roundtrip(self):
+        vectors = [
+            np.linspace(-500, 500, 250),
+            np.arange(1000, dtype='>f4'),
+            np.random.rand(3, 7),
+            np.array([], dtype=np.float64),
+        ]
+        for codec in numpycodec.CODECS.keys():
+            for vec in vectors:
+                ret = numpycodec.decode(numpycodec.encode(vec, codec))
+                self.assertEqual(ret.shape, vec.shape)
+                self.assertTrue(np.array_equal(ret, vec), codec)
+                self.assertEqual(numpycodec.codec_of(numpycodec.encode(vec, codec)), codec)
+
+    def test_legacy_npz(self):
+        vec = np.linspace(0, 1, 100)
+        bf = io.BytesIO()
+        np.savez_compressed(bf, vec)
+        self.assertEqual(numpycodec.codec_of(bf.getvalue()), numpycodec.CODEC_NPZ)
+        self.assertTrue(np.array_equal(numpycodec.decode(bf.getvalue()), vec))
+
+    def test_lazy_decoding(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        mmodels.ArrayBlob.getCache().clear()
+        cd = mmodels.CurveData.objects.all()[0]
+        self.assertIsNone(mmodels.ArrayBlob.getCache().get(cd.current_id))
+        self.assertEqual(cd.points_number, TestFileUpload.curve_length)
+        self.assertEqual(cd.samples_number, TestFileUpload.sampling_length)
+        self.assertIsNone(mmodels.ArrayBlob.getCache().get(cd.current_id))
+        current = cd.current
+        self.assertIsInstance(current, np.ndarray)
+        self.assertIs(cd.current, current)
+
+        # the blob of SimpleNumpyField is decoded on first access as well
+        blob = mmodels.ArrayBlob.objects.get(hash=cd.current_id)
+        self.assertIsInstance(blob.__dict__['data'], (bytes, memoryview))
+        self.assertEqual(mmodels.ArrayBlob._meta.get_field('data').getShape(blob), current.shape)
+        self.assertIsInstance(blob.__dict__['data'], (bytes, memoryview))
+        self.assertTrue(np.array_equal(blob.data, current))
+        self.assertIs(blob.data, blob.__dict__['data'])
+        deferred = mmodels.ArrayBlob.objects.only('hash').get(hash=cd.current_id)
+        self.assertTrue(np.array_equal(deferred.data, current))
+
+    def test_array_store(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        cds = mmodels.CurveData.objects.all()
+        self.assertEqual(len(set(cd.potential_id for cd in cds)), 1)
+        report = mmodels.ArrayBlob.dedupReport()
+        self.assertEqual(report['refs'], 4 * len(cds))
+        self.assertLess(report['blobs'], 3 * len(cds))
+        self.assertGreater(report['dedup_ratio'], 1.0)
+        blob_hash = cds[0].current_id
+        sd = cds[0]._current_samples
+        mmodels.ArrayBlob.objects.filter(hash=blob_hash).update(refs=5)
+        call_command('arraystore', recount=True, stdout=io.StringIO())
+        self.assertEqual(mmodels.ArrayBlob.objects.get(hash=blob_hash).refs, 1)
+        models.Model.delete(cds[0].curve)  # VoltPyModel.delete only marks as deleted
+        self.assertEqual(mmodels.ArrayBlob.objects.get(hash=blob_hash).refs, 0)
+        self.assertEqual(mmodels.ArrayBlob.objects.get(hash=sd.data_id).refs, 0)
+        self.assertFalse(mmodels.SamplingData.objects.filter(id=sd.id).exists())
+        call_command('arraystore', gc=True, stdout=io.StringIO())
+        self.assertFalse(mmodels.ArrayBlob.objects.filter(hash=blob_hash).exists())
+        self.assertEqual(mmodels.ArrayBlob.dedupReport()['refs'], 4 * len(cds) - 4)
+        refs = dict(mmodels.ArrayBlob.objects.values_list('hash', 'refs'))
+        mmodels.ArrayBlob.recount()
+        self.assertEqual(dict(mmodels.ArrayBlob.objects.values_list('hash', 'refs')), refs)
+
+    def test_shared_sampling(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        cd = ds.curves_data.all()[0]
+        new_cd = ds.updateCurve(None, cd, cd.yVector + 1)
+        self.assertEqual(new_cd._current_samples_id, cd._current_samples_id)
+        shape = mmodels.ArrayBlob.getShape(cd._current_samples.data_id)
+        mmodels.ArrayBlob.getCache().clear()
+        self.assertEqual(mmodels.ArrayBlob.getShape(cd._current_samples.data_id), shape)
+        self.assertEqual(mmodels.ArrayBlob.getCache().get(('shape', cd._current_samples.data_id)), shape)
+        models.Model.delete(new_cd)
+        self.assertTrue(mmodels.SamplingData.objects.filter(id=cd._current_samples_id).exists())
+        models.Model.delete(cd.curve)
+        self.assertFalse(mmodels.SamplingData.objects.filter(id=cd._current_samples_id).exists())
+
+    def test_concurrent_store(self):
+        first, second, third = np.arange(5.0), np.arange(6.0), np.arange(7.0)
+        mmodels.ArrayBlob.store([first])
+        existing = mmodels.ArrayBlob._existing
+        calls = []
+
+        def notSeen(digests):
+            # first lookup misses the blob stored by "other process"
+            calls.append(digests)
+            return set() if len(calls) == 1 else existing(digests)
+
+        with mock.patch.object(mmodels.ArrayBlob, '_existing', side_effect=notSeen):
+            hashes = mmodels.ArrayBlob.store([second, first, third])
+        refs = dict(mmodels.ArrayBlob.objects.values_list('hash', 'refs'))
+        self.assertEqual([refs[h] for h in hashes], [1, 2, 1])
+        for h, arr in zip(hashes, (second, first, third)):
+            self.assertTrue(np.array_equal(mmodels.ArrayBlob.getArray(h), arr))
+
+    def test_inherited_arrays(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        cd = ds.curves_data.all()[0]
+        first = ds.updateCurve(None, cd, cd.yVector + 1)
+        second = ds.updateCurve(None, first, first.yVector + 1)
+        stored = mmodels.CurveData.objects.filter(id=second.id).values('time', 'potential', 'current').get()
+        self.assertIsNone(stored['time'])
+        self.assertIsNone(stored['potential'])
+        self.assertIsNotNone(stored['current'])
+        second = mmodels.CurveData.objects.get(id=second.id)
+        self.assertEqual(second.points_number, cd.points_number)
+        self.assertTrue(np.array_equal(second.potential, cd.potential))
+        self.assertTrue(np.array_equal(second.time, cd.time))
+        self.assertTrue(np.allclose(second.current, cd.current + 2))
+        field = mmodels.CurveData._meta.get_field('potential')
+        self.assertEqual(field.getHash(second), cd.__dict__[field.attname])
+        fresh = list(mmodels.CurveData.objects.filter(id__in=(cd.id, second.id)))
+        self.assertEqual(field.resolveHashes(fresh), [cd.__dict__[field.attname]] * 2)
+        self.assertEqual([inst.id for inst in fresh if field.name in inst._resolved_arrays], [second.id])
+
+    def test_sampling_files(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        before = {cd.id: np.array(cd.current_samples) for cd in mmodels.CurveData.objects.all()}
+        with tempfile.TemporaryDirectory() as root, override_settings(VOLTPY_ARRAYS_ROOT=root):
+            call_command('movesampling', to='file', stdout=io.StringIO())
+            mmodels.ArrayBlob.getCache().clear()
+            for cd in mmodels.CurveData.objects.all():
+                samples = cd.current_samples
+                self.assertIsInstance(samples, np.memmap)
+                self.assertTrue(np.array_equal(samples, before[cd.id]))
+                self.assertTrue(os.path.isfile(mmodels.ArrayBlob.filePath(cd._current_samples.data_id)))
+            call_command('movesampling', to='db', stdout=io.StringIO())
+            for cd in mmodels.CurveData.objects.all():
+                self.assertFalse(os.path.isfile(mmodels.ArrayBlob.filePath(cd._current_samples.data_id)))
+                self.assertTrue(np.array_equal(cd.current_samples, before[cd.id]))
+
+    def test_upgrade_arrays(self):
+
+        def legacyBlob(arr):
+            bf = io.BytesIO()
+            np.savez_compressed(bf, np.array(arr))
+            return bf.getvalue()
+
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        cds = list(mmodels.CurveData.objects.all())
+        before = {cd.id: (cd.time, cd.potential, cd.current, cd.current_samples) for cd in cds}
+        samples = {cd._current_samples_id: np.array(cd.current_samples) for cd in cds}
+        # the database before ArrayBlob: arrays in the columns of CurveData,
+        # SamplingData without the data_id column
+        with connection.cursor() as cursor:
+            for col in ('time', 'potential', 'current'):
+                cursor.execute('ALTER TABLE manager_curvedata ADD COLUMN %s BLOB NULL' % col)
+            cursor.execute('UPDATE manager_curvedata SET time_id = NULL, potential_id = NULL, current_id = NULL')
+            cursor.executemany(
+                'UPDATE manager_curvedata SET time = %s, potential = %s, current = %s WHERE id = %s',
+                [tuple(legacyBlob(arr) for arr in before[cd.id][:3]) + (cd.id,) for cd in cds]
+            )
+            cursor.execute('ALTER TABLE manager_samplingdata RENAME TO manager_samplingdata_new')
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'manager_samplingdata_new'")
+            for index, in cursor.fetchall():
+                cursor.execute('DROP INDEX %s' % index)
+            cursor.execute('CREATE TABLE manager_samplingdata (id integer NOT NULL PRIMARY KEY, data BLOB NULL)')
+            cursor.executemany(
+                'INSERT INTO manager_samplingdata (id, data) VALUES (%s, %s)',
+                [(sd_id, legacyBlob(arr)) for sd_id, arr in samples.items()]
+            )
+            cursor.execute('DELETE FROM manager_arrayblob')
+        mmodels.ArrayBlob.getCache().clear()
+
+        out = io.StringIO()
+        call_command('upgradearrays', stdout=out)
+        self.assertIn('CurveData: moved arrays of %i rows' % len(cds), out.getvalue())
+        self.assertIn('SamplingData: moved arrays of %i rows' % len(samples), out.getvalue())
+        mmodels.ArrayBlob.getCache().clear()
+        for cd in mmodels.CurveData.objects.all():
+            for old, new in zip(before[cd.id], (cd.time, cd.potential, cd.current, cd.current_samples)):
+                self.assertTrue(np.array_equal(old, new))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM manager_curvedata WHERE current IS NOT NULL')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        refs = dict(mmodels.ArrayBlob.objects.values_list('hash', 'refs'))
+        mmodels.ArrayBlob.recount()
+        self.assertEqual(dict(mmodels.ArrayBlob.objects.values_list('hash', 'refs')), refs)
+        self.assertLess(len(refs), 3 * len(cds))
+
+        call_command('upgradearrays', stdout=out)
+        self.assertIn('CurveData: moved arrays of 0 rows', out.getvalue())
+
+    def test_recode_command(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        before = [(cd.id, cd.current, cd.current_samples) for cd in mmodels.CurveData.objects.all()]
+        call_command('recodearrays', codec='shuffle', stdout=io.StringIO())
+        for cdid, current, samples in before:
+            cd = mmodels.CurveData.objects.get(id=cdid)
+            self.assertTrue(np.array_equal(cd.current, current))
+            self.assertTrue(np.array_equal(cd.current_samples, samples))
+
+
+class TestDatasetMatrix(TestCase):
+    def test_as_matrix(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        cds = list(ds.curves_data.all().order_by('id'))
+        matrix, xvec, ids = ds.as_matrix()
+        self.assertEqual(matrix.shape, (len(cds), TestFileUpload.curve_length))
+        self.assertEqual(ids, [cd.id for cd in cds])
+        self.assertTrue(np.array_equal(matrix[3], cds[3].yVector))
+        self.assertTrue(np.array_equal(xvec, cds[0].xVector))
+        self.assertIs(ds.as_matrix()[0], matrix)
+
+        ds.removeCurve(cds[0])
+        matrix, xvec, ids = ds.as_matrix()
+        self.assertEqual(matrix.shape[0], len(cds) - 1)
+        self.assertNotIn(cds[0].id, ids)
+
+        new_cd = ds.updateCurve(None, cds[1], cds[1].yVector * 2)
+        matrix, xvec, ids = ds.as_matrix()
+        self.assertTrue(np.allclose(matrix[ids.index(new_cd.id)], cds[1].yVector * 2))
+        self.assertEqual(ds.as_matrix(axis='x', crop=False)[0].shape, matrix.shape)
+
+        shifted = cds[1].getCopy()
+        shifted.xVector = np.asarray(cds[1].xVector) + 1
+        shifted.save()
+        ds.curves_data.add(shifted)
+        with self.assertRaises(VoltPyFailed):
+            ds.as_matrix()
+
+        empty = mmodels.Dataset(name='empty')
+        empty.save()
+        matrix, xvec, ids = empty.as_matrix()
+        self.assertEqual((matrix.shape, xvec.shape, ids), ((0, 0), (0,), []))
+
+    def test_reused_id(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        cds = list(mmodels.File.objects.all()[0].curves_data.all().order_by('id'))
+        try:
+            with transaction.atomic():
+                gone = mmodels.Dataset(name='gone')
+                gone.save()
+                gone.curves_data.set(cds[:2])
+                gone.as_matrix()
+                raise VoltPyFailed('rollback')
+        except VoltPyFailed:
+            pass
+        ds = mmodels.Dataset(name='new')
+        ds.save()
+        ds.curves_data.set(cds[2:5])
+        self.assertEqual((ds.id, ds.version), (gone.id, gone.version))
+        self.assertEqual(ds.as_matrix()[2], [cd.id for cd in cds[2:5]])
+
+    def test_stale_version(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        cf = mmodels.File.objects.all()[0]
+        ds = cf.getNewDataset()
+        other = cf.getNewDataset()
+        cds = list(ds.curves_data.all().order_by('id'))
+        ids = ds.as_matrix()[2]
+
+        stale = mmodels.Dataset.objects.get(id=ds.id)
+        cds[0].curves_data.remove(ds)
+        stale.save()
+        self.assertNotIn(cds[0].id, stale.as_matrix()[2])
+        cds[0].curves_data.add(ds)
+        self.assertEqual(mmodels.Dataset.objects.get(id=ds.id).as_matrix()[2], ids)
+
+        lone = mmodels.Dataset(name='lone')
+        lone.save()
+        versions = dict(mmodels.Dataset.objects.values_list('id', 'version'))
+        cds[1].curves_data.clear()
+        self.assertEqual(mmodels.Dataset.objects.get(id=ds.id).version, versions[ds.id] + 1)
+        self.assertEqual(mmodels.Dataset.objects.get(id=other.id).version, versions[other.id] + 1)
+        self.assertEqual(mmodels.Dataset.objects.get(id=cf.id).version, versions[cf.id] + 1)
+        self.assertEqual(mmodels.Dataset.objects.get(id=lone.id).version, versions[lone.id])
+
+    def test_load_curves(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        small = mmodels.Dataset.objects.get(id=ds.getCopy().id)
+        for cd in list(small.curves_data.all())[2:]:
+            small.curves_data.remove(cd)
+        cds = ds.loadCurves()
+        self.assertEqual([cd.id for cd in cds], sorted(cd.id for cd in ds.curves_data.all()))
+        with self.assertNumQueries(0):
+            self.assertIs(ds.loadCurves(), cds)
+            [str(cd.curve) for cd in cds]
+
+        counts = []
+        for dataset in (small, mmodels.Dataset.objects.get(id=ds.id)):
+            with CaptureQueriesContext(connection) as ctx:
+                analytesTable(dataset, 'dataset')
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_csv_export(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user, ['./test_files/test_file.volt', './test_files/test_file.vol'])
+        fs = mmodels.Fileset.objects.get()
+        cds = []
+        for f in fs.files.all():
+            cds.extend(f.loadCurves())
+        cds[0].setCrop(10, 200)
+
+        def expectedCsv(cds):
+            merged = {}
+            for i, cd in enumerate(cds):
+                for x, y in zip(cd.xVector, cd.yVector):
+                    merged.setdefault(x, ['None'] * len(cds))[i] = str(y)
+            return ''.join(','.join([str(x)] + row) + '\r\n' for x, row in sorted(merged.items()))
+
+        expected = expectedCsv(cds)
+        chunks = list(manager.helpers.functions.export_curves_data_as_csv(cds, chunkRows=7))
+        self.assertEqual(len(chunks), -(-len(expected.split('\r\n')[:-1]) // 7))
+        self.assertEqual(''.join(chunks), expected)
+        xvector, matrices = manager.helpers.functions.merge_curves_on_x(cds, chunkRows=7)
+        shapes = [m.shape for m in matrices]
+        self.assertEqual(sum(rows for rows, cols in shapes), len(xvector))
+        self.assertTrue(all(rows <= 7 and cols == len(cds) for rows, cols in shapes))
+
+        # the cells of integer x stay integer
+        user.profile.show_on_x = 'T'
+        user.profile.save()
+        volCds = [cd for cd in cds if cd.curve.file.filename.endswith('.vol')]
+        csv = ''.join(manager.helpers.functions.export_curves_data_as_csv(volCds, chunkRows=7))
+        self.assertEqual(csv, expectedCsv(volCds))
+        self.assertEqual(csv.split(',', 1)[0], str(int(volCds[0].time[0])))
+
+        request = RequestFactory().get('/')
+        request.user = user
+        response = export(request, obj_type='fileset', obj_id=fs.id)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().split('\r\n')
+        self.assertEqual(len(lines[0].split(',')), len(cds) + 1)
+
+
+class TestProcessingMethods(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(self.user)
+        self.file = mmodels.File.objects.all()[0]
+
+    def completedProcessing(self, dataset, methodClass, custom_data={}, steps_data={}):
+        p = mmodels.Processing(
+            dataset=dataset, name='', method=methodClass.__name__, method_display_name=methodClass.__name__,
+            custom_data=dict(custom_data), steps_data=dict(steps_data), active_step_num=None, completed=True
+        )
+        p.save()
+        return p
+
+    def test_process_matrix(self):
+
+        def fftLowPass(yvec, st):
+            ffty = np.fft.fft(yvec)
+            ffty[st:len(yvec) - st + 1] = 0
+            return np.real(np.fft.ifft(ffty))
+
+        def splineSmooth(xvec, yvec, factor):
+            spline_fit = UnivariateSpline(xvec, yvec)
+            spline_fit.set_smoothing_factor(factor)
+            return spline_fit(xvec)
+
+        def abc(yvec, degree, iterations):
+            xvec = np.arange(len(yvec))
+            ybkg = np.array(yvec)
+            for i in range(iterations):
+                poly_ybkg = np.polyval(np.polyfit(xvec, ybkg, degree), xvec)
+                if not (poly_ybkg < ybkg).any():
+                    break
+                ybkg = np.minimum(ybkg, poly_ybkg)
+            return yvec - ybkg
+
+        def polyBkg(xvec, yvec, ranges, degree):
+            st1, en1, st2, en2 = sorted(np.abs(xvec - r).argmin() for r in ranges)
+            xsel = np.append(xvec[st1:en1], xvec[st2:en2])
+            ysel = np.append(yvec[st1:en1], yvec[st2:en2])
+            return yvec - np.polyval(np.polyfit(xsel, ysel, degree), xvec)
+
+        xvec = self.file.as_matrix()[1]
+        ranges = [xvec[200], xvec[10], xvec[40], xvec[230]]
+        cases = (
+            (SGSmooth, {'WindowSpan': 13, 'Degree': 3}, {}, lambda x, y: savgol_filter(y, 13, 3)),
+            (MedianFilter, {}, {}, lambda x, y: medfilt(y)),
+            (FFTLowPass, {}, {'SelectFrequency': 20}, lambda x, y: fftLowPass(y, 20)),
+            (SplineSmooth, {'Factor': 0.01}, {}, lambda x, y: splineSmooth(x, y, 0.01)),
+            (AutomaticBaselineCorrection, {'degree': 4, 'iterations': 50}, {}, lambda x, y: abc(y, 4, 50)),
+            (
+                PolynomialBackgroundFit, {}, {'SelectTwoRanges': ranges, 'Settings': {'Degree': '3'}},
+                lambda x, y: polyBkg(np.asarray(x), y, ranges, 3)
+            ),
+        )
+        for methodClass, custom_data, steps_data, perCurve in cases:
+            ds = self.file.getNewDataset()
+            cds = ds.loadCurves()
+            expected = {cd.curve_id: perCurve(cd.xVector, cd.yVector) for cd in cds}
+            p = self.completedProcessing(ds, methodClass, custom_data, steps_data)
+            methodClass(p).apply(self.user, ds)
+            new_cds = mmodels.Dataset.objects.get(id=ds.id).loadCurves()
+            self.assertEqual(len(new_cds), len(cds))
+            for cd in new_cds:
+                self.assertEqual(cd.processed_with_id, p.id)
+                self.assertTrue(np.allclose(cd.yVector, expected[cd.curve_id]), methodClass.__name__)
+
+    def test_process_groups(self):
+        ds = self.file.getNewDataset()
+        for cd in ds.loadCurves()[::2]:
+            shifted = cd.getCopy()
+            shifted.xVector = np.asarray(cd.xVector) * 2 + 1
+            shifted.save()
+            ds.curves_data.remove(cd)
+            ds.curves_data.add(shifted)
+        ds = mmodels.Dataset.objects.get(id=ds.id)
+        expected = {}
+        for cd in ds.loadCurves():
+            spline_fit = UnivariateSpline(cd.xVector, cd.yVector)
+            spline_fit.set_smoothing_factor(0.01)
+            expected[cd.curve_id] = spline_fit(cd.xVector)
+        p = self.completedProcessing(ds, SplineSmooth, {'Factor': 0.01})
+        with mock.patch.object(SplineSmooth, 'processMatrix', autospec=True,
+                               side_effect=SplineSmooth.processMatrix) as processMatrix:
+            SplineSmooth(p).apply(self.user, ds)
+        self.assertEqual(processMatrix.call_count, 2)
+        new_cds = mmodels.Dataset.objects.get(id=ds.id).loadCurves()
+        self.assertEqual(len(new_cds), len(expected))
+        for cd in new_cds:
+            self.assertTrue(np.allclose(cd.yVector, expected[cd.curve_id]))
+
+    def test_pipeline(self):
+        ds = self.file.getNewDataset()
+        for methodClass, custom_data, steps_data in (
+            (SGSmooth, {'WindowSpan': 13, 'Degree': 3}, {}),
+            (FFTLowPass, {}, {'SelectFrequency': 20}),
+        ):
+            p = self.completedProcessing(ds, methodClass, custom_data, steps_data)
+            methodClass(p).apply(self.user, ds)
+        ds = mmodels.Dataset.objects.get(id=ds.id)
+        pl = pipeline.savePipeline('smooth', list(ds.getProcessingHistory()))
+        self.assertEqual([s['method'] for s in pl.steps], ['SGSmooth', 'FFTLowPass'])
+
+        ds2 = self.file.getNewDataset()
+        original = ds2.as_matrix()[0].copy()
+        cd_count = mmodels.CurveData.objects.count()
+        record = pipeline.applyPipeline(pl, ds2)
+        ds2 = mmodels.Dataset.objects.get(id=ds2.id)
+        self.assertEqual(mmodels.CurveData.objects.count(), cd_count + len(original))
+        self.assertEqual(list(ds2.getProcessingHistory()), [record])
+        self.assertTrue(np.allclose(ds2.as_matrix()[0], ds.as_matrix()[0]))
+
+        pl2 = pipeline.savePipeline('again', list(ds2.getProcessingHistory()))
+        self.assertEqual(pl2.steps, pl.steps)
+        ds2.undo()
+        ds2 = mmodels.Dataset.objects.get(id=ds2.id)
+        self.assertTrue(np.allclose(ds2.as_matrix()[0], original))
+
+    def test_batch(self):
+        ds = self.file.getNewDataset()
+        p = self.completedProcessing(ds, SGSmooth, {'WindowSpan': 13, 'Degree': 3})
+        SGSmooth(p).apply(self.user, ds)
+        expected = mmodels.Dataset.objects.get(id=ds.id).as_matrix()[0]
+
+        ids = [self.file.getNewDataset().id for i in range(3)]
+        result = batch.applyBatch(self.user, p, ids + [ids[-1] + 1000], workers=2)
+        self.assertEqual(result['done'], ids)
+        self.assertEqual(list(result['failed']), [ids[-1] + 1000])
+        for ds_id in ids:
+            ds_new = mmodels.Dataset.objects.get(id=ds_id)
+            self.assertTrue(np.allclose(ds_new.as_matrix()[0], expected))
+            self.assertTrue(all(cd.processed_with_id == p.id for cd in ds_new.loadCurves()))
+
+        pl = pipeline.savePipeline('smooth', [p])
+        out = io.StringIO()
+        call_command('applybatch', '--pipeline', str(pl.id), *map(str, ids), user=uname, workers=0, stdout=out)
+        self.assertIn('3 datasets', out.getvalue())
+        for ds_id in ids:
+            ds_new = mmodels.Dataset.objects.get(id=ds_id)
+            self.assertEqual([h.method for h in ds_new.getProcessingHistory()], [pipeline.PIPELINE_METHOD])
+
+        record = mmodels.Dataset.objects.get(id=ids[0]).getProcessingHistory()[0]
+        out = io.StringIO()
+        call_command('applybatch', '--processing', str(record.id), str(ds.id), user=uname, workers=0, stdout=out)
+        ds_new = mmodels.Dataset.objects.get(id=ds.id)
+        self.assertEqual(
+            [h.method for h in ds_new.getProcessingHistory()],
+            ['SGSmooth', pipeline.PIPELINE_METHOD]
+        )
+        self.assertEqual(ds_new.getProcessingHistory()[1].custom_data['steps'], pl.steps)
+
+
+class TestAnalyteConcentration(TestCase):
+    def test_concentrations(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        cds = list(ds.curves_data.all())
+        an = mmodels.Analyte(name='Pb')
+        an.save()
+        ds.analytes.add(an)
+        ds.setConc(an.id, {cd.id: float(i % 3) for i, cd in enumerate(cds)})
+        self.assertEqual(ds.getConc(an.id), [float(i % 3) for i in range(len(cds))])
+        zeros = ds.getCurvesWithConc(an.id, 0.0)
+        self.assertEqual(zeros.count(), len(cds[::3]))
+        self.assertEqual(ds.getCurvesWithConc(an.id, 2.0).count(), len(cds[2::3]))
+
+        ds.removeCurve(cds[1])
+        self.assertNotIn(cds[1].id, ds.getConcDict(an.id))
+        copy = ds.getCopy()
+        self.assertEqual(copy.getConcDict(an.id), ds.getConcDict(an.id))
+
+        new_cd = ds.updateCurve(None, cds[2], cds[2].yVector * 2)
+        conc = ds.getConcDict(an.id)
+        self.assertNotIn(cds[2].id, conc)
+        self.assertEqual(conc[new_cd.id], 2.0)
+        self.assertEqual(copy.getConcDict(an.id)[cds[2].id], 2.0)
+
+        ds.removeAnalyte(an.id)
+        self.assertEqual(ds.getAnalytesConc(), {})
+        self.assertEqual(ds.getConcDict(an.id), {})
+
+    def test_upgrade_command(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        uploadFiles(user)
+        ds = mmodels.File.objects.all()[0].getNewDataset()
+        cd_ids = list(ds.curves_data.values_list('id', flat=True))
+        an = mmodels.Analyte(name='Pb')
+        an.save()
+        ds.analytes.add(an)
+        # the database before AnalyteConcentration, with pickled concentrations
+        legacy = {an.id: {cd_id: float(i) for i, cd_id in enumerate(cd_ids)}}
+        legacy[an.id][max(cd_ids) + 1000] = 5.0  # removed curve
+        legacy[an.id + 1000] = {cd_ids[0]: 1.0}  # removed analyte
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE manager_dataset ADD COLUMN analytes_conc text NULL')
+            cursor.execute('UPDATE manager_dataset SET analytes_conc = %s WHERE id = %s', [dbsafe_encode(legacy), ds.id])
+        mmodels.AnalyteConcentration.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('upgradeconcs', stdout=out)
+        self.assertIn('Copied %i concentrations of 1 datasets' % len(cd_ids), out.getvalue())
+        self.assertEqual(ds.getConcDict(an.id), {cd_id: float(i) for i, cd_id in enumerate(cd_ids)})
+        call_command('upgradeconcs', stdout=out)
+        self.assertEqual(mmodels.AnalyteConcentration.objects.count(), len(cd_ids))
+
+
+class TestParsers(TestCase):
+    def test_volt_sampling(self):
+        Param = mmodels.Curve.Param
+        params = [0] * Param.PARAMNUM
+        params[Param.ptnr] = 5
+        params[Param.nonaveragedsampling] = 1
+        points = np.random.rand(5, 3)
+        sampling = np.random.rand(20).astype(np.float32)
+        body = b''.join([
+            'komentarz'.encode('utf8') + b'\0',
+            struct.pack('<i', len(params)),
+            struct.pack('<%ii' % len(params), *params),
+            points.astype('<f8').tobytes(),
+            struct.pack('<i', len(sampling)),
+            sampling.tobytes(),
+        ])
+        for ext, payload in (('volt', body), ('voltc', struct.pack('>I', len(body)) + zlib.compress(body))):
+            curve = 'krzywa'.encode('utf8') + b'\0' + payload
+            content = struct.pack('<i', 1) + struct.pack('I', len(curve) + 4) + curve
+            cfile = io.BytesIO(content)
+            cfile.name = 'test.' + ext
+            c = next(Volt(cfile, None).iterCurves())
+            self.assertEqual((c.name, c.comment), ('krzywa', 'komentarz'))
+            self.assertTrue(np.array_equal(c.vec_time, points[:, 0]))
+            self.assertTrue(np.array_equal(c.vec_potential, points[:, 1]))
+            self.assertTrue(np.array_equal(c.vec_current, points[:, 2]))
+            self.assertEqual(c.vec_sampling.dtype, np.float64)
+            self.assertTrue(np.array_equal(c.vec_sampling, sampling))
+
+    def test_vol_axes(self):
+        Param = mmodels.Curve.Param
+        with open('./test_files/test_file.vol', 'rb') as cfile:
+            curves = list(Vol(cfile, None).iterCurves())
+        self.assertEqual(len(curves), TestFileUpload.curves_per_file)
+        for c in curves:
+            p = c.vec_param
+            self.assertEqual(len(c.vec_current), p[Param.ptnr])
+            step = (p[Param.Ek] - p[Param.Ep]) / p[Param.ptnr]
+            self.assertEqual(c.vec_potential[0], p[Param.Ep])
+            self.assertTrue(np.allclose(np.diff(c.vec_potential), step))
+            self.assertTrue(np.all(np.diff(c.vec_time) == c.vec_time[0]))
+
+    def test_vol_legacy_axes(self):
+        Param = mmodels.Curve.Param
+        vol = Vol.__new__(Vol)
+        vol.params = tuple([0] * 60)
+        for Ep, Ek, ptnr in ((-123, 457, 333), (0, 10, 7), (-650, -150, 250)):
+            diffs = {Param.Ep: Ep, Param.Ek: Ek, Param.ptnr: ptnr, Param.tp: 10, Param.tw: 10}
+            current = np.random.rand(ptnr)
+            data = b''.join([
+                struct.pack('<h', 1),
+                b'curve'.ljust(10, b'\0'),
+                b''.ljust(50, b'\0'),
+                struct.pack('<h', len(diffs)),
+                b''.join(struct.pack('<hi', k, v) for k, v in diffs.items()),
+                current.astype('<f8').tobytes(),
+            ])
+            c, index = vol.unserialize('curve', data)
+            self.assertEqual(index, len(data))
+            # the axes as computed by the earlier decoder
+            eStep = (Ek - Ep) / ptnr
+            time, potential = 40, Ep
+            vec_time, vec_potential = [], []
+            for i in range(ptnr):
+                vec_time.append(time)
+                time += 40
+                vec_potential.append(potential)
+                potential += eStep
+            self.assertTrue(np.array_equal(c.vec_current, current))
+            self.assertTrue(np.array_equal(c.vec_time, vec_time))
+            self.assertTrue(np.array_equal(c.vec_potential, vec_potential))
+
+    def test_calculate_method(self):
+        Param = mmodels.Curve.Param
+        samples = np.random.rand(4, 205)
+        for method in (Param.method_dpv, Param.method_sqw, Param.method_lsv):
+            matrix = Parser.calculateMethod(samples, 5, method)
+            for row, res in zip(samples, matrix):
+                self.assertTrue(np.allclose(Parser.calculateMethod(row, 5, method), res))
+        means = samples[0][:200].reshape(-1, 5).mean(axis=1)
+        self.assertTrue(np.allclose(Parser.calculateMethod(samples[0], 5, Param.method_dpv), means[1::2] - means[0::2]))
+
+        res, onPulse, onStep = setTpTw(samples, 20, 3, 5, 'sqw')
+        means = [np.mean(samples[1][i+5:i+8]) for i in range(0, 205, 20)]
+        self.assertEqual(res.shape, (4, len(means) // 2))
+        self.assertTrue(np.allclose(res[1], np.subtract(means[0:-1:2], means[1::2])))
+        self.assertTrue(np.allclose(onPulse[1], means[1::2]))
+
+        ragged = [samples[0], samples[1][:185]]
+        for rawData in (samples[:2], ragged):
+            data = prepareStructForSSAA(rawData, [0, 1], 20, 3, [5, 10], 'sqw')
+            self.assertEqual((data['CONC'], data['SENS']), ([0, 0, 1, 1], [0, 1, 0, 1]))
+            self.assertIsInstance(data['Y'][0], list)
+            self.assertTrue(np.allclose(data['Y'][3], setTpTw(rawData[1], 20, 3, 10, 'sqw')[0], equal_nan=True))
+
+    def test_spreadsheet_readers(self):
+        matrices = {}
+        for ext in ('txt', 'csv', 'xls', 'xlsx', 'ods'):
+            module = importlib.import_module('manager.uploads.parsers.' + ext)
+            parserClass = getattr(module, ext[0].upper() + ext[1:])
+            parser = parserClass.__new__(parserClass)  # only the reader is tested
+            with open('./test_files/test_file.' + ext, 'rb') as f:
+                matrices[ext] = parser.readMatrix(File(f), 2)
+            self.assertEqual(matrices[ext].dtype, np.float64)
+            self.assertEqual(matrices[ext].shape, (TestFileUpload.curve_length - 2, TestFileUpload.curves_per_file + 1))
+            self.assertTrue(np.allclose(matrices[ext], matrices['txt']), ext)
+        self.assertTrue(np.allclose(
+            parser.rowsToMatrix([[1, '2.5', None], [3], ['x', 4, 5]]),
+            [[1, 2.5, np.nan], [3, np.nan, np.nan], [np.nan, 4, 5]],
+            equal_nan=True,
+        ))
+
+    def test_streamed_save(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        manager.helpers.functions.get_user = lambda: user
+        with open('./test_files/test_file.volt', 'rb') as cfile:
+            expected = [c.vec_current for c in Volt(cfile, None).iterCurves()]
+            cfile.seek(0)
+            parser = Volt(cfile, None)
+            parser.flushBytes = 1  # every curve in its own batch
+            cf = mmodels.File.objects.get(id=parser.saveModels(user))
+        cds = cf.curves_data.all().order_by('curve__order_in_file')
+        self.assertEqual([cd.curve.order_in_file for cd in cds], list(range(len(expected))))
+        for cd, current in zip(cds, expected):
+            self.assertTrue(np.array_equal(cd.current, current))
+
 
 class TestFileUpload(TestCase):
     listOfFields = {
@@ -228,6 +964,259 @@ class TestFileUpload(TestCase):
         for fpath in self.file_list_fail:
             self.assertRaises(VoltPyFailed, uploadFiles, user=self.user, list_of_files=[fpath])
 
+    def test_pooled_upload(self):
+
+        def storedArrays():
+            fileset = mmodels.Fileset.objects.order_by('-id')[0]
+            return [
+                [(cd.time_id, cd.potential_id, cd.current_id, cd._current_samples.data_id)
+                 for cd in f.curves_data.all().order_by('curve__order_in_file')]
+                for f in fileset.files.all().order_by('id')
+            ]
+
+        def spooled():
+            return set(Path(tempfile.gettempdir()).glob('*.decoded'))
+
+        spooled_before = spooled()
+        uploadFiles(self.user, self.file_list)
+        serial = storedArrays()
+        try:
+            with override_settings(VOLTPY_UPLOAD_WORKERS=2):
+                uploadFiles(self.user, self.file_list, force=True)
+                self.assertIn('uploads', processpool._pools)
+                self.assertEqual(storedArrays(), serial)
+                files_before = mmodels.File.objects.count()
+                with self.assertRaisesRegex(VoltPyFailed, r'test_file_fail\.volt \(.+\)'):
+                    uploadFiles(self.user, self.file_list[:2] + self.file_list_fail[1:2], force=True)
+                self.assertEqual(mmodels.File.objects.count(), files_before)
+
+                class BrokenPool:
+                    def submit(self, *args):
+                        future = Future()
+                        future.set_exception(BrokenProcessPool())
+                        return future
+
+                with mock.patch.object(um, 'getPool', lambda *args: BrokenPool()):
+                    with self.assertRaisesRegex(VoltPyFailed, 'crashed'):
+                        uploadFiles(self.user, self.file_list[:2], force=True)
+                self.assertEqual(mmodels.File.objects.count(), files_before)
+        finally:
+            processpool.shutdownPools()
+        self.assertEqual(spooled(), spooled_before)
+
+    def test_duplicate_upload(self):
+        files = ['./test_files/test_file.volt', './test_files/test_file.vol']
+        uploadFiles(self.user, files)
+        first = mmodels.File.objects.get(filename='test_file.volt')
+        self.assertEqual(len(first.content_hash), 40)
+        curves_data = mmodels.CurveData.objects.count()
+
+        uploadFiles(self.user, files[::-1])
+        fileset = mmodels.Fileset.objects.order_by('-id')[0]
+        self.assertEqual([f.filename for f in fileset.files.order_by('id')], ['test_file.vol', 'test_file.volt'])
+        again = fileset.files.get(filename='test_file.volt')
+        self.assertEqual(again.duplicate_of_id, first.id)
+        self.assertEqual(
+            sorted(again.curves_data.values_list('id', flat=True)),
+            sorted(first.curves_data.values_list('id', flat=True))
+        )
+        self.assertEqual(mmodels.CurveData.objects.count(), curves_data)
+
+        uploadFiles(self.user2, files[:1])
+        self.assertIsNone(mmodels.File.objects.order_by('-id')[0].duplicate_of_id)
+        self.assertEqual(mmodels.CurveData.objects.count(), curves_data + self.curves_per_file)
+
+        uploadFiles(self.user, files[:1], force=True)
+        forced = mmodels.File.objects.order_by('-id')[0]
+        self.assertIsNone(forced.duplicate_of_id)
+        self.assertEqual(forced.content_hash, first.content_hash)
+        self.assertEqual(mmodels.CurveData.objects.count(), curves_data + 2*self.curves_per_file)
+
+    def test_duplicate_of_shared(self):
+        uploadFiles(self.user, ['./test_files/test_file.volt'])
+        first = mmodels.File.objects.get()
+        cds = list(first.curves_data.order_by('id'))
+        analyte = mmodels.Analyte(name='Pb')
+        analyte.save()
+        first.analytes.add(analyte)
+        first.analytes_conc_unit[analyte.id] = '3g'
+        first.setConc(analyte.id, {cd.id: float(i) for i, cd in enumerate(cds)})
+        first.save()
+        assign_perm('ro', self.user2, first)
+
+        uploadFiles(self.user2, ['./test_files/test_file.volt'])
+        again = mmodels.File.objects.order_by('-id')[0]
+        self.assertEqual(again.duplicate_of_id, first.id)
+        self.assertEqual(again.owner, self.user2)
+        manager.helpers.functions.get_user = lambda: self.user2
+        self.assertEqual(
+            list(mmodels.CurveData.filter(id__in=[cd.id for cd in cds]).order_by('id')),
+            cds
+        )
+        self.assertEqual(list(again.analytes.all()), [analyte])
+        self.assertEqual(again.analytes_conc_unit, {analyte.id: '3g'})
+        self.assertEqual(again.getConcDict(analyte.id), first.getConcDict(analyte.id))
+        self.assertFalse(self.user2.has_perm('rw', cds[0]))
+
+    def test_npz_bundle(self):
+        uploadFiles(self.user, ['./test_files/test_file.volt'])
+        cf = mmodels.File.objects.get()
+        cds = list(cf.curves_data.order_by('curve__order_in_file'))
+        analyte = mmodels.Analyte(name='Pb')
+        analyte.save()
+        cf.analytes.add(analyte)
+        cf.analytes_conc_unit[analyte.id] = '3g'
+        cf.setConc(analyte.id, {cd.id: float(i) for i, cd in enumerate(cds)})
+        cf.save()
+        mmodels.Processing(
+            dataset=cf, name='PROC', method='SGSmooth', method_display_name='Test',
+            completed=True, custom_data={'window': np.arange(3)}
+        ).save()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bundle.npz')
+            with open(path, 'wb') as f:
+                f.write(cf.exportBundle().getvalue())
+            uploadFiles(self.user, [path])
+
+            # the extras are restored only if they are correct
+            arrays = dict(np.load(path))
+            crafted = [
+                dict(arrays, processing=json.dumps([{'method': 'SGSmooth', 'owner_id': 0}])),
+                dict(arrays, processing=json.dumps([{'method': 'os'}])),
+                dict(arrays, analytes_units=np.array(['1x'])),
+                {name: arr for name, arr in arrays.items() if name != 'lengths'},
+            ]
+            for i, bundle in enumerate(crafted):
+                with open(os.path.join(tmp, 'crafted%i.npz' % i), 'wb') as f:
+                    np.savez(f, **bundle)
+            uploadFiles(self.user, [os.path.join(tmp, 'crafted0.npz')])
+            for i in (1, 2, 3):
+                with self.assertRaises(VoltPyFailed):
+                    uploadFiles(self.user, [os.path.join(tmp, 'crafted%i.npz' % i)])
+        history = list(mmodels.File.objects.get(filename='crafted0.npz').getProcessingHistory())
+        self.assertEqual([(p.method, p.owner) for p in history], [('SGSmooth', self.user)])
+        imported = mmodels.File.objects.get(filename='bundle.npz')
+        new_cds = list(imported.curves_data.order_by('curve__order_in_file'))
+        self.assertEqual(len(new_cds), len(cds))
+        for cd, new_cd in zip(cds, new_cds):
+            self.assertEqual(new_cd.curve.name, cd.curve.name)
+            self.assertEqual(list(new_cd.curve.params), list(cd.curve.params))
+            # arrays are content addressed, so the same blobs are reused
+            self.assertEqual(
+                (new_cd.time_id, new_cd.potential_id, new_cd.current_id),
+                (cd.time_id, cd.potential_id, cd.current_id)
+            )
+            self.assertTrue(np.array_equal(new_cd.current_samples, cd.current_samples))
+        self.assertEqual(imported.analytes_conc_unit, {analyte.id: '3g'})
+        conc = imported.getConcDict(analyte.id)
+        self.assertEqual([conc[cd.id] for cd in new_cds], [float(i) for i in range(len(cds))])
+        history = list(imported.getProcessingHistory())
+        self.assertEqual([p.method for p in history], ['SGSmooth'])
+        self.assertEqual(history[0].custom_data, {'window': [0, 1, 2]})
+
+        # the concentrations in other unit are converted to the first one
+        ds = cf.getNewDataset()
+        ds.analytes_conc_unit[analyte.id] = '6g'
+        ds.setConc(analyte.id, {cd.id: 1000.0 * i for i, cd in enumerate(cds)})
+        ds.save()
+        bundle = np.load(io.BytesIO(manager.helpers.functions.export_datasets_as_npz([cf, ds]).getvalue()))
+        self.assertEqual(list(bundle['analytes_units']), ['3g'])
+        self.assertTrue(np.allclose(bundle['concentrations'][:, 0], list(range(len(cds))) * 2))
+        ds.analytes_conc_unit[analyte.id] = '6M'
+        ds.save()
+        self.assertRaises(VoltPyFailed, manager.helpers.functions.export_datasets_as_npz, [cf, ds])
+
+        mmodels.Processing(
+            dataset=cf, name='PROC', method='TestMethod', method_display_name='Test',
+            completed=True, custom_data={'unknown': object()}
+        ).save()
+        self.assertRaises(TypeError, cf.exportBundle)
+
+
+class TestUploadJobs(TestCase):
+    def test_queued_upload(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        files = ['./test_files/test_file.volt', './test_files/test_file.vol']
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(VOLTPY_UPLOAD_JOBS='worker', VOLTPY_UPLOADS_ROOT=root):
+            ret = json.loads(uploadFiles(user, files).content)
+            self.assertEqual(ret['command'], 'queued')
+            job = mmodels.UploadJob.objects.get()
+            self.assertEqual(len(os.listdir(job.getDir())), len(files))
+            self.assertFalse(mmodels.Fileset.objects.exists())
+
+            request = RequestFactory().get(ret['status'])
+            request.user = user
+            job_id = ret['status'].rstrip('/').rsplit('/', 1)[1]
+            status = json.loads(um.uploadStatus(request, job_id=job_id).content)
+            self.assertEqual(status['status'], mmodels.UploadJob.QUEUED)
+            self.assertEqual([f['name'] for f in status['files']], [os.path.basename(f) for f in files])
+
+            call_command('uploadworker', once=True, stdout=io.StringIO())
+            status = json.loads(um.uploadStatus(request, job_id=job_id).content)
+            self.assertEqual(status['status'], mmodels.UploadJob.DONE)
+            self.assertEqual(status['progress'], 100.0)
+            fileset = mmodels.Fileset.objects.get()
+            self.assertEqual(status['location'], fileset.getUrl())
+            self.assertEqual(fileset.files.count(), len(files))
+            self.assertFalse(os.path.exists(job.getDir()))
+
+            uploadFiles(user, ['./test_files/test_file.voltc', './test_files/test_file_fail.volt'])
+            call_command('uploadworker', once=True, stdout=io.StringIO())
+            job = mmodels.UploadJob.objects.order_by('-id')[0]
+            self.assertEqual(job.status, mmodels.UploadJob.FAILED)
+            self.assertEqual([f['status'] for f in job.files], ['decoded', mmodels.UploadJob.FAILED])
+            # the errors of the parsers are not shown to the user
+            with self.assertLogs('manager.uploads.uploadmanager', level='ERROR'):
+                decoded, error = um._decodeFile('broken.xlsx', b'\x01' * 10, job.details[0])
+            self.assertEqual((decoded, error), (None, 'Could not parse file broken.xlsx.'))
+            self.assertEqual(mmodels.Fileset.objects.count(), 1)
+            self.assertEqual(mmodels.File.objects.count(), len(files))
+
+            uploadFiles(user, files)
+            call_command('uploadworker', once=True, stdout=io.StringIO())
+            job = mmodels.UploadJob.objects.order_by('-id')[0]
+            self.assertEqual(job.status, mmodels.UploadJob.DONE)
+            self.assertEqual([f['status'] for f in job.files], [mmodels.UploadJob.DONE] * len(files))
+            self.assertEqual(mmodels.File.objects.exclude(duplicate_of=None).count(), len(files))
+
+    def test_stale_job(self):
+        user = User.objects.create_user(username=uname, email='test@test.test', password=upass)
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(VOLTPY_UPLOADS_ROOT=root, VOLTPY_UPLOAD_JOB_TIMEOUT_MIN=30):
+            stale, alive = mmodels.UploadJob(owner=user), mmodels.UploadJob(owner=user)
+            for job in (stale, alive):
+                job.save()
+                os.makedirs(job.getDir())
+            mmodels.UploadJob.objects.update(status=mmodels.UploadJob.RUNNING)
+            mmodels.UploadJob.objects.filter(id=stale.id).update(
+                updated=timezone.now() - timedelta(minutes=31)
+            )
+            self.assertEqual(jobs.runPending(), 0)
+            stale.refresh_from_db()
+            alive.refresh_from_db()
+            self.assertEqual(stale.status, mmodels.UploadJob.FAILED)
+            self.assertNotEqual(stale.error, '')
+            self.assertFalse(os.path.exists(stale.getDir()))
+            self.assertEqual(alive.status, mmodels.UploadJob.RUNNING)
+            self.assertTrue(os.path.exists(alive.getDir()))
+            self.assertEqual(jobs.failStale(), 0)
+
+        # the worker of the job failed meanwhile does not overwrite it
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(VOLTPY_UPLOAD_JOBS='worker', VOLTPY_UPLOADS_ROOT=root):
+            uploadFiles(user, ['./test_files/test_file.volt'])
+            job = mmodels.UploadJob.objects.order_by('-id')[0]
+            mmodels.UploadJob.objects.filter(id=job.id).update(
+                status=mmodels.UploadJob.FAILED, error=jobs.INTERRUPTED
+            )
+            job.status = mmodels.UploadJob.RUNNING
+            jobs.runJob(job)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.error), (mmodels.UploadJob.FAILED, jobs.INTERRUPTED))
+            self.assertFalse(mmodels.Fileset.objects.exists())
+
 
 class TestMethodManager(TestCase):
     testmethod = """
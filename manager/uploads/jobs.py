@@ -0,0 +1,220 @@
+"""
+Asynchronous uploads. The upload request only stores the files and
+creates UploadJob, the files are decoded and saved by the worker:
+
+VOLTPY_UPLOAD_JOBS = worker -- ./manage.py uploadworker
+VOLTPY_UPLOAD_JOBS = thread -- thread started in the web process
+
+runPending processes the queued jobs in the calling process, so the
+worker needs no broker. The browser polls uploadStatus for progress.
+Running job is saved after each decoded file and when its files are
+saved, the jobs which were not saved for VOLTPY_UPLOAD_JOB_TIMEOUT_MIN
+are failed by failStale.
+"""
+import os
+import shutil
+import logging
+import threading
+from datetime import timedelta
+from django.utils import timezone
+from django.db import connection
+from django.db import transaction
+from django.conf import settings
+import manager.models as mmodels
+import manager.uploads.uploadmanager as um
+from manager.helpers.decorators import acting_as
+from manager.exceptions import VoltPyFailed
+
+logger = logging.getLogger(__name__)
+
+#: share of the progress bar for decoding, the rest is for saving
+DECODE_SHARE = 90.0
+INTERRUPTED = 'The upload was interrupted, please upload the files again.'
+
+
+def enqueue(files, details, user) -> mmodels.UploadJob:
+    """
+    Stores the uploaded files in the job directory and queues the job.
+    """
+    job = mmodels.UploadJob(owner=user, details=details)
+    job.save()
+    os.makedirs(job.getDir(), exist_ok=True)
+    for i, f in enumerate(files):
+        path = os.path.join(job.getDir(), '%i.upload' % i)
+        with open(path, 'wb') as out:
+            for chunk in f.chunks():
+                out.write(chunk)
+        job.files.append({
+            'name': f.name,
+            'path': path,
+            'status': mmodels.UploadJob.QUEUED,
+            'error': '',
+        })
+    job.save()
+    if settings.VOLTPY_UPLOAD_JOBS == 'thread':
+        transaction.on_commit(_startThread)
+    return job
+
+
+def runPending() -> int:
+    """
+    Runs the queued jobs, returns the number of processed jobs.
+    """
+    failStale()
+    done = 0
+    while True:
+        job = mmodels.UploadJob.objects.filter(
+            status=mmodels.UploadJob.QUEUED
+        ).order_by('id').first()
+        if job is None:
+            return done
+        claimed = mmodels.UploadJob.objects.filter(
+            id=job.id, status=mmodels.UploadJob.QUEUED
+        ).update(status=mmodels.UploadJob.RUNNING, updated=timezone.now())
+        if claimed:  # otherwise taken by other worker
+            job.status = mmodels.UploadJob.RUNNING
+            runJob(job)
+            done += 1
+
+
+def failStale() -> int:
+    """
+    Fails the running jobs which have not reported progress for
+    VOLTPY_UPLOAD_JOB_TIMEOUT_MIN, their worker has stopped (they are
+    not queued again, as they could stop the next worker as well).
+    Returns the number of failed jobs.
+    """
+    limit = timezone.now() - timedelta(minutes=settings.VOLTPY_UPLOAD_JOB_TIMEOUT_MIN)
+    stale = list(mmodels.UploadJob.objects.filter(
+        status=mmodels.UploadJob.RUNNING, updated__lt=limit
+    ))
+    failed = 0
+    for job in stale:
+        if mmodels.UploadJob.objects.filter(
+            id=job.id, status=mmodels.UploadJob.RUNNING, updated__lt=limit
+        ).update(
+            status=mmodels.UploadJob.FAILED,
+            error=INTERRUPTED,
+            updated=timezone.now(),
+        ):  # otherwise it has reported progress in the meantime
+            shutil.rmtree(job.getDir(), ignore_errors=True)
+            failed += 1
+    return failed
+
+
+def _report(job: mmodels.UploadJob, **fields) -> bool:
+    """
+    Saves the fields of the job, if it is still running.
+    Returns False when it was failed by failStale meanwhile,
+    its worker should not continue then.
+    """
+    fields['updated'] = timezone.now()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return mmodels.UploadJob.objects.filter(
+        id=job.id, status=mmodels.UploadJob.RUNNING
+    ).update(**fields) > 0
+
+
+def runJob(job: mmodels.UploadJob):
+    """
+    Decodes the files of the job, reporting the progress after each
+    file, and saves all of them in one transaction. The files uploaded
+    before reuse the earlier curves (see uploadmanager.findDuplicates).
+    The job failed by failStale meanwhile is abandoned and stays failed.
+    """
+    files = job.files
+    todo = []
+    results = []
+
+    def onDecoded(j, error):
+        i = todo[j]
+        if error is None:
+            files[i]['status'] = 'decoded'
+        else:
+            files[i]['status'] = mmodels.UploadJob.FAILED
+            files[i]['error'] = error
+        finished = sum(1 for f in files if f['status'] != mmodels.UploadJob.QUEUED)
+        if not _report(job, files=files, progress=DECODE_SHARE * finished / len(files)):
+            raise VoltPyFailed(INTERRUPTED)
+
+    try:
+        hashes = [um.contentHash(f['name'], f['path'], job.details[i]) for i, f in enumerate(files)]
+        with acting_as(job.owner):
+            earlier = um.findDuplicates(hashes, job.details)
+        for i in earlier:
+            files[i]['status'] = 'reused'
+        todo.extend(i for i in range(len(files)) if i not in earlier)
+        results = um.decodeFiles(
+            [(files[i]['name'], files[i]['path']) for i in todo],
+            [job.details[i] for i in todo],
+            onDecoded
+        )
+        with acting_as(job.owner), transaction.atomic():
+            # the update keeps the row of the job locked until the
+            # files are saved, so failStale waits for this transaction
+            if not _report(job):
+                raise VoltPyFailed(INTERRUPTED)
+            cf_ids = {i: cf.getDuplicate(files[i]['name']).id for i, cf in earlier.items()}
+            cf_ids.update(zip(todo, um.saveDecoded(
+                [files[i]['name'] for i in todo],
+                results,
+                [hashes[i] for i in todo],
+            )))
+            fileset_id = um.saveFileset(
+                [cf_ids[i] for i in range(len(files))], job.owner, job.details
+            )
+            for f in files:
+                f['status'] = mmodels.UploadJob.DONE
+            if not _report(job, status=mmodels.UploadJob.DONE, progress=100.0, files=files, fileset_id=fileset_id):
+                raise VoltPyFailed(INTERRUPTED)
+    except Exception as e:  # the job is reported as failed, the worker continues
+        if not isinstance(e, VoltPyFailed):
+            logger.exception('Upload job %i has failed', job.id)
+        _report(
+            job,
+            status=mmodels.UploadJob.FAILED,
+            files=files,
+            error=str(e) if isinstance(e, VoltPyFailed) else 'Could not process the upload.',
+        )
+    finally:
+        um.discardDecoded(results)
+        shutil.rmtree(job.getDir(), ignore_errors=True)
+
+
+_thread = None
+_threadLock = threading.Lock()
+
+
+def _startThread():
+    """
+    Starts the thread processing the queued jobs, unless it is running.
+    """
+    global _thread
+    with _threadLock:
+        if _thread is not None:
+            _thread.wakeup.set()
+            return
+        _thread = threading.Thread(target=_threadMain, name='voltpy-uploads', daemon=True)
+        _thread.wakeup = threading.Event()
+        _thread.start()
+
+
+def _threadMain():
+    global _thread
+    me = threading.current_thread()
+    try:
+        while True:
+            me.wakeup.clear()
+            runPending()
+            if me.wakeup.wait(timeout=5):
+                continue
+            with _threadLock:
+                if not me.wakeup.is_set():
+                    _thread = None
+                    return
+    finally:
+        with _threadLock:
+            if _thread is me:
+                _thread = None
+        connection.close()
@@ -1,8 +1,17 @@
+import os
+import pickle
+import tempfile
+import itertools
 import numpy as np
 from abc import ABC
 from typing import List
+from django.conf import settings
 from django.contrib.auth.models import User
 import manager.models as mmodels
+from manager.voltpymodel import bulk_insert
+from manager.exceptions import VoltPyFailed
+from manager.operations import pipeline as mpipeline
+from manager.helpers.setTpTw import averageSteps, combinePulses
 from manager.models import Curve as mcurve
 Param = mcurve.Param
 
@@ -35,38 +44,201 @@ class Parser(ABC):
 
     _curves = [] #: List[CurveFromFile] = []
 
+    #: see uploadmanager.contentHash, stored in the File
+    contentHash = ''
+
+    #: plain data of the file other than its curves, see saveExtras
+    extras = None
+
+    #: decoded curves are saved when their arrays exceed this size
+    flushBytes = settings.VOLTPY_UPLOAD_FLUSH_MB * 2**20
+
+    def iterCurves(self):
+        """
+        Yields the decoded curves. Parsers which can decode the file
+        curve by curve should override it, so that the whole file is
+        never held in memory at once.
+        """
+        return iter(self._curves)
+
+    def _read(self, size: int) -> bytes:
+        """
+        Reads exactly size bytes of the uploaded file.
+        """
+        data = self.cfile.read(size)
+        if len(data) != size:
+            raise VoltPyFailed('Unexpected end of file %s.' % self.cfile.name)
+        return data
+
+    @staticmethod
+    def _curveBytes(c) -> int:
+        """
+        Approximate size of the decoded arrays of the curve.
+        """
+        return 8 * (3 * len(c.vec_current) + len(c.vec_sampling))
+
+    @property
+    def fileName(self) -> str:
+        return self.cfile.name
+
+    def decode(self) -> 'Decoded':
+        """
+        Returns the file as plain data, which can be sent between
+        processes, see Decoded. The curves are written one by one
+        to a temporary file, so that the decoded files waiting to be
+        saved are not held in memory.
+        """
+        fd, path = tempfile.mkstemp(suffix='.decoded', dir=settings.FILE_UPLOAD_TEMP_DIR)
+        try:
+            count = 0
+            with os.fdopen(fd, 'wb') as f:
+                for c in self.iterCurves():
+                    pickle.dump(DecodedCurve.fromCurve(c), f, pickle.HIGHEST_PROTOCOL)
+                    count += 1
+            if count == 0:
+                raise VoltPyFailed('File %s contains no curves.' % self.fileName)
+        except BaseException:
+            os.remove(path)
+            raise
+        return Decoded(self.fileName, path, self.extras)
+
     def saveModels(self, user: User):
-        cf = mmodels.File(
-            name=self.cfile.name,
-            filename=self.cfile.name,
-            file_date=self._curves[0].date,
-        )
+        """
+        Saves File with all its curves, returns the File id.
+        """
+        return self.saveMany([self])[0]
+
+    @classmethod
+    def saveMany(cls, parsers: List['Parser']) -> List[int]:
+        """
+        Saves the Files of parsers with all their curves. The curves
+        are consumed from iterCurves and inserted in batches of about
+        flushBytes, so the peak memory does not depend on the size of
+        the files, and the number of queries does not depend on the
+        number of curves in a batch. Returns the File ids.
+        """
+        files = []
+        entries = []
+        cd_ids = {}
+        for parser in parsers:
+            curves = parser.iterCurves()
+            first = next(curves, None)
+            if first is None:
+                raise VoltPyFailed('File %s contains no curves.' % parser.fileName)
+            cf = mmodels.File(
+                name=parser.fileName,
+                filename=parser.fileName,
+                file_date=first.date,
+                content_hash=parser.contentHash,
+            )
+            cf.save()
+            files.append(cf)
+            entries.append(zip(
+                itertools.repeat(cf), itertools.count(), itertools.chain([first], curves)
+            ))
+
+        batch = []
+        size = 0
+        for entry in itertools.chain.from_iterable(entries):
+            batch.append(entry)
+            size += cls._curveBytes(entry[2])
+            if size >= cls.flushBytes:
+                cls._saveCurves(batch, cd_ids)
+                batch = []
+                size = 0
+        if batch:
+            cls._saveCurves(batch, cd_ids)
+        for parser, cf in zip(parsers, files):
+            if parser.extras:
+                cls.saveExtras(cf, parser.extras, cd_ids[cf.id])
+        return [cf.id for cf in files]
+
+    @staticmethod
+    def saveExtras(cf: mmodels.File, extras: dict, cd_ids: List[int]):
+        """
+        Saves extras of the file, cd_ids are the saved curves in the
+        order of the file. extras is a dict with optional keys:
+        'analytes' -- {name: (conc_unit, [concentration of each curve])}
+        'processing' -- [{name, method, method_display_name, custom_data}]
+        The extras come from the uploaded file, so they are checked
+        before anything is saved.
+        """
+        known_units = [u[0] for u in mmodels.Dataset.CONC_UNITS]
+        for name, (unit, concs) in extras.get('analytes', {}).items():
+            if unit not in known_units:
+                raise VoltPyFailed('Unknown concentration unit %s of %s.' % (unit, name))
+        processings = [Parser._checkedProcessing(fields) for fields in extras.get('processing', [])]
+
+        units = dict(cf.analytes_conc_unit)  # the default is shared by instances
+        for name, (unit, concs) in extras.get('analytes', {}).items():
+            analyte, _ = mmodels.Analyte.objects.get_or_create(name=name)
+            cf.analytes.add(analyte)
+            units[analyte.id] = unit
+            cf.setConc(analyte.id, dict(zip(cd_ids, concs)))
+        cf.analytes_conc_unit = units
         cf.save()
+        for fields in processings:
+            mmodels.Processing(
+                dataset=cf,
+                active_step_num=None,
+                completed=True,
+                **fields
+            ).save()
+
+    @staticmethod
+    def _checkedProcessing(fields) -> dict:
+        """
+        Returns the fields of Processing which can be restored from the file,
+        raises VoltPyFailed if fields does not describe a known method.
+        """
+        if not isinstance(fields, dict):
+            raise VoltPyFailed('Incorrect processing history.')
+        checked = {
+            'name': str(fields.get('name', '')),
+            'method': str(fields.get('method', '')),
+            'method_display_name': str(fields.get('method_display_name', '')),
+            'custom_data': fields.get('custom_data', {}),
+        }
+        if not isinstance(checked['custom_data'], dict):
+            raise VoltPyFailed('Incorrect processing history.')
+        if checked['method'] != mpipeline.PIPELINE_METHOD:
+            mpipeline.getMethodClass(checked['method'])  # raises if unknown
+        return checked
 
-        order = 0
-        for c in self._curves:
-            cb = mmodels.Curve(
+    @staticmethod
+    def _saveCurves(batch, cd_ids):
+        """
+        Inserts the rows of the curves of batch together,
+        batch is a list of (File, order_in_file, curve).
+        The ids of CurveData are appended to cd_ids[File id].
+        """
+        curves = []
+        for cf, order, c in batch:
+            curves.append(mmodels.Curve(
                 file=cf,
                 order_in_file=order,
                 name=c.name,
                 comment=c.comment,
                 params=c.vec_param,
                 date=c.date
-            )
-            cb.save()
+            ))
+        mmodels.Curve.bulkSave(curves)
+
+        samplings = [mmodels.SamplingData(data=c.vec_sampling) for _, _, c in batch]
+        bulk_insert(mmodels.SamplingData, samplings)
 
-            cd = mmodels.CurveData(
+        curves_data = []
+        indexes = []
+        for (_, _, c), cb, sd in zip(batch, curves, samplings):
+            curves_data.append(mmodels.CurveData(
                 curve=cb,
                 date=c.date,
-                time=c.vec_time,
-                potential=c.vec_potential,
-                current=c.vec_current,
-                current_samples=c.vec_sampling
-            )
-            cd.save()
-            cf.curves_data.add(cd)
-
-            ci = mmodels.CurveIndex(
+                time=np.asarray(c.vec_time),
+                potential=np.asarray(c.vec_potential),
+                current=np.asarray(c.vec_current),
+                _current_samples=sd,
+            ))
+            indexes.append(mmodels.CurveIndex(
                 curve=cb,
                 potential_min=np.min(c.vec_potential),
                 potential_max=np.max(c.vec_potential),
@@ -78,27 +250,80 @@ class Parser(ABC):
                 current_max=np.max(c.vec_current),
                 current_range=np.max(c.vec_current) - np.min(c.vec_current),
                 sampling_rate=c.vec_param[Param.nonaveragedsampling],
-            )
-            ci.save()
-            order += 1
-        cf.save()
-        return cf.id
+            ))
+        mmodels.CurveData.bulkSave(curves_data)
+        mmodels.CurveIndex.bulkSave(indexes)
+        by_file = {}
+        for (cf, _, _), cd in zip(batch, curves_data):
+            by_file.setdefault(cf, []).append(cd)
+        for cf, cds in by_file.items():
+            cf.curves_data.add(*cds)
+            cd_ids.setdefault(cf.id, []).extend(cd.id for cd in cds)
 
     @staticmethod
-    def calculateMethod(yvec: List[float], pointsPerPoint: int, method=Param.method_dpv):
-        yvec_avg = []
+    def calculateMethod(yvec, pointsPerPoint: int, method=Param.method_dpv):
+        """
+        Averages pointsPerPoint samples of each point and computes the
+        signal of the method. yvec can be a vector or a matrix
+        (curves x samples), returns numpy array.
+        """
+        techniques = {
+            Param.method_dpv: 'dpv',
+            Param.method_npv: 'npv',
+            Param.method_sqw: 'swv',
+        }
         if pointsPerPoint > 1:
-            for i in range(int(len(yvec) / pointsPerPoint)):
-                yvec_avg.append(np.average(yvec[(i * pointsPerPoint):(i * pointsPerPoint + pointsPerPoint)]))
-        else:
-            yvec_avg = yvec
-        yvec_res = []
-        if method == Param.method_dpv or method == Param.method_npv:
-            for i in np.arange(0, len(yvec_avg)-1, 2):
-                yvec_res.append(yvec_avg[i + 1] - yvec_avg[i])
-        elif method == Param.method_sqw:
-            for i in np.arange(0, len(yvec_avg)-1, 2):
-                yvec_res.append(yvec_avg[i] - yvec_avg[i + 1])
+            yvec_avg = averageSteps(yvec, pointsPerPoint, pointsPerPoint, 0)
         else:
-            yvec_res = yvec_avg
-        return yvec_res
+            yvec_avg = np.asarray(yvec)
+        return combinePulses(yvec_avg, techniques.get(method, 'scv'))[0]
+
+class DecodedCurve:
+    """
+    Curve of the file as plain data (numpy vectors and parameters).
+    """
+    __slots__ = (
+        'name', 'comment', 'vec_param', 'date',
+        'vec_time', 'vec_potential', 'vec_current', 'vec_sampling',
+    )
+
+    @classmethod
+    def fromCurve(cls, c) -> 'DecodedCurve':
+        dc = cls()
+        dc.name = c.name
+        dc.comment = c.comment
+        dc.vec_param = c.vec_param
+        dc.date = c.date
+        for name in ('vec_time', 'vec_potential', 'vec_current', 'vec_sampling'):
+            setattr(dc, name, np.asarray(getattr(c, name)))
+        return dc
+
+
+class Decoded(Parser):
+    """
+    Saves the curves decoded by Parser.decode, possibly in other process.
+    The curves are read back from the temporary file one by one,
+    discard removes the file.
+    """
+    def __init__(self, name: str, path: str, extras: dict = None):
+        self.name = name
+        self.path = path
+        self.extras = extras
+
+    @property
+    def fileName(self) -> str:
+        return self.name
+
+    def iterCurves(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
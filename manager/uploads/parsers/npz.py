@@ -0,0 +1,89 @@
+import json
+import datetime
+import numpy as np
+from manager.uploads.parser import Parser
+from manager.exceptions import VoltPyFailed
+
+
+class Npz(Parser):
+    """
+    This parses the bundle exported by VoltPy (see
+    manager.helpers.functions.export_datasets_as_npz), it restores
+    the curves with their sampling data, the concentrations of
+    analytes and the processing history.
+    """
+
+    #: arrays of the bundle of version 1
+    REQUIRED = (
+        'version', 'names', 'comments', 'dates', 'params', 'lengths',
+        'time', 'potential', 'current', 'samples_lengths', 'samples',
+        'analytes', 'analytes_units', 'concentrations', 'processing',
+    )
+
+    def __init__(self, cfile, details):
+        """
+        details are not needed, and are ignored
+        as the bundle contains all the info required.
+        Only the extras are read here, the curves are read by iterCurves.
+        """
+        self.cfile = cfile
+        try:
+            self.bundle = np.load(cfile, allow_pickle=False)
+            if not isinstance(self.bundle, np.lib.npyio.NpzFile):
+                raise ValueError('single array')
+            version = int(self.bundle['version']) if 'version' in self.bundle.files else -1
+        except (OSError, ValueError) as e:
+            raise VoltPyFailed('File %s is not VoltPy bundle: %s' % (cfile.name, e))
+        if version != 1:
+            raise VoltPyFailed('Unsupported version of bundle %s.' % cfile.name)
+        missing = [name for name in self.REQUIRED if name not in self.bundle.files]
+        if missing:
+            raise VoltPyFailed('Bundle %s is incomplete, missing: %s.' % (cfile.name, ', '.join(missing)))
+        try:
+            processing = json.loads(str(self.bundle['processing']))
+        except ValueError:
+            raise VoltPyFailed('Bundle %s has incorrect processing history.' % cfile.name)
+        self.extras = {
+            'analytes': {
+                name: (str(unit), concs.tolist())
+                for name, unit, concs in zip(
+                    self.bundle['analytes'],
+                    self.bundle['analytes_units'],
+                    self.bundle['concentrations'].T,
+                )
+            },
+            'processing': processing,
+        }
+
+    @staticmethod
+    def _splitCurves(stacked, lengths):
+        """
+        Returns the vectors of each curve from the matrix
+        (curves x points) or concatenated vectors.
+        """
+        return np.split(stacked.ravel(), np.cumsum(lengths)[:-1])
+
+    def iterCurves(self):
+        b = self.bundle
+        lengths = b['lengths']
+        columns = zip(
+            b['names'],
+            b['comments'],
+            b['dates'],
+            b['params'],
+            self._splitCurves(b['time'], lengths),
+            self._splitCurves(b['potential'], lengths),
+            self._splitCurves(b['current'], lengths),
+            self._splitCurves(b['samples'], b['samples_lengths']),
+        )
+        for name, comment, date, params, time, potential, current, samples in columns:
+            c = self.CurveFromFile()
+            c.name = str(name)
+            c.comment = str(comment)
+            c.date = datetime.datetime.strptime(str(date), '%Y-%m-%d').date()
+            c.vec_param = params.tolist()
+            c.vec_time = time
+            c.vec_potential = potential
+            c.vec_current = current
+            c.vec_sampling = samples
+            yield c
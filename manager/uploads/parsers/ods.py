@@ -1,40 +1,71 @@
-import ezodf
-import pandas as pd
+import zipfile
+import numpy as np
+from lxml import etree
 from overrides import overrides
 from manager.uploads.parsers.txt import Txt
 
+_TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+_OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+_TABLE = '{%s}table' % _TABLE_NS
+_ROW = '{%s}table-row' % _TABLE_NS
+_CELL = '{%s}table-cell' % _TABLE_NS
+_COVERED = '{%s}covered-table-cell' % _TABLE_NS
+_ROWS_REPEATED = '{%s}number-rows-repeated' % _TABLE_NS
+_COLS_REPEATED = '{%s}number-columns-repeated' % _TABLE_NS
+_VALUE = '{%s}value' % _OFFICE_NS
+
 
 class Ods(Txt):
     """
     Parser for ODS files.
-    Code based on: https://stackoverflow.com/a/36180806
+    The content.xml of the first sheet is read as a stream of rows,
+    so the document is never built in memory.
     """
 
     @overrides
-    def readPandas(self, fileForPandas, skipRows):
-        doc = ezodf.opendoc(fileForPandas.file)
+    def readMatrix(self, fileForPandas, skipRows):
+        return self.rowsToMatrix(
+            row for i, row in enumerate(self.iterRows(fileForPandas)) if i >= skipRows
+        )
 
+    @staticmethod
+    def iterRows(fileobj):
         """
-        Available extra debug info:
-        print("Spreadsheet contains %d sheet(s)." % len(doc.sheets))
-        for sheet in doc.sheets:
-            print("-"*40)
-            print("   Sheet name : '%s'" % sheet.name)
-            print("Size of Sheet : (rows=%d, cols=%d)" % (sheet.nrows(), sheet.ncols()) )
+        Yields the rows of the first sheet as lists of cell values,
+        office:value of numeric cells or the text of the others (None
+        for empty cells). Empty rows at the end of the sheet are omitted.
         """
-
-        # convert the first sheet to a pandas.DataFrame:
-        sheet = doc.sheets[0]
-        df_dict = {}
-        for i, row in enumerate(sheet.rows()):
-            # row is a list of cells
-            # assume the header is on the first row
-            if i < skipRows:
-                continue
-            for j, cell in enumerate(row):
-                # use header instead of column index
-                tmp = df_dict.get(j, [])
-                tmp.append(cell.value)
-                df_dict[j] = tmp
-        # and convert to a DataFrame
-        return pd.DataFrame(df_dict)
+        with zipfile.ZipFile(fileobj) as zf, zf.open('content.xml') as content:
+            emptyRows = 0
+            for event, elem in etree.iterparse(content, events=('start', 'end'), tag=(_TABLE, _ROW)):
+                if elem.tag == _TABLE:
+                    if event == 'end':
+                        break  # only the first sheet
+                    continue
+                if event == 'start':
+                    continue
+                row = []
+                empty = 0  # empty cells are added only when followed by a value
+                for cell in elem.iterchildren(_CELL, _COVERED):
+                    repeat = int(cell.get(_COLS_REPEATED, 1))
+                    value = cell.get(_VALUE)
+                    if value is None:
+                        value = ''.join(cell.itertext()) or None
+                    if value is None:
+                        empty += repeat
+                        continue
+                    row.extend([None] * empty)
+                    empty = 0
+                    row.extend([value] * repeat)
+                repeat = int(elem.get(_ROWS_REPEATED, 1))
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+                if not row:
+                    emptyRows += repeat
+                    continue
+                for _ in range(emptyRows):
+                    yield []
+                emptyRows = 0
+                for _ in range(repeat):
+                    yield row
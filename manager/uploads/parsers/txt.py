@@ -1,4 +1,3 @@
-import struct
 import datetime
 import pandas as pd
 import numpy as np
@@ -12,7 +11,7 @@ class Txt(Parser):
     Quite robust class for parsing and preparing of the
     generic text based files (such as csv, txt etc.) to be 
     uploaded to database. Can be extended with only readPandas
-    overridden for easyness of implementation.
+    (or readMatrix) overridden for easyness of implementation.
     """
 
     currentMultiplier = {
@@ -22,6 +21,10 @@ class Txt(Parser):
         'A': 1E6
     }
 
+    #: dtype of the numeric block of the file, np.float32 halves
+    #: the memory needed for large sampling files
+    dtype = np.float64
+
     def readPandas(self, fileForPandas, skipRows):
         """
         This function prepare pandas object to be digested by the rest
@@ -29,15 +32,46 @@ class Txt(Parser):
         """
         return pd.read_csv(fileForPandas, sep='\s+', header=None, skiprows=skipRows)
 
+    def readMatrix(self, fileForPandas, skipRows) -> np.ndarray:
+        """
+        Returns the content of the file as (rows x columns) matrix of
+        self.dtype. Override this (or readPandas) for additional file
+        support.
+        """
+        return self.readPandas(fileForPandas, skipRows).to_numpy(dtype=self.dtype)
+
+    def rowsToMatrix(self, rows) -> np.ndarray:
+        """
+        Converts rows of cell values (as given by spreadsheet readers)
+        into matrix. The rows are padded to the same length, empty and
+        non numeric cells become NaN.
+        """
+        rows = list(rows)
+        width = max((len(r) for r in rows), default=0)
+        matrix = np.full((len(rows), width), np.nan, dtype=self.dtype)
+        for i, row in enumerate(rows):
+            try:
+                matrix[i, :len(row)] = row
+            except (TypeError, ValueError):
+                matrix[i, :len(row)] = [self._toFloat(v) for v in row]
+        return matrix
+
+    @staticmethod
+    def _toFloat(value) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
     def __init__(self, cfile, details):
         # Details not needed - ignore
         self.vec_param = []
         self.names = []
-        self._curves = []
         self.cfile = cfile
         print(details)
         skipRows = int(details.get('ignoreRows', 0))
-        pdfile = self.readPandas(self.cfile, skipRows)
+        data = self.readMatrix(self.cfile, skipRows)
+        firstColumn = data[:, 0]
         potential = []
         time = []
         index = 0
@@ -50,51 +84,51 @@ class Txt(Parser):
         dE = float(details.get('firstColumn_dE', 0))
         t_E = float(details.get('firstColumn_t', 1))
         method = details.get('voltMethod', 'lsv')
-        ptnr = len(pdfile[0])
+        ptnr = len(firstColumn)
         cmulti = float(self.currentMultiplier.get(details.get('currentUnit', 'µA'), 1.0))
         double_sampling_methods = ('npv', 'dpv', 'swv')
 
         if isSampling is None:
             if col1 == 'firstIsE':  # potential in 1st col
-                potential = pdfile[0]
+                potential = firstColumn
                 Ep = potential[0]
                 Ek = potential[len(potential)-1]
                 Estep = potential[1] - potential[0]
-                time = [i for i in range(len(pdfile[0]))]
+                time = np.arange(len(firstColumn))
                 index = 1
             elif col1 == 'firstIsT':  # time in 1st col
-                time = pdfile[0]
+                time = firstColumn
                 Estep = (Ek - Ep) / ptnr
-                potential = list(np.arange(Ep, Ek, Estep))
+                potential = np.arange(Ep, Ek, Estep)
                 index = 1
             else:  # current in 1st col
                 Estep = (Ek - Ep) / ptnr
-                potential = list(np.arange(Ep, Ek, Estep))
-                time = list(np.arange(0, t_E*ptnr, t_E))
+                potential = np.arange(Ep, Ek, Estep)
+                time = np.arange(0, t_E*ptnr, t_E)
         else:  # it is sampling data
             def processNonE():
                 if method in double_sampling_methods:
                     Estep = (Ek - Ep) / (ptnr / (2*spp))
-                    time = list(np.arange(0, t_E*ptnr/(2*spp), t_E))
+                    time = np.arange(0, t_E*ptnr/(2*spp), t_E)
                 else:
                     Estep = (Ek - Ep) / (ptnr / spp)
-                    time = list(np.arange(0, t_E*ptnr/spp, t_E))
-                potential = list(np.arange(Ep, Ek-(Estep/2), Estep))  # HACK: Estep/2 because of random rounding errors
+                    time = np.arange(0, t_E*ptnr/spp, t_E)
+                potential = np.arange(Ep, Ek-(Estep/2), Estep)  # HACK: Estep/2 because of random rounding errors
                 return potential, time, Estep
 
             skipper = spp
             if method in double_sampling_methods:
                 skipper = 2 * spp
             if col1 == 'firstIsE':
-                potential = pdfile[0][0::skipper].values
+                potential = firstColumn[0::skipper]
                 Ep = potential[0]
                 Ek = potential[len(potential)-1]
                 Estep = potential[1] - potential[1+(2*spp)]
-                time = [(i/samplingFreq) for i in range(potential.shape[0])]
+                time = np.arange(potential.shape[0]) / samplingFreq
                 index = 1
             elif col1 == 'firstIsT':
                 potential, time, Estep = processNonE()
-                time = pdfile[0][0::skipper].values
+                time = firstColumn[0::skipper]
                 index = 1
             else:
                 potential, time, Estep = processNonE()
@@ -109,21 +143,30 @@ class Txt(Parser):
         self.vec_param[Param.tw] = 0
         self.vec_param[Param.tp] = t_E if samplingFreq == 0 else spp
 
-        for i in range(len(pdfile.columns)-index):
-            ci = index + i
+        self.potential = potential
+        self.time = time
+        # one row per curve, views of the block read from file
+        curves = data[:, index:].T
+        if cmulti != 1.0:
+            curves *= cmulti
+        if isSampling is None:
+            self.samples = None
+            self.currents = curves
+        else:
+            self.samples = curves
+            self.currents = self.calculateMethod(curves, spp, self.vec_param[Param.method])
+
+    def iterCurves(self):
+        """
+        Prepares the curves from the columns one at a time.
+        """
+        for i, current in enumerate(self.currents):
             c = self.CurveFromFile()
             c.name = str(i)
             c.vec_param = self.vec_param
-            c.vec_potential = potential
-            if isSampling is None:
-                c.vec_sampling = []
-                c.vec_current = pdfile[ci]
-            else:
-                c.vec_sampling = pdfile[ci]
-                c.vec_current = self.calculateMethod(c.vec_sampling, spp, self.vec_param[Param.method])
-            c.vec_time = time
+            c.vec_potential = self.potential
+            c.vec_current = current
+            c.vec_sampling = [] if self.samples is None else self.samples[i]
+            c.vec_time = self.time
             c.date = datetime.datetime.now()
-            if cmulti != 1.0:
-                c.vec_current = np.multiply(np.array(c.vec_current), cmulti).tolist()
-                c.vec_sampling = np.multiply(np.array(c.vec_sampling), cmulti).tolist()
-            self._curves.append(c)
+            yield c
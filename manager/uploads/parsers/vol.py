@@ -1,6 +1,6 @@
 import struct
 import datetime
-import struct
+import numpy as np
 from manager.uploads.generic_eaqt import Generic_EAQt
 from manager.uploads.parser import Parser
 from manager.models import Curve as mcurve
@@ -24,14 +24,13 @@ class Vol(Parser):
         for upload by itself.
         """
         self.names = []
-        self._curves = []
         self.cfile = cfile
-        fileContent = self.cfile.read()
+        start_addr = 2 + (60*4) + (50*12)  # num of curves (int16) + 60 params (int32[60]) + 50 curves names char[10] 
+        fileContent = self._read(start_addr)
         index = 0
         curvesNum = struct.unpack('<h', fileContent[index:index+2])[0]
         index += 2
         offsets = []
-        start_addr = 2 + (60*4) + (50*12)  # num of curves (int16) + 60 params (int32[60]) + 50 curves names char[10] 
         if (curvesNum > 0 and curvesNum <= 50):
             for i in range(0, curvesNum):
                 name = str(struct.unpack('{}s'.format(10), fileContent[index:index+10])[0])
@@ -45,16 +44,19 @@ class Vol(Parser):
                            # names and offsets of 50 curves
         self.params = struct.unpack('i'*60, fileContent[index:index+4*60])
         index += 4*60
-        fileSize = len(fileContent)
 
-        if len(offsets) > 0:
-            for i, offset in enumerate(offsets):
-                index_start = start_addr
-                for a in range(0, i):
-                    index_start += offsets[a]
-                index_end = index_start + offsets[i]
-                (c, retIndex) = self.unserialize(self.names[i], fileContent[index_start:index_end]) 
-                self._curves.append(c)
+        # offsets are the sizes of consecutive curves
+        self.ends = start_addr + np.cumsum(offsets, dtype=np.int64)
+        self.starts = self.ends - offsets
+
+    def iterCurves(self):
+        """
+        Reads and decodes one curve at a time.
+        """
+        for i, (index_start, index_end) in enumerate(zip(self.starts, self.ends)):
+            self.cfile.seek(int(index_start))
+            (c, retIndex) = self.unserialize(self.names[i], self._read(int(index_end - index_start)))
+            yield c
     
     def unserialize(self, sysname, data):
         c = self.CurveFromFile()
@@ -93,16 +95,12 @@ class Vol(Parser):
 
         # Decode vectors
         vectorSize = c.vec_param[Param.ptnr] 
-        c.vec_time = [0.0] * vectorSize
-        c.vec_potential = [0.0] * vectorSize
-        c.vec_current = [0.0] * vectorSize
-        time = timeStep
-        potential = c.vec_param[Param.Ep]
-        for i in range(0, vectorSize):
-            c.vec_current[i] = struct.unpack('d', data[index:index+8])[0]
-            index += 8
-            c.vec_time[i] = time
-            time += timeStep
-            c.vec_potential[i] = potential
-            potential += eStep
+        c.vec_current = np.frombuffer(data, dtype='<f8', count=vectorSize, offset=index)
+        index += 8 * vectorSize
+        c.vec_time = timeStep * np.arange(1, vectorSize + 1)
+        # accumulated one step after other, as the values of the files
+        # uploaded before, Ep + eStep * i differs in the last bits
+        steps = np.full(vectorSize, eStep)
+        steps[:1] = c.vec_param[Param.Ep]
+        c.vec_potential = np.add.accumulate(steps)
         return c, index
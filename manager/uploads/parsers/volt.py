@@ -1,5 +1,6 @@
 import struct
 import zlib
+import numpy as np
 from manager.uploads.generic_eaqt import Generic_EAQt
 from manager.uploads.parser import Parser
 from manager.models import Curve as mcurve
@@ -21,53 +22,46 @@ class Volt(Parser):
         as vol file contains all the info required
         for upload by itself.
         """
-        self._curves = []
         self.name = ""
         self.cfile = cfile
         if cfile.name.endswith('voltc'):
             self.isCompressed = True
         else:
             self.isCompressed = False
-        fileContent = self.cfile.read()
-        index = 0
-        curvesNum = struct.unpack('<i', fileContent[index:index+4])[0]
-        index += 4
-        for i in range(0, curvesNum):
-            curveSize = struct.unpack('I', fileContent[index:index+4])[0]
-            index += 4
-            c = self.unserialize(fileContent[index:index+curveSize], self.isCompressed) 
-            self._curves.append(c)
-            index += curveSize - 4  # 4 was added earlier
+        self.curvesNum = struct.unpack('<i', self._read(4))[0]
+
+    def iterCurves(self):
+        """
+        Reads and decodes one curve at a time.
+        """
+        for i in range(0, self.curvesNum):
+            curveSize = struct.unpack('I', self._read(4))[0]
+            yield self.unserialize(self._read(curveSize - 4), self.isCompressed)  # size includes its 4 bytes
+
+    # time, potential and current of each point are stored interleaved
+    pointDtype = np.dtype([('t', '<f8'), ('E', '<f8'), ('i', '<f8')])
+
+    @staticmethod
+    def _readString(data, index):
+        """
+        Returns zero terminated utf8 string starting at index
+        and the index of the first byte after it.
+        """
+        end = data.index(b'\0', index)
+        return bytes(data[index:end]).decode('utf8'), end + 1
 
     def unserialize(self, data, isCompressed):
         # Decode name
         c = self.CurveFromFile()
-        bytename = bytearray()
-        index = 0
-        while True:
-            cc = struct.unpack('<B', data[index:index+1])
-            index += 1
-            if (cc[0] == 0):
-                break
-            bytename.append(cc[0])
-        c.name = bytename.decode('utf8')
+        c.name, index = self._readString(data, 0)
         if isCompressed:
             dataUnc = zlib.decompress(data[index+4:])  # QT qCompress adds 4 bytes 
             # src: http://bohdan-danishevsky.blogspot.com/2013/11/qt-51-zlib-compression-compatible-with.html
         else:
             dataUnc = data[index:]
 
-        index = 0
-
         # Decode comment
-        bytename = bytearray()
-        while True:
-            cc = struct.unpack('<B', dataUnc[index:index+1])
-            index += 1
-            if cc[0] == 0:
-                break
-            bytename.append(cc[0])
-        c.comment = bytename.decode('utf8')
+        c.comment, index = self._readString(dataUnc, 0)
         # Decode param:
         paramNum = struct.unpack('<i', dataUnc[index:index+4])[0]
         index += 4
@@ -77,20 +71,18 @@ class Volt(Parser):
 
         # Decode vectors
         vectorSize = c.vec_param[Param.ptnr]
-        c.vec_time = [0.0] * vectorSize
-        c.vec_potential = [0.0] * vectorSize
-        c.vec_current = [0.0] * vectorSize
-        for i in range(0, vectorSize):
-            c.vec_time[i] = struct.unpack('d', dataUnc[index:index+8])[0]
-            index += 8
-            c.vec_potential[i] = struct.unpack('d', dataUnc[index:index+8])[0]
-            index += 8
-            c.vec_current[i] = struct.unpack('d', dataUnc[index:index+8])[0]
-            index += 8
+        points = np.frombuffer(dataUnc, dtype=self.pointDtype, count=vectorSize, offset=index)
+        c.vec_time = np.ascontiguousarray(points['t'])
+        c.vec_potential = np.ascontiguousarray(points['E'])
+        c.vec_current = np.ascontiguousarray(points['i'])
+        index += points.nbytes
 
         # Decode probing data
         if c.vec_param[Param.nonaveragedsampling] != 0:
             probingNum = struct.unpack('<i', dataUnc[index:index+4])[0]
             index += 4
-            c.vec_sampling = struct.unpack('f'*probingNum, dataUnc[index:index+probingNum*4])
+            # stored as float64, as the sampling data of other formats
+            c.vec_sampling = np.frombuffer(
+                dataUnc, dtype='<f4', count=probingNum, offset=index
+            ).astype(np.float64)
         return c
@@ -1,4 +1,4 @@
-import pandas as pd
+import xlrd
 from overrides import overrides
 from manager.uploads.parsers.txt import Txt
 
@@ -8,5 +8,12 @@ class Xls(Txt):
     Parses XLS excel files.
     """
     @overrides
-    def readPandas(self, fileForPandas, skipRows):
-        return pd.read_excel(fileForPandas, header=None, skiprows=skipRows)
+    def readMatrix(self, fileForPandas, skipRows):
+        book = xlrd.open_workbook(file_contents=fileForPandas.read(), on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            return self.rowsToMatrix(
+                sheet.row_values(i) for i in range(skipRows, sheet.nrows)
+            )
+        finally:
+            book.release_resources()
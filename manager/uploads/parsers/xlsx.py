@@ -1,4 +1,4 @@
-import pandas as pd
+import openpyxl
 from overrides import overrides
 from manager.uploads.parsers.txt import Txt
 
@@ -6,7 +6,15 @@ from manager.uploads.parsers.txt import Txt
 class Xlsx(Txt):
     """
     This parses XLSX files of excel 2010 and newer.
+    The first sheet is read in the read-only (streaming) mode.
     """
     @overrides
-    def readPandas(self, fileForPandas, skipRows):
-        return pd.read_excel(fileForPandas, header=None, skiprows=skipRows)
+    def readMatrix(self, fileForPandas, skipRows):
+        book = openpyxl.load_workbook(fileForPandas, read_only=True, data_only=True)
+        try:
+            sheet = book.worksheets[0]
+            return self.rowsToMatrix(
+                sheet.iter_rows(min_row=skipRows+1, values_only=True)
+            )
+        finally:
+            book.close()
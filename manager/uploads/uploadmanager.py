@@ -1,12 +1,23 @@
+import io
 import json
+import hashlib
+import logging
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
 from django.utils.html import escape
 from django.db import transaction
 from django.urls import reverse
 from django.http import JsonResponse
 from django.db import DatabaseError
+from django.conf import settings
+from django.core.files import File as DjangoFile
 import manager.models as mmodels
 from manager.helpers.decorators import with_user
 from manager.exceptions import VoltPyFailed
+from manager.helpers.processpool import getPool
+from manager.uploads.parser import Parser
+
+logger = logging.getLogger(__name__)
 
 
 allowedExt = (  # TODO: build based on parsers
@@ -18,6 +29,7 @@ allowedExt = (  # TODO: build based on parsers
     'ods',  # General: LO Calc
     'xls',  # General: MS Excel 
     'xlsx',  # General: MS Excel
+    'npz',  # VoltPy export bundle
 )
 """
 in preparation:
@@ -111,6 +123,7 @@ def ajax(request, user):
             details = {}
             errors = []
             details['fileset_name'] = escape(request.POST.get('fileset_name', ''))
+            details['force_import'] = bool(request.POST.get('force_import', ''))
             for i, needD in enumerate(needsDescribe):
                 details[i] = {}
                 if needD:
@@ -136,7 +149,12 @@ def ajax(request, user):
                 else:
                     #  No details are needed
                     pass
-            if isOk:
+            if isOk and settings.VOLTPY_UPLOAD_JOBS != 'off':
+                from manager.uploads.jobs import enqueue
+                job = enqueue(files=files, details=details, user=user)
+                jsonData['command'] = 'queued'
+                jsonData['status'] = reverse('uploadStatus', args=[job.id])
+            elif isOk:
                 fileset_id = parseAndCreateModels(files=files, details=details, user=user)
                 jsonData['command'] = 'success'
                 jsonData['location'] = reverse('showFileset', args=[fileset_id])
@@ -154,6 +172,22 @@ def ajax(request, user):
     return JsonResponse(jsonData)
 
 
+@with_user
+def uploadStatus(request, user, job_id):
+    """
+    Reports the progress of the queued upload (see manager.uploads.jobs).
+
+    returns JsonResponse
+    """
+    from manager.uploads.jobs import failStale
+    failStale()
+    try:
+        job = mmodels.UploadJob.objects.get(id=int(job_id), owner=user)
+    except mmodels.UploadJob.DoesNotExist:
+        return JsonResponse({'status': 'failed', 'error': 'Upload does not exists.'})
+    return JsonResponse(job.getStatus())
+
+
 def verifyFileExt(filelist):
     """
     Verify the file list:
@@ -224,23 +258,35 @@ def verifyFileExt(filelist):
 def parseAndCreateModels(files, details, user):
     """
     Try to load parser, create model and save to DB.
+    The files uploaded before are not parsed again (see findDuplicates).
+    With VOLTPY_UPLOAD_WORKERS > 1 the files are decoded in parallel
+    in worker processes and saved here together.
     returns the Fileset id
     """
     sid = transaction.savepoint()
     try:
-        cf_ids = []
-        for i, f in enumerate(files):
-            d = details[i]
-            cf_ids.append(_parseGetCFID(f, d, user))
-        fsid = _saveFileset(cf_ids, user, details)
-    except (DatabaseError, VoltPyFailed):
+        hashes = [contentHash(f.name, f, details[i]) for i, f in enumerate(files)]
+        earlier = findDuplicates(hashes, details)
+        cf_ids = {i: cf.getDuplicate(files[i].name).id for i, cf in earlier.items()}
+        todo = [i for i in range(len(files)) if i not in earlier]
+        if settings.VOLTPY_UPLOAD_WORKERS > 1 and len(todo) > 1:
+            cf_ids.update(zip(todo, _parseInPool(
+                [files[i] for i in todo],
+                [details[i] for i in todo],
+                [hashes[i] for i in todo],
+            )))
+        else:
+            for i in todo:
+                cf_ids[i] = _parseGetCFID(files[i], details[i], user, hashes[i])
+        fsid = saveFileset([cf_ids[i] for i in range(len(files))], user, details)
+    except Exception:
         transaction.savepoint_rollback(sid)
         raise
     transaction.savepoint_commit(sid)
     return fsid
 
 
-def _saveFileset(cf_ids, user, details):
+def saveFileset(cf_ids, user, details):
     """
     Save Fileset to DB connecting it to its
     curveFiles and return the Fileset id.
@@ -270,7 +316,7 @@ def _getParserClass(extension):
     return parser
 
 
-def _parseGetCFID(cfile, details, user):
+def _parseGetCFID(cfile, details, user, contentHash=''):
     """
     Upload file and return File id.
     """
@@ -278,7 +324,152 @@ def _parseGetCFID(cfile, details, user):
     parserClass = _getParserClass(ext)
     try:
         parserObj = parserClass(cfile, details)
+        parserObj.contentHash = contentHash
         cf_id = parserObj.saveModels(user)
-    except:
-        raise VoltPyFailed('Could not parse file %s' % cfile.name)
+    except (DatabaseError, VoltPyFailed):
+        raise
+    except Exception as e:  # malformed content of the file
+        logger.exception('Could not parse file %s', cfile.name)
+        raise VoltPyFailed('Could not parse file %s.' % cfile.name) from e
     return cf_id
+
+
+def contentHash(name, source, details) -> str:
+    """
+    Identifies the upload by its extension, the details of its
+    parsing and its content. source is the uploaded file, path
+    of the stored file or the content.
+    """
+    digest = hashlib.sha1()
+    digest.update(name.rsplit('.', 1)[-1].lower().encode())
+    digest.update(json.dumps(details, sort_keys=True, default=str).encode())
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                digest.update(chunk)
+    elif isinstance(source, bytes):
+        digest.update(source)
+    else:
+        for chunk in source.chunks():
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+def findDuplicates(hashes, details):
+    """
+    Finds the Files of the same content uploaded earlier by the user
+    or shared with them, unless details['force_import'] is set.
+    Returns {index in hashes: File}.
+    """
+    if details.get('force_import', False):
+        return {}
+    earlier = {}
+    for cf in mmodels.File.filter(content_hash__in=set(hashes)).order_by('id'):
+        earlier.setdefault(cf.content_hash, cf)
+    return {i: earlier[h] for i, h in enumerate(hashes) if h in earlier}
+
+
+def _fileSource(cfile):
+    """
+    What the worker process needs to read the uploaded file:
+    path of the temporary file or the content of in-memory upload.
+    """
+    if hasattr(cfile, 'temporary_file_path'):
+        return cfile.temporary_file_path()
+    cfile.seek(0)
+    return cfile.read()
+
+
+def _decodeFile(name, source, details):
+    """
+    Decodes the file in worker process, returns
+    (Decoded, None) or (None, error).
+    """
+    if isinstance(source, str):
+        cfile = DjangoFile(open(source, 'rb'), name=name)
+    else:
+        cfile = DjangoFile(io.BytesIO(source), name=name)
+    try:
+        ext = name.rsplit('.', 1)[1]
+        return _getParserClass(ext)(cfile, details).decode(), None
+    except VoltPyFailed as e:
+        return None, str(e)
+    except Exception:  # malformed content of the file
+        logger.exception('Could not parse file %s', name)
+        return None, 'Could not parse file %s.' % name
+    finally:
+        cfile.close()
+
+
+def decodeFiles(sources, details, onDecoded=None):
+    """
+    Decodes the files, in the pool of worker processes when
+    VOLTPY_UPLOAD_WORKERS > 1. sources is a list of (name, path or
+    content), onDecoded(index, error) is called as the files are done.
+    Returns list of (Decoded, error) in order of sources,
+    see also saveDecoded and discardDecoded.
+    """
+    results = [(None, None)] * len(sources)
+    try:
+        if settings.VOLTPY_UPLOAD_WORKERS > 1 and len(sources) > 1:
+            pool = getPool('uploads', settings.VOLTPY_UPLOAD_WORKERS)
+            futures = {
+                pool.submit(_decodeFile, name, source, details[i]): i
+                for i, (name, source) in enumerate(sources)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if onDecoded is not None:
+                    onDecoded(i, results[i][1])
+        else:
+            for i, (name, source) in enumerate(sources):
+                results[i] = _decodeFile(name, source, details[i])
+                if onDecoded is not None:
+                    onDecoded(i, results[i][1])
+    except BrokenProcessPool:
+        discardDecoded(results)
+        raise VoltPyFailed('Could not parse files, the decoding process has crashed.')
+    except BaseException:
+        discardDecoded(results)
+        raise
+    return results
+
+
+def discardDecoded(results):
+    """
+    Removes the temporary files of the decoded files.
+    """
+    for decoded, error in results:
+        if decoded is not None:
+            decoded.discard()
+
+
+def saveDecoded(names, results, hashes=None):
+    """
+    Saves the files returned by decodeFiles at once,
+    returns the File ids in the order of names.
+    """
+    try:
+        failed = [
+            '%s (%s)' % (name, error)
+            for name, (decoded, error) in zip(names, results) if error is not None
+        ]
+        if failed:
+            raise VoltPyFailed('Could not parse file %s' % ', '.join(failed))
+        decoded = [d for d, error in results]
+        for d, h in zip(decoded, hashes or []):
+            d.contentHash = h
+        return Parser.saveMany(decoded)
+    finally:
+        discardDecoded(results)
+
+
+def _parseInPool(files, details, hashes=None):
+    """
+    Decodes files in the pool of worker processes, and saves all of
+    them at once. Returns the File ids in the order of files.
+    """
+    results = decodeFiles([(f.name, _fileSource(f)) for f in files], details)
+    return saveDecoded([f.name for f in files], results, hashes)
@@ -20,6 +20,8 @@ urlpatterns = [
         views.upload, name='upload'),
     url(r'^ajax/uploads/$',
         uploadmanager.ajax, name='ajaxUpload'),
+    url(r'^ajax/upload-status/(?P<job_id>[0-9]+)/$',
+        uploadmanager.uploadStatus, name='uploadStatus'),
     url(r'^ajax/search-dataset/$',
         views.searchDataset, name='searchDatasetAjax'),
     url(r'^ajax/get-shareable/$',
@@ -38,6 +40,8 @@ urlpatterns = [
         views.deleteCurve, name='deleteCurve'),
     url(r'^export/(?P<obj_type>[fileset|file|dataset|analysis]+)/(?P<obj_id>[0-9]+)/$',
         views.export, name='export'),
+    url(r'^export-bundle/(?P<obj_type>[fileset|file|dataset]+)/(?P<obj_id>[0-9]+)/$',
+        views.exportBundle, name='exportBundle'),
     url(r'^browse-datasets/$',
         views.browseDatasets, name='browseDatasets'),
     url(r'^browse-datasets/(?P<page_number>[0-9]+)/$', 
@@ -58,6 +62,10 @@ urlpatterns = [
         views.showDataset, name='showDataset'),
     url(r'^undo-dataset/(?P<dataset_id>[0-9]+)/$',
         views.undoDataset, name='undoDataset'),
+    url(r'^save-pipeline/(?P<dataset_id>[0-9]+)/$',
+        views.savePipeline, name='savePipeline'),
+    url(r'^apply-pipeline/(?P<pipeline_id>[0-9]+)/(?P<dataset_id>[0-9]+)/$',
+        views.applyPipeline, name='applyPipeline'),
     url(r'^edit-analyte/(?P<obj_type>[file|dataset]+)/(?P<obj_id>[0-9]+)/(?P<analyte_id>[0-9|new]+)/$',
         views.editAnalyte, name='editAnalyte'),
     url(r'^edit-curves/(?P<obj_type>[file|dataset]+)/(?P<obj_id>[0-9]+)/$',
@@ -23,6 +23,7 @@ import manager.models as mmodels
 import manager.forms as mforms
 import manager.uploads.uploadmanager as umanager
 from manager.operations import methodmanager as mmm
+from manager.operations import pipeline as mpipeline
 from manager.exceptions import VoltPyNotAllowed, VoltPyDoesNotExists
 from manager.helpers.functions import add_notification
 from manager.helpers.functions import delete_helper
@@ -30,6 +31,8 @@ from manager.helpers.functions import form_helper
 from manager.helpers.functions import generate_plot
 from manager.helpers.functions import voltpy_render
 from manager.helpers.functions import voltpy_serve_csv
+from manager.helpers.functions import voltpy_stream_csv
+from manager.helpers.functions import voltpy_serve_bytes
 from manager.helpers.functions import is_number
 from manager.helpers.functions import get_redirect_class
 from manager.helpers.functions import generate_share_link
@@ -349,34 +352,56 @@ def export(request, user, obj_type, obj_id):
     allowedTypes = ('fileset', 'file', 'dataset', 'analysis')
     assert obj_type in allowedTypes
     try:
-        csv_file = ''
         filename = 'export_%s.csv'
         if obj_type == 'fileset':
             fs = mmodels.Fileset.get(id=int(obj_id), deleted=False)
-            csv_file = fs.export()
+            csv_chunks = fs.export()
             filename = filename % fs.name
         elif obj_type == 'file':
             cf = mmodels.File.get(id=int(obj_id))
-            csv_file = cf.export()
+            csv_chunks = cf.export()
             filename = filename % cf.name
         elif obj_type == 'dataset':
             ds = mmodels.Dataset.get(id=int(obj_id))
-            csv_file = ds.export()
+            csv_chunks = ds.export()
             filename = filename % ds.name
         elif obj_type == 'analysis':
             mm = mmm.MethodManager(user=user, analysis_id=obj_id)
             csv_file, modelName = mm.exportFile()
             filename = 'analysis_%s.csv' % (modelName if modelName else ('id_%s' % obj_id))
+            return voltpy_serve_csv(
+                request=request,
+                filedata=csv_file,
+                filename=filename
+            )
     except ObjectDoesNotExist:
         raise VoltPyDoesNotExists()
 
-    return voltpy_serve_csv(
-        request=request,
-        filedata=csv_file,
+    return voltpy_stream_csv(
+        chunks=csv_chunks,
         filename=filename
     )
 
 
+@redirect_on_voltpyexceptions
+@with_user
+def exportBundle(request, user, obj_type, obj_id):
+    """
+    Serves .npz bundle, which can be uploaded again as a file.
+    """
+    allowedTypes = {
+        'fileset': mmodels.Fileset,
+        'file': mmodels.File,
+        'dataset': mmodels.Dataset,
+    }
+    assert obj_type in allowedTypes
+    obj = allowedTypes[obj_type].get(id=int(obj_id))
+    return voltpy_serve_bytes(
+        filedata=obj.exportBundle(),
+        filename='export_%s.npz' % obj.name
+    )
+
+
 @redirect_on_voltpyexceptions
 @with_user
 def browseFilesets(request, user, page_number=1):
@@ -933,6 +958,12 @@ def showFileset(request, user, fileset_id):
                 'obj_id': fs.id,
             })
         ),
+        'export_bundle_button': get_redirect_class(
+            reverse('exportBundle', kwargs={
+                'obj_type': 'fileset',
+                'obj_id': fs.id,
+            })
+        ),
         'delete_button': get_redirect_class(
             reverse('deleteFileset', kwargs={
                 'fileset_id': fs.id
@@ -1185,6 +1216,73 @@ def undoDataset(request, user, dataset_id):
     )
 
 
+@redirect_on_voltpyexceptions
+@with_user
+def savePipeline(request, user, dataset_id):
+    try:
+        cs = mmodels.Dataset.get(id=dataset_id)
+    except ObjectDoesNotExist:
+        raise VoltPyDoesNotExists()
+
+    if request.method == "POST" and request.POST.get('confirm', False):
+        confForm = mforms.GenericConfirmForm(request.POST)
+        if confForm.confirmed():
+            pl = mpipeline.savePipeline(cs.name, list(cs.getProcessingHistory()))
+            add_notification(request, 'Pipeline {0} saved.'.format(pl))
+            return HttpResponseRedirect(cs.getUrl())
+        else:
+            add_notification(request, 'Check the checkbox to confirm.', 1)
+
+    else:
+        confForm = mforms.GenericConfirmForm()
+
+    context = {
+        'text_to_confirm': 'This will save processing of Dataset {0} as a pipeline'.format(cs),
+        'form': confForm,
+        'user': user,
+    }
+
+    return voltpy_render(
+        request=request,
+        template_name='manager/confirmGeneric.html',
+        context=context
+    )
+
+
+@redirect_on_voltpyexceptions
+@with_user
+def applyPipeline(request, user, pipeline_id, dataset_id):
+    try:
+        pl = mmodels.Pipeline.get(id=pipeline_id)
+        cs = mmodels.Dataset.get(id=dataset_id)
+    except ObjectDoesNotExist:
+        raise VoltPyDoesNotExists()
+
+    if request.method == "POST" and request.POST.get('confirm', False):
+        confForm = mforms.GenericConfirmForm(request.POST)
+        if confForm.confirmed():
+            mpipeline.applyPipeline(pl, cs)
+            add_notification(request, 'Pipeline {0} applied.'.format(pl))
+            return HttpResponseRedirect(cs.getUrl())
+        else:
+            add_notification(request, 'Check the checkbox to confirm.', 1)
+
+    else:
+        confForm = mforms.GenericConfirmForm()
+
+    context = {
+        'text_to_confirm': 'This will apply pipeline {0} to Dataset {1}'.format(pl, cs),
+        'form': confForm,
+        'user': user,
+    }
+
+    return voltpy_render(
+        request=request,
+        template_name='manager/confirmGeneric.html',
+        context=context
+    )
+
+
 @redirect_on_voltpyexceptions
 @with_user
 def showDataset(request, user, dataset_id):
@@ -1246,6 +1344,25 @@ def showDataset(request, user, dataset_id):
         )
     else:
         undo_button = '_disabled'
+    if cs.getProcessingHistory().exists():
+        save_pipeline_button = get_redirect_class(
+            reverse('savePipeline', kwargs={
+                'dataset_id': cs.id,
+            })
+        )
+    else:
+        save_pipeline_button = '_disabled'
+    if not cs.locked:
+        pipelines = [
+            (pl, get_redirect_class(
+                reverse('applyPipeline', kwargs={
+                    'pipeline_id': pl.id,
+                    'dataset_id': cs.id,
+                })
+            )) for pl in mmodels.Pipeline.filter(deleted=False)
+        ]
+    else:
+        pipelines = []
     if not cs.locked:
         add_analyte = get_redirect_class(
             reverse('editAnalyte', kwargs={
@@ -1281,7 +1398,15 @@ def showDataset(request, user, dataset_id):
                 'obj_id': cs.id,
             })
         ),
+        'export_bundle_button': get_redirect_class(
+            reverse('exportBundle', kwargs={
+                'obj_type': 'dataset',
+                'obj_id': cs.id,
+            })
+        ),
         'undo_button': undo_button,
+        'save_pipeline_button': save_pipeline_button,
+        'pipelines': pipelines,
         'edit_curves_button':get_redirect_class(
             reverse('editCurves', kwargs={
                 'obj_type': 'dataset',
@@ -1394,6 +1519,12 @@ def showFile(request, user, file_id):
                 'obj_id': cf.id,
             })
         ),
+        'export_bundle_button': get_redirect_class(
+            reverse('exportBundle', kwargs={
+                'obj_type': 'file',
+                'obj_id': cf.id,
+            })
+        ),
         'curve_set_button': get_redirect_class(
             reverse('cloneFile', kwargs={
                 'to_clone_id': cf.id,
@@ -1,9 +1,13 @@
+from typing import List
 from django.db import models
+from django.db import connection
 from django.contrib.auth.models import User
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
 from django.db.models.signals import m2m_changed
 from overrides import overrides
-from guardian.shortcuts import assign_perm
 from guardian.shortcuts import get_objects_for_user
+from guardian.models import UserObjectPermission
 from manager.exceptions import VoltPyNotAllowed
 from manager.exceptions import VoltPyDoesNotExists
 import manager
@@ -25,14 +29,30 @@ class VoltPyModel(models.Model):
             self.owner = user
             super().save()
             if user is not None:
-                assign_perm('rw', user, self)
-                assign_perm('del', user, self)
+                assign_owner_perms(user, [self])
             return
         if user.has_perm('rw', self):
             super().save()
         else:
             raise VoltPyNotAllowed('Operation not allowed.')
 
+    @classmethod
+    def bulkSave(cls, instances: List['VoltPyModel']) -> List['VoltPyModel']:
+        """
+        Saves many new instances at once, current user becomes
+        their owner (as in save) and the permissions are granted
+        with one insert.
+        """
+        user = manager.helpers.functions.get_user()
+        for inst in instances:
+            if inst.id is not None:
+                raise VoltPyNotAllowed('bulkSave accepts only new objects.')
+            inst.owner = user
+        bulk_insert(cls, instances)
+        if user is not None:
+            assign_owner_perms(user, instances)
+        return instances
+
     @classmethod
     def get(cls, *args, **kwargs):
         user = manager.helpers.functions.get_user()
@@ -69,6 +89,46 @@ class VoltPyModel(models.Model):
             raise VoltPyNotAllowed('Operation not allowed.')
 
 
+def bulk_insert(klass, instances: List[models.Model]) -> None:
+    """
+    Inserts instances of klass with bulk_create, where the DB
+    returns ids of inserted rows, otherwise (e.g. sqlite) one by one,
+    as the ids are required for foreign keys.
+    """
+    if not instances:
+        return
+    for field in klass._meta.concrete_fields:
+        if hasattr(field, 'storePending'):
+            # store arrays of all instances at once, see StoredNumpyField
+            field.storePending(instances)
+    if connection.features.can_return_ids_from_bulk_insert:
+        klass.objects.bulk_create(instances)
+    else:
+        for inst in instances:
+            models.Model.save(inst)
+
+
+def assign_owner_perms(user: User, instances: List[models.Model], perms=('rw', 'del')) -> None:
+    """
+    Grants user the perms for all instances (of the same class),
+    with a single insert. Instances have to be new to DB,
+    as existing permissions are not checked.
+    """
+    if not instances:
+        return
+    ctype = ContentType.objects.get_for_model(instances[0])
+    # not cached, the rows change when the DB is flushed
+    permissions = list(Permission.objects.filter(content_type=ctype, codename__in=perms))
+    UserObjectPermission.objects.bulk_create([
+        UserObjectPermission(
+            permission=perm,
+            user=user,
+            content_type=ctype,
+            object_pk=str(inst.pk),
+        ) for inst in instances for perm in permissions
+    ])
+
+
 def check_permission(sender, instance, **kwargs):
     if not isinstance(instance, VoltPyModel):
         return
@@ -144,6 +144,33 @@ STATIC_ROOT = config.get('files', 'STATIC_ROOT')
 
 DEBUG = config.getboolean('debug', 'DEBUG')
 
+# Serialization of numpy arrays in the DB (raw, deflate or shuffle),
+# see manager.helpers.numpycodec
+VOLTPY_ARRAY_CODEC = config.get('arrays', 'CODEC', fallback='deflate')
+VOLTPY_ARRAY_LEVEL = config.getint('arrays', 'LEVEL', fallback=6)
+VOLTPY_ARRAY_CACHE_MB = config.getint('arrays', 'CACHE_MB', fallback=128)
+# Multi-sampling data can be kept in .npy files (file) instead of the DB (db),
+# see ./manage.py movesampling
+VOLTPY_SAMPLING_STORAGE = config.get('arrays', 'SAMPLING_STORAGE', fallback='db')
+VOLTPY_ARRAYS_ROOT = config.get('arrays', 'ROOT', fallback=os.path.join(BASE_DIR, 'arrays'))
+
+# Uploads larger than this are spooled to a temporary file, the parsers
+# read them curve by curve and save every ~FLUSH_MB of decoded curves.
+FILE_UPLOAD_MAX_MEMORY_SIZE = config.getint('uploads', 'MAX_MEMORY_KB', fallback=2560) * 1024
+VOLTPY_UPLOAD_FLUSH_MB = config.getint('uploads', 'FLUSH_MB', fallback=8)
+# Number of worker processes decoding multi-file uploads (0 - no workers)
+VOLTPY_UPLOAD_WORKERS = config.getint('uploads', 'WORKERS', fallback=0)
+# Uploads are processed in the request (off), queued for
+# ./manage.py uploadworker (worker) or for a thread of the web process (thread),
+# queued files are kept in UPLOADS_ROOT until processed.
+VOLTPY_UPLOAD_JOBS = config.get('uploads', 'JOBS', fallback='off')
+VOLTPY_UPLOADS_ROOT = config.get('uploads', 'ROOT', fallback=os.path.join(BASE_DIR, 'uploads'))
+# Running upload which has not reported progress for this long is failed,
+# as its worker has stopped
+VOLTPY_UPLOAD_JOB_TIMEOUT_MIN = config.getint('uploads', 'JOB_TIMEOUT_MIN', fallback=30)
+# Number of worker processes computing ./manage.py applybatch (0 - no workers)
+VOLTPY_BATCH_WORKERS = config.getint('batch', 'WORKERS', fallback=0)
+
 SECRET_KEY = config.get('secrets', 'SECRET_KEY')
 CSRF_MIDDLEWARE_SECRET = config.get('secrets', 'CSRF_MIDDLEWARE_SECRET')
 